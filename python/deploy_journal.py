@@ -0,0 +1,249 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+__author__ = 'spisarski'
+
+"""
+Append-only record of the resources a deployment has created, kept beside the environment file
+"""
+
+logger = logging.getLogger('deploy_journal')
+
+VERSION = 1
+SUFFIX = '.journal'
+
+# Operations
+BEGIN = 'begin'
+CREATED = 'created'
+DELETED = 'deleted'
+
+# Entry statuses
+PENDING = 'pending'
+
+
+def journal_path(environment_file):
+    """
+    Returns the default location of the journal for an environment file
+    :param environment_file: the path to the environment configuration YAML file
+    :return: the journal's path
+    """
+    return environment_file + SUFFIX
+
+
+def config_hash(config):
+    """
+    Returns a digest of a resource's configuration that is independent of key order
+    :param config: the configuration dictionary
+    :return: the hex digest
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True)).hexdigest()
+
+
+class DeployJournal:
+    """
+    Records, one JSON object per line, when the creation of each configured resource begins, the ID it was created
+    with and the configuration that produced it, and when it is deleted. Each line is flushed to disk before the call
+    returns so that after an interrupted run the journal holds every resource that was in flight. The first line
+    identifies the tenant so that a journal is never applied to another one.
+    """
+
+    def __init__(self, file_path, auth_url, tenant_name):
+        """
+        Constructor
+        :param file_path: the journal file
+        :param auth_url: the Keystone URL of the tenant
+        :param tenant_name: the name of the tenant
+        """
+        self.file_path = file_path
+        self.header = {'version': VERSION, 'auth_url': auth_url, 'tenant_name': tenant_name}
+        self.__entries = dict()
+        self.__lock = threading.Lock()
+
+    def load(self):
+        """
+        Reads the journal file. A missing file is an empty journal. A final line left incomplete by a crash is ignored.
+        :return: T/F - False when the file is corrupt or belongs to another tenant and must be rebuilt
+        """
+        with self.__lock:
+            self.__entries = dict()
+            if not os.path.isfile(self.file_path):
+                return True
+
+            with open(self.file_path, 'r+') as journal_file:
+                content = journal_file.read()
+                complete = content.rfind('\n') + 1
+                if complete < len(content):
+                    # Drop the partial record so that the next one is appended on a line of its own
+                    logger.warn('Discarding incomplete final line of journal - ' + self.file_path)
+                    journal_file.truncate(complete)
+            lines = content[:complete].split('\n')[:-1]
+
+            try:
+                records = [json.loads(line) for line in lines]
+            except ValueError as e:
+                logger.warn('Corrupt journal - ' + self.file_path + ' - ' + str(e))
+                return False
+
+            if not records:
+                return True
+            header = records[0]
+            if not isinstance(header, dict) or any(header.get(key) != value for key, value in self.header.items()):
+                logger.warn('Journal ' + self.file_path + ' was not written for this tenant')
+                return False
+
+            for record in records[1:]:
+                if not isinstance(record, dict) or record.get('op') not in (BEGIN, CREATED, DELETED):
+                    logger.warn('Corrupt journal record - ' + str(record))
+                    self.__entries = dict()
+                    return False
+                self.__apply(record)
+            logger.info('Loaded ' + str(len(self.__entries)) + ' resources from journal - ' + self.file_path)
+            return True
+
+    def __apply(self, record):
+        key = (record.get('type'), record.get('name'))
+        if record['op'] == DELETED:
+            self.__entries.pop(key, None)
+        elif record['op'] == BEGIN:
+            entry = dict(self.__entries.get(key) or dict())
+            entry.update({'type': key[0], 'name': key[1], 'status': PENDING, 'config_hash': record.get('config_hash')})
+            self.__entries[key] = entry
+        else:
+            self.__entries[key] = {'type': key[0], 'name': key[1], 'status': CREATED, 'id': record.get('id'),
+                                   'config_hash': record.get('config_hash')}
+            if record.get('adopted'):
+                self.__entries[key]['adopted'] = True
+
+    def get(self, resource_type, name):
+        """
+        Returns the latest state of a resource
+        :param resource_type: the resource type (i.e. deploy_plan.SERVER)
+        :param name: the configured name
+        :return: a dictionary with the keys type, name, status (pending or created), id and config_hash, plus adopted
+                 for adopted resources, or None
+        """
+        with self.__lock:
+            entry = self.__entries.get((resource_type, name))
+            if entry:
+                return dict(entry)
+            return None
+
+    def entries(self):
+        """
+        Returns the latest state of every recorded resource
+        :return: a list of dictionaries as returned by get()
+        """
+        with self.__lock:
+            return [dict(entry) for entry in self.__entries.values()]
+
+    def pending(self):
+        """
+        Returns the resources whose creation began but was never recorded as complete
+        :return: a list of dictionaries as returned by get()
+        """
+        return [entry for entry in self.entries() if entry['status'] == PENDING]
+
+    def begin(self, resource_type, name, config=None):
+        """
+        Records that the creation of a resource is about to be requested
+        :param resource_type: the resource type
+        :param name: the configured name
+        :param config: the configuration from which the resource is created (Optional)
+        """
+        self.__append({'op': BEGIN, 'type': resource_type, 'name': name, 'config_hash': self.__hash(config)})
+
+    def created(self, resource_type, name, resource_id, config=None, adopted=False):
+        """
+        Records the ID of a created (or adopted) resource
+        :param resource_type: the resource type
+        :param name: the configured name
+        :param resource_id: the resource's ID
+        :param config: the configuration from which the resource was created (Optional)
+        :param adopted: T/F - True when the resource is an existing one found by its content under another name (i.e.
+                        an image with the same checksum) so that it is only ever looked up by its ID
+        """
+        record = {'op': CREATED, 'type': resource_type, 'name': name, 'id': resource_id,
+                  'config_hash': self.__hash(config)}
+        if adopted:
+            record['adopted'] = True
+        self.__append(record)
+
+    def deleted(self, resource_type, name):
+        """
+        Records that a resource has been deleted
+        :param resource_type: the resource type
+        :param name: the configured name
+        """
+        self.__append({'op': DELETED, 'type': resource_type, 'name': name})
+
+    def rebuild(self, resources):
+        """
+        Replaces the journal with one recording only the given existing resources. The new file is written beside the
+        old one and renamed over it so that a crash leaves one or the other.
+        :param resources: a list of (resource type, name, resource ID, configuration hash or None) tuples
+        """
+        with self.__lock:
+            self.__entries = dict()
+            records = [self.header]
+            for resource_type, name, resource_id, digest in resources:
+                record = {'op': CREATED, 'type': resource_type, 'name': name, 'id': resource_id,
+                          'config_hash': digest, 'time': time.time()}
+                self.__apply(record)
+                records.append(record)
+
+            tmp_path = self.file_path + '.tmp'
+            with open(tmp_path, 'w') as journal_file:
+                for record in records:
+                    journal_file.write(json.dumps(record, sort_keys=True) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            os.rename(tmp_path, self.file_path)
+            logger.info('Rebuilt journal with ' + str(len(self.__entries)) + ' resources - ' + self.file_path)
+
+    def remove_if_empty(self):
+        """
+        Deletes the journal file once no resources remain recorded in it
+        """
+        with self.__lock:
+            if not self.__entries and os.path.isfile(self.file_path):
+                os.remove(self.file_path)
+                logger.info('Removed empty journal - ' + self.file_path)
+
+    def __hash(self, config):
+        if config is None:
+            return None
+        return config_hash(config)
+
+    def __append(self, record):
+        """
+        Writes a record and forces it to disk, starting the file with the header when it does not exist
+        """
+        record['time'] = time.time()
+        with self.__lock:
+            lines = list()
+            if not os.path.isfile(self.file_path) or os.path.getsize(self.file_path) == 0:
+                lines.append(json.dumps(self.header, sort_keys=True))
+            lines.append(json.dumps(record, sort_keys=True))
+            with open(self.file_path, 'a') as journal_file:
+                journal_file.write('\n'.join(lines) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            self.__apply(record)
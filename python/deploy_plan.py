@@ -0,0 +1,377 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+
+import deploy_journal
+from openstack import tenant_inventory
+from openstack.tenant_inventory import get_attr
+
+__author__ = 'spisarski'
+
+"""
+Compares an environment configuration with a snapshot of the tenant and reports what deploying or cleaning it would do
+"""
+
+logger = logging.getLogger('deploy_plan')
+
+# Actions
+CREATE = 'create'
+DELETE = 'delete'
+NOOP = 'no-op'
+DRIFT = 'drift'
+
+# Resource types
+IMAGE = 'image'
+NETWORK = 'network'
+SUBNET = 'subnet'
+ROUTER = 'router'
+ROUTER_INTERFACE = 'router-interface'
+KEYPAIR = 'keypair'
+PORT = 'port'
+SERVER = 'server'
+FLOATING_IP = 'floating-ip'
+
+STATUS_ERROR = 'ERROR'
+
+# The resource types recorded in the deployment journal and their inventory types
+JOURNALED_TYPES = {
+    IMAGE: tenant_inventory.IMAGES,
+    NETWORK: tenant_inventory.NETWORKS,
+    KEYPAIR: tenant_inventory.KEYPAIRS,
+    SERVER: tenant_inventory.SERVERS,
+}
+
+SYMBOLS = {CREATE: '+', DELETE: '-', NOOP: '=', DRIFT: '~'}
+
+
+class PlanItem:
+    """
+    A single resource and what is to be done with it
+    """
+
+    def __init__(self, action, resource_type, name, detail=None, resource_id=None):
+        """
+        Constructor
+        :param action: one of CREATE, DELETE, NOOP or DRIFT
+        :param resource_type: one of the resource type constants
+        :param name: the configured name of the resource
+        :param detail: the reason for the action (Optional)
+        :param resource_id: the ID of the existing resource (Optional)
+        """
+        self.action = action
+        self.resource_type = resource_type
+        self.name = name
+        self.detail = detail
+        self.resource_id = resource_id
+
+
+class DeployPlan:
+    """
+    The ordered list of PlanItems for an environment. Drifted resources exist but differ from their configuration;
+    they are reported only and never modified.
+    """
+
+    def __init__(self):
+        self.items = list()
+
+    def add(self, action, resource_type, name, detail=None, resource_id=None):
+        """
+        Appends an item to the plan
+        :param action: one of CREATE, DELETE, NOOP or DRIFT
+        :param resource_type: one of the resource type constants
+        :param name: the configured name of the resource
+        :param detail: the reason for the action (Optional)
+        :param resource_id: the ID of the existing resource (Optional)
+        """
+        self.items.append(PlanItem(action, resource_type, name, detail, resource_id))
+
+    def has(self, action, resource_type, name):
+        """
+        Returns True when the plan holds the action for the resource
+        """
+        for item in self.items:
+            if item.action == action and item.resource_type == resource_type and item.name == name:
+                return True
+        return False
+
+    def count(self, action):
+        """
+        Returns the number of items with the action
+        """
+        return len([item for item in self.items if item.action == action])
+
+    def changes(self):
+        """
+        Returns the items requiring an OpenStack API call to create or delete a resource
+        """
+        return [item for item in self.items if item.action in (CREATE, DELETE)]
+
+    def summary_table(self):
+        """
+        Returns a human readable listing of the plan, one resource per line, followed by the totals
+        :return: the table string
+        """
+        type_width = max([len(ROUTER_INTERFACE)] + [len(item.resource_type) for item in self.items])
+        row_format = '{0} {1:<6} {2:<' + str(type_width) + '} {3}'
+        lines = list()
+        for item in self.items:
+            line = row_format.format(SYMBOLS[item.action], item.action, item.resource_type, item.name)
+            if item.detail:
+                line += ' - ' + item.detail
+            lines.append(line)
+        lines.append('Plan: ' + str(self.count(CREATE)) + ' to create, ' + str(self.count(DELETE)) + ' to delete, ' +
+                     str(self.count(NOOP)) + ' unchanged, ' + str(self.count(DRIFT)) + ' drifted')
+        return '\n'.join(lines)
+
+
+def build_plan(os_config, inventory, clean=False, clean_images=False, journal=None):
+    """
+    Compares the configured resources with the tenant. Only the inventory's bulk listings are used, so planning costs
+    one list call per resource type regardless of the size of the environment.
+    :param os_config: The 'openstack' section of the environment configuration
+    :param inventory: The TenantInventory of the tenant
+    :param clean: T/F - when True, plans the removal of the existing resources instead of their creation
+    :param clean_images: T/F - when cleaning, the images are removed too
+    :param journal: The DeployJournal of previous runs. Resources whose creation was interrupted are created again
+                    (or adopted when they exist) and those whose configuration has changed since they were created
+                    are reported as drifted. (Optional)
+    :return: the DeployPlan object
+    """
+    plan = DeployPlan()
+
+    for image_config_dict in os_config.get('images') or list():
+        image_config = image_config_dict.get('image')
+        if not image_config or not image_config.get('name'):
+            continue
+        image = inventory.find_by_name(tenant_inventory.IMAGES, image_config['name'])
+        if not image and not clean:
+            image = adopted_resource(journal, inventory, IMAGE, image_config['name'])
+        if clean and not clean_images:
+            if image:
+                plan.add(NOOP, IMAGE, image_config['name'], 'kept', get_attr(image, 'id'))
+        else:
+            __plan_resource(plan, clean, IMAGE, image_config['name'], image,
+                            __drift(image, ('disk_format', image_config.get('format'), 'disk_format')),
+                            journal, image_config)
+
+    for network_conf in os_config.get('networks') or list():
+        __plan_network(plan, clean, network_conf['network'], inventory, journal)
+
+    for keypair_conf in os_config.get('keypairs') or list():
+        name = keypair_conf['keypair']['name']
+        __plan_resource(plan, clean, KEYPAIR, name, inventory.find_by_name(tenant_inventory.KEYPAIRS, name), None,
+                        journal, keypair_conf['keypair'])
+
+    for instance_config in os_config.get('instances') or list():
+        instance = instance_config.get('instance')
+        if instance:
+            __plan_instance(plan, clean, instance, inventory, journal)
+
+    logger.info('Planned ' + str(len(plan.changes())) + ' changes to ' + str(len(plan.items)) + ' resources')
+    return plan
+
+
+def __plan_resource(plan, clean, resource_type, name, existing, drift=None, journal=None, config=None):
+    """
+    Adds the item for a single resource
+    :param plan: the DeployPlan
+    :param clean: T/F - planning removal rather than creation
+    :param resource_type: one of the resource type constants
+    :param name: the configured name
+    :param existing: the resource found in the tenant or None
+    :param drift: the description of how the existing resource differs from its configuration or None
+    :param journal: the DeployJournal or None
+    :param config: the resource's configuration recorded in the journal or None
+    """
+    resource_id = get_attr(existing, 'id') if existing else None
+    entry = None
+    if journal and not clean:
+        entry = journal.get(resource_type, name)
+    if entry and config is not None and entry.get('config_hash') not in (None, deploy_journal.config_hash(config)):
+        drift = ', '.join([difference for difference in [drift, 'configuration changed since created'] if difference])
+
+    if clean:
+        if existing:
+            plan.add(DELETE, resource_type, name, resource_id=resource_id)
+    elif entry and entry['status'] == deploy_journal.PENDING:
+        plan.add(CREATE, resource_type, name, 'resumes an interrupted run', resource_id)
+    elif not existing:
+        plan.add(CREATE, resource_type, name)
+    elif drift:
+        plan.add(DRIFT, resource_type, name, drift, resource_id)
+    else:
+        plan.add(NOOP, resource_type, name, resource_id=resource_id)
+
+
+def __drift(existing, *checks):
+    """
+    Describes the attributes of an existing resource that differ from their configured values
+    :param existing: the resource or None
+    :param checks: (label, configured value, attribute name) tuples, ignored when the configured value is not set
+    :return: the description or None
+    """
+    if not existing:
+        return None
+    differences = list()
+    for label, configured, attr in checks:
+        actual = get_attr(existing, attr)
+        if configured is not None and configured != actual:
+            differences.append(label + ' is ' + str(actual) + ' not ' + str(configured))
+    return ', '.join(differences) or None
+
+
+def __plan_network(plan, clean, config, inventory, journal):
+    """
+    Adds the items for a network, its subnet, its router and the router's interface to the subnet
+    """
+    network = inventory.find_by_name(tenant_inventory.NETWORKS, config.get('name'))
+    __plan_resource(plan, clean, NETWORK, config.get('name'), network, None, journal, config)
+
+    subnet_config = config.get('subnet') or dict()
+    subnet = inventory.find_by_name(tenant_inventory.SUBNETS, subnet_config.get('name'))
+    network_id = None
+    if network:
+        network_id = network['id']
+    __plan_resource(plan, clean, SUBNET, subnet_config.get('name'), subnet,
+                    __drift(subnet, ('cidr', subnet_config.get('cidr'), 'cidr'),
+                            ('network', network_id, 'network_id')))
+
+    router_config = config.get('router') or dict()
+    if not router_config.get('name'):
+        return
+    router = inventory.find_by_name(tenant_inventory.ROUTERS, router_config['name'])
+    gateway_id = None
+    if router_config.get('external_gateway'):
+        ext_net = inventory.find_by_name(tenant_inventory.NETWORKS, router_config['external_gateway'])
+        if ext_net:
+            gateway_id = ext_net['id']
+    drift = None
+    if router and gateway_id:
+        actual_gateway_id = (router.get('external_gateway_info') or dict()).get('network_id')
+        if actual_gateway_id != gateway_id:
+            drift = 'external gateway is ' + str(actual_gateway_id) + ' not ' + gateway_id
+    __plan_resource(plan, clean, ROUTER, router_config['name'], router, drift)
+
+    interface = None
+    if router and subnet:
+        interface = tenant_inventory.find_router_interface(inventory, router['id'], subnet['id'])
+    __plan_resource(plan, clean, ROUTER_INTERFACE, router_config['name'] + '/' + str(subnet_config.get('name')),
+                    interface)
+
+
+def __plan_instance(plan, clean, instance, inventory, journal):
+    """
+    Adds the items for a VM instance, its ports and its floating IP. A server in the ERROR state is replaced.
+    """
+    name = instance['name']
+    server = inventory.find_by_name(tenant_inventory.SERVERS, name)
+    floating_ip = None
+    if server:
+        floating_ips = inventory.filter(tenant_inventory.FLOATING_IPS, instance_id=get_attr(server, 'id'))
+        if floating_ips:
+            floating_ip = floating_ips[-1]
+
+    replace = not clean and server and get_attr(server, 'status') == STATUS_ERROR
+    if replace:
+        plan.add(DELETE, SERVER, name, 'status is ' + STATUS_ERROR, get_attr(server, 'id'))
+        plan.add(CREATE, SERVER, name, 'replaces the ' + STATUS_ERROR + ' server')
+    else:
+        flavor = inventory.find_by_name(tenant_inventory.FLAVORS, instance.get('flavor'))
+        image = inventory.find_by_name(tenant_inventory.IMAGES, instance.get('imageName'))
+        drift = None
+        if server:
+            differences = list()
+            for label, configured, actual in [('flavor', flavor, get_attr(server, 'flavor')),
+                                              ('image', image, get_attr(server, 'image'))]:
+                actual_id = None
+                if isinstance(actual, dict):
+                    actual_id = actual.get('id')
+                if configured and get_attr(configured, 'id') != actual_id:
+                    differences.append(label + ' is ' + str(actual_id) + ' not ' + get_attr(configured, 'name'))
+            drift = ', '.join(differences) or None
+        __plan_resource(plan, clean, SERVER, name, server, drift, journal, instance)
+
+    for port_config in instance.get('ports') or list():
+        port_conf = port_config['port']
+        port = None
+        network = inventory.find_by_name(tenant_inventory.NETWORKS, port_conf.get('network_name'))
+        if network:
+            ports = inventory.filter(tenant_inventory.PORTS, network_id=network['id'], name=port_conf.get('name'))
+            if ports:
+                # The port with the lowest ID is the one deploy_venv reuses
+                port = sorted(ports, key=lambda existing_port: existing_port['id'])[0]
+        drift = None
+        if port and port_conf.get('ip'):
+            ips = [fixed_ip.get('ip_address') for fixed_ip in port.get('fixed_ips') or list()]
+            if port_conf['ip'] not in ips:
+                drift = 'ip is ' + ', '.join(ips) + ' not ' + port_conf['ip']
+        __plan_resource(plan, clean, PORT, port_conf.get('name'), port, drift)
+
+    if instance.get('floating_ip'):
+        if replace:
+            if floating_ip:
+                plan.add(DELETE, FLOATING_IP, name, 'released with the ' + STATUS_ERROR + ' server',
+                         get_attr(floating_ip, 'id'))
+            plan.add(CREATE, FLOATING_IP, name)
+        else:
+            __plan_resource(plan, clean, FLOATING_IP, name, floating_ip)
+
+
+def adopted_resource(journal, inventory, resource_type, name):
+    """
+    Returns the existing resource the journal records as adopted under a configured name (i.e. an image with the same
+    content found under another name)
+    :param journal: the DeployJournal or None
+    :param inventory: the TenantInventory
+    :param resource_type: one of the journaled resource type constants
+    :param name: the configured name
+    :return: the resource or None
+    """
+    if not journal:
+        return None
+    entry = journal.get(resource_type, name)
+    if not entry or entry['status'] != deploy_journal.CREATED or not entry.get('adopted'):
+        return None
+    return inventory.find_by_id(JOURNALED_TYPES[resource_type], entry['id'])
+
+
+def stale_entries(journal, inventory):
+    """
+    Returns the resources the journal records as created that no longer exist under their configured name, or for
+    adopted resources, that no longer exist at all
+    :param journal: the DeployJournal
+    :param inventory: the TenantInventory
+    :return: a list of the journal entries
+    """
+    stale = list()
+    for entry in journal.entries():
+        inventory_type = JOURNALED_TYPES.get(entry['type'])
+        if entry['status'] != deploy_journal.CREATED or not inventory_type:
+            continue
+        existing = inventory.find_by_id(inventory_type, entry['id'])
+        if not existing or (not entry.get('adopted') and get_attr(existing, 'name') != entry['name']):
+            stale.append(entry)
+    return stale
+
+
+def journal_resources(plan):
+    """
+    Returns the existing resources of a plan in the form accepted by DeployJournal.rebuild(). The configurations that
+    produced them are unknown so they are recorded without a configuration hash.
+    :param plan: the DeployPlan
+    :return: a list of (resource type, name, resource ID, None) tuples
+    """
+    return [(item.resource_type, item.name, item.resource_id, None) for item in plan.items
+            if item.resource_type in JOURNALED_TYPES and item.resource_id and item.action in (NOOP, DRIFT)]
@@ -16,14 +16,22 @@
 # limitations under the License.
 #
 # This script is responsible for deploying a VM running virtual CMTS emulator instances
+import functools
 import logging
 import os
 import argparse
 from provisioning import ansible_utils
+import deploy_journal
+import deploy_plan
 import file_utils
+import task_graph
+from openstack import api_metrics
+from openstack import client_registry
+from openstack import http_transport
 from openstack import neutron_utils
-from openstack import nova_utils
 from openstack import os_credentials
+from openstack import tenant_inventory
+from openstack import wait_policy
 
 __author__ = 'spisarski'
 
@@ -45,67 +53,244 @@ def get_os_credentials(os_conn_config):
                                   os_conn_config.get('http_proxy'))
 
 
-def create_image(os_conn_config, image_config):
+def create_image(os_conn_config, image_config, inventory=None, image=None):
     """
     Creates an image in OpenStack if necessary
     :param os_conn_config: The OS credentials from config
     :param image_config: The image configuration
+    :param inventory: The TenantInventory shared by the deployment (Optional)
+    :param image: The existing image to use, i.e. one adopted by a previous run (Optional)
     :return: A reference to the image creator object from which the image object can be accessed
     """
-    from openstack.create_image import OpenStackImage
-    image_creator = OpenStackImage(get_os_credentials(os_conn_config), image_config.get('image_user'),
-                                   image_config.get('format'), image_config.get('download_url'),
-                                   image_config.get('name'), image_config.get('local_download_path'))
+    image_creator = __image_creator(os_conn_config, image_config, inventory, image)
     image_creator.create()
     return image_creator
 
 
-def create_network(os_conn_config, network_config):
+def __image_creator(os_conn_config, image_config, inventory=None, image=None):
+    from openstack.create_image import OpenStackImage
+    return OpenStackImage(get_os_credentials(os_conn_config), image_config.get('image_user'),
+                          image_config.get('format'), image_config.get('download_url'),
+                          image_config.get('name'), image_config.get('local_download_path'), image=image,
+                          inventory=inventory, checksum=image_config.get('checksum'),
+                          stream=image_config.get('stream', False), visibility=image_config.get('visibility'))
+
+
+def create_network(os_conn_config, network_config, inventory=None):
     """
     Creates a network on which the CMTSs can attach
     :param os_conn_config: The OpenStack credentials object
     :param network_config: The network configuration
+    :param inventory: The TenantInventory shared by the deployment (Optional)
     :return: A reference to the network creator objects for each network from which network elements such as the
              subnet, router, interface router, and network objects can be accessed.
     """
     # Check for OS for network existence
     # If exists return network instance data
     # Else, create network and return instance data
+    logger.info('Attempting to create network with name - ' + network_config['network'].get('name'))
+
+    # try:
+    network_creator = __network_creator(os_conn_config, network_config, inventory)
+    network_creator.create()
+    logger.info('Created network ')
+    return network_creator
+
+
+def __network_creator(os_conn_config, network_config, inventory=None):
     from openstack.create_network import OpenStackNetwork
     from openstack.create_network import NetworkSettings
     from openstack.create_network import SubnetSettings
     from openstack.create_network import RouterSettings
 
     config = network_config['network']
+    return OpenStackNetwork(get_os_credentials(os_conn_config), NetworkSettings(name=config.get('name')),
+                            SubnetSettings(config.get('subnet')), RouterSettings(config.get('router')), inventory)
 
-    logger.info('Attempting to create network with name - ' + config.get('name'))
 
-    # try:
-    network_creator = OpenStackNetwork(get_os_credentials(os_conn_config),
-                                       NetworkSettings(name=config.get('name')),
-                                       SubnetSettings(config.get('subnet')),
-                                       RouterSettings(config.get('router')))
-    network_creator.create()
-    logger.info('Created network ')
-    return network_creator
+def create_network_wave(os_conn_config, network_confs, inventory=None):
+    """
+    Returns the creators of several networks after creating all of their missing networks with one Neutron request
+    and all of their missing subnets with another. Each creator's create() must still be called to add the router and
+    anything the bulk requests could not create.
+    :param os_conn_config: The OpenStack credentials object
+    :param network_confs: The list of network configurations
+    :param inventory: The TenantInventory shared by the deployment (Optional)
+    :return: dictionary of the network creators where the key is the network name
+    """
+    from openstack.create_network import create_networks_and_subnets
+
+    network_dict = dict()
+    for network_conf in network_confs:
+        network_dict[network_conf['network']['name']] = __network_creator(os_conn_config, network_conf, inventory)
+    create_networks_and_subnets(network_dict.values())
+    return network_dict
 
 
-def create_keypair(os_conn_config, keypair_config):
+def create_keypair(os_conn_config, keypair_config, inventory=None):
     """
     Creates a keypair that can be applied to an instance
     :param os_conn_config: The OpenStack credentials object
     :param keypair_config: The keypair configuration
+    :param inventory: The TenantInventory shared by the deployment (Optional)
     :return: A reference to the keypair creator object
     """
+    keypair_creator = __keypair_creator(os_conn_config, keypair_config, inventory)
+    keypair_creator.create()
+    return keypair_creator
+
+
+def __keypair_creator(os_conn_config, keypair_config, inventory=None):
     from openstack.create_keypairs import OpenStackKeypair
     from openstack.create_keypairs import KeypairSettings
+    return OpenStackKeypair(get_os_credentials(os_conn_config), KeypairSettings(keypair_config), inventory)
+
+
+def __list_ports(neutron, network_ids, inventory=None):
+    """
+    Returns the existing ports attached to any of the given networks
+    :param neutron: the Neutron client
+    :param network_ids: the IDs of the networks
+    :param inventory: The TenantInventory shared by the deployment (Optional)
+    :return: a list of port dictionaries
+    """
+    if inventory:
+        return [port for port in inventory.get_all(tenant_inventory.PORTS) if port.get('network_id') in network_ids]
+    return neutron_utils.get_ports(neutron, network_ids)
+
+
+def __index_ports(existing_ports):
+    """
+    Returns a dictionary of ports keyed by (network ID, port name). When more than one port shares a name on a
+    network, the one with the lowest ID is always the one reused.
+    :param existing_ports: a list of port dictionaries
+    :return: the dictionary
+    """
+    index = dict()
+    for port in sorted(existing_ports, key=lambda existing_port: existing_port['id']):
+        key = (port.get('network_id'), port.get('name'))
+        if key in index:
+            logger.warn('Multiple ports named [' + str(key[1]) + '] on network [' + str(key[0]) + '], reusing - ' +
+                        index[key]['id'])
+        else:
+            index[key] = port
+    return index
+
+
+def __vm_port_network_ids(instance_config, network_dict):
+    """
+    Returns the IDs of the existing networks to which a VM instance's ports are attached
+    """
+    network_ids = set()
+    for port_config in instance_config['instance']['ports']:
+        os_network_obj = network_dict.get(port_config['port']['network_name'])
+        if os_network_obj and os_network_obj.network:
+            network_ids.add(os_network_obj.network['network']['id'])
+    return network_ids
 
-    keypair_creator = OpenStackKeypair(get_os_credentials(os_conn_config), KeypairSettings(keypair_config))
-    keypair_creator.create()
-    return keypair_creator
 
+def __vm_port_requests(instance_config, network_dict, existing_ports):
+    """
+    Returns the existing ports of a VM instance and what is needed to create the others
+    :param instance_config: The VM instance configuration
+    :param network_dict: A dictionary of network objects returned by OpenStack where the key contains the network name.
+    :param existing_ports: the existing ports as indexed by __index_ports()
+    :return: a tuple of the list of ports in the configured order with None in place of the missing ones and the list
+             of (index, (PortSettings, network, subnet)) tuples of the missing ones
+    """
+    from openstack.create_network import PortSettings
 
-def create_vm_instance(os_conn_config, instance_config, image, network_dict, keypair_creator):
+    ports_config = instance_config['instance']['ports']
+    ports = [None] * len(ports_config)
+    port_requests = list()
+    for index, port_config in enumerate(ports_config):
+        network_name = port_config['port']['network_name']
+        port_name = port_config['port']['name']
+        os_network_obj = network_dict.get(network_name)
+        if not os_network_obj:
+            logger.warn('Cannot create port as associated network name of [' + network_name + '] not configured.')
+            raise Exception
+        if not os_network_obj.network:
+            raise Exception('Cannot create port [' + port_name + '] as network [' + network_name + '] does not exist')
+
+        existing_port = existing_ports.get((os_network_obj.network['network']['id'], port_name))
+        if existing_port:
+            ports[index] = {'port': existing_port}
+        else:
+            logger.info('Creating port [' + port_name + '] for network name - ' + network_name)
+            port_requests.append((index, (PortSettings(port_config), os_network_obj.network, os_network_obj.subnet)))
+    return ports, port_requests
+
+
+def create_vm_ports(os_conn_config, instance_config, network_dict, inventory=None):
+    """
+    Returns the ports for a VM instance, reusing the ones that already exist and creating the others with a single
+    Neutron request
+    :param os_conn_config: The OpenStack credentials
+    :param instance_config: The VM instance configuration
+    :param network_dict: A dictionary of network objects returned by OpenStack where the key contains the network name.
+    :param inventory: The TenantInventory shared by the deployment (Optional)
+    :return: A list of port objects in the configured order
+    """
+    neutron = client_registry.get_client(get_os_credentials(os_conn_config), client_registry.NETWORK)
+    existing_ports = __index_ports(__list_ports(neutron, __vm_port_network_ids(instance_config, network_dict),
+                                                inventory))
+    ports, port_requests = __vm_port_requests(instance_config, network_dict, existing_ports)
+    created = neutron_utils.create_ports(neutron, [port_request for index, port_request in port_requests])
+    for (index, port_request), port in zip(port_requests, created):
+        if inventory:
+            inventory.add(tenant_inventory.PORTS, port['port'])
+        ports[index] = port
+    return ports
+
+
+def create_ports_wave(os_conn_config, instance_configs, network_dict, inventory=None):
+    """
+    Creates the missing ports of several VM instances with a single Neutron request. Ports that cannot be created are
+    only logged as create_vm_ports() is expected to be called for each VM afterwards, which creates them again and
+    reports why they failed.
+    :param os_conn_config: The OpenStack credentials
+    :param instance_configs: The list of VM instance configurations
+    :param network_dict: A dictionary of network objects returned by OpenStack where the key contains the network name.
+    :param inventory: The TenantInventory shared by the deployment (Optional)
+    :return: the number of ports created
+    """
+    neutron = client_registry.get_client(get_os_credentials(os_conn_config), client_registry.NETWORK)
+    network_ids = set()
+    for instance_config in instance_configs:
+        network_ids.update(__vm_port_network_ids(instance_config, network_dict))
+    existing_ports = __index_ports(__list_ports(neutron, network_ids, inventory))
+
+    port_requests = list()
+    for instance_config in instance_configs:
+        try:
+            ports, vm_port_requests = __vm_port_requests(instance_config, network_dict, existing_ports)
+        except Exception as e:
+            logger.warn('Skipping the ports of instance ' + instance_config['instance']['name'] + ' - ' + str(e))
+            continue
+        port_requests.extend(port_request for index, port_request in vm_port_requests)
+    if not port_requests:
+        return 0
+
+    logger.info('Creating ' + str(len(port_requests)) + ' ports for ' + str(len(instance_configs)) + ' instances')
+    try:
+        created = neutron_utils.create_ports(neutron, port_requests)
+    except neutron_utils.BulkCreateError as e:
+        logger.warn(str(e))
+        created = e.created
+    except Exception as e:
+        logger.warn('Unable to create ports in bulk - ' + str(e))
+        return 0
+
+    created = [port for port in created if port]
+    if inventory:
+        for port in created:
+            inventory.add(tenant_inventory.PORTS, port['port'])
+    return len(created)
+
+
+def create_vm_instance(os_conn_config, instance_config, image, network_dict, keypair_creator, inventory=None,
+                       ports=None, replace=False):
     """
     Creates a VM instance
     :param os_conn_config: The OpenStack credentials
@@ -113,46 +298,102 @@ def create_vm_instance(os_conn_config, instance_config, image, network_dict, key
     :param image: The VM image
     :param network_dict: A dictionary of network objects returned by OpenStack where the key contains the network name.
     :param keypair_creator: The object responsible for creating the keypair associated with this VM instance.
+    :param inventory: The TenantInventory shared by the deployment (Optional)
+    :param ports: The ports returned by create_vm_ports() (Optional - created here when None)
+    :param replace: T/F - when True, an existing VM with the same name is deleted first but its ports are kept
     :return: A reference to the VM instance object
     """
-    from openstack.create_network import PortSettings
+    if ports is None:
+        ports = create_vm_ports(os_conn_config, instance_config, network_dict, inventory)
+
+    vm_inst = __vm_creator(os_conn_config, instance_config, image, ports, keypair_creator, inventory)
+    if replace and vm_inst.discover():
+        logger.info('Replacing instance - ' + vm_inst.name)
+        if not vm_inst.remove_vm():
+            raise Exception('Unable to remove instance to be replaced - ' + vm_inst.name)
+    vm_inst.create()
+    return vm_inst
+
+
+def __vm_creator(os_conn_config, instance_config, image, ports, keypair_creator, inventory=None):
     from openstack.create_instance import OpenStackVmInstance
+    from openstack.create_image import OpenStackImage
 
-    os_creds = get_os_credentials(os_conn_config)
-    neutron = neutron_utils.neutron_client(os_creds)
     config = instance_config['instance']
-    ports_config = config['ports']
-    existing_ports = neutron.list_ports()['ports']
+    # TODO - need to configure in the image username
+    image_creator = OpenStackImage(image=image, image_user='centos')
+    return OpenStackVmInstance(get_os_credentials(os_conn_config), config['name'], config['flavor'], image_creator,
+                               ports, config['sudo_user'], keypair_creator, config.get('floating_ip'),
+                               inventory=inventory, policy=wait_policy.WaitPolicy(config.get('wait')))
+
+
+def discover_vm_ports(os_conn_config, instance_config, network_dict, inventory=None):
+    """
+    Returns the configured ports of a VM instance that exist, never creating any
+    :param os_conn_config: The OpenStack credentials
+    :param instance_config: The VM instance configuration
+    :param network_dict: A dictionary of the discovered network creators where the key is the network name
+    :param inventory: The TenantInventory shared by the deployment (Optional)
+    :return: A list of port objects
+    """
+    neutron = client_registry.get_client(get_os_credentials(os_conn_config), client_registry.NETWORK)
+    network_ids = dict()
+    for port_config in instance_config['instance']['ports']:
+        os_network_obj = network_dict.get(port_config['port']['network_name'])
+        if os_network_obj and os_network_obj.network:
+            network_ids[port_config['port']['network_name']] = os_network_obj.network['network']['id']
+    existing_ports = __index_ports(__list_ports(neutron, set(network_ids.values()), inventory))
+
     ports = list()
+    for port_config in instance_config['instance']['ports']:
+        network_id = network_ids.get(port_config['port']['network_name'])
+        existing_port = existing_ports.get((network_id, port_config['port']['name']))
+        if existing_port:
+            ports.append({'port': existing_port})
+    return ports
 
-    for port_config in ports_config:
-        network_name = port_config['port']['network_name']
-        port_name = port_config['port']['name']
-        found = False
-        for existing_port in existing_ports:
-            if existing_port['name'] == port_name:
-                existing_port_dict = {'port': existing_port}
-                ports.append(existing_port_dict)
-                found = True
-
-        if not found:
-            os_network_obj = network_dict.get(network_name)
-            if os_network_obj:
-                logger.info('Creating port [' + port_config['port']['name'] + '] for network name - ' + network_name)
-                port_setting = PortSettings(port_config)
-                ports.append(
-                    neutron_utils.create_port(neutron, port_setting, os_network_obj.network, os_network_obj.subnet))
-            else:
-                logger.warn('Cannot create port as associated network name of [' + network_name + '] not configured.')
-                raise Exception
 
-    from openstack.create_image import OpenStackImage
-    # TODO - need to configure in the image username
-    image_creator = OpenStackImage(image=image, image_user='centos')
-    vm_inst = OpenStackVmInstance(os_creds, config['name'], config['flavor'], image_creator, ports, config['sudo_user'],
-                                  keypair_creator, config.get('floating_ip'))
-    vm_inst.create()
-    return vm_inst
+def discover_environment(os_conn_config, os_config, inventory, image_dict, network_dict, keypairs_dict, vm_dict):
+    """
+    Resolves the configured resources against the tenant without creating, downloading or booting anything. Only the
+    resources that exist are added to the dictionaries so that cleaning costs no more than what is actually present.
+    :param os_conn_config: The OpenStack connection credentials
+    :param os_config: The 'openstack' section of the environment configuration
+    :param inventory: The TenantInventory shared by the deployment
+    :param image_dict: dictionary populated with the image creators where the key is the image name
+    :param network_dict: dictionary populated with the network creators where the key is the network name
+    :param keypairs_dict: dictionary populated with the keypair creators where the key is the keypair name
+    :param vm_dict: dictionary populated with the VM instance creators where the key is the VM name
+    """
+    for image_config_dict in os_config.get('images') or list():
+        image_config = image_config_dict.get('image')
+        if image_config and image_config.get('name'):
+            image_creator = __image_creator(os_conn_config, image_config, inventory)
+            if image_creator.discover():
+                image_dict[image_config['name']] = image_creator
+
+    for network_conf in os_config.get('networks') or list():
+        network_creator = __network_creator(os_conn_config, network_conf, inventory)
+        if network_creator.discover():
+            network_dict[network_conf['network']['name']] = network_creator
+
+    for keypair_conf in os_config.get('keypairs') or list():
+        keypair_creator = __keypair_creator(os_conn_config, keypair_conf['keypair'], inventory)
+        if keypair_creator.discover():
+            keypairs_dict[keypair_conf['keypair']['name']] = keypair_creator
+
+    for instance_config in os_config.get('instances') or list():
+        instance = instance_config.get('instance')
+        if not instance:
+            continue
+        ports = discover_vm_ports(os_conn_config, instance_config, network_dict, inventory)
+        vm_inst = __vm_creator(os_conn_config, instance_config, None, ports,
+                               keypairs_dict.get(instance.get('keypair_name')), inventory)
+        if vm_inst.discover() or ports:
+            vm_dict[instance['name']] = vm_inst
+
+    logger.info('Found ' + str(len(vm_dict)) + ' instances, ' + str(len(network_dict)) + ' networks, ' +
+                str(len(keypairs_dict)) + ' keypairs and ' + str(len(image_dict)) + ' images to clean')
 
 
 def create_images(os_conn_config, images_config):
@@ -173,29 +414,29 @@ def create_images(os_conn_config, images_config):
     return dict()
 
 
-def create_networks(os_conn_config, network_confs):
+def create_networks(os_conn_config, network_confs, inventory=None):
     """
     Returns a dictionary of networks where the key is the network name and the value is the network object
     :param os_conn_config: The OpenStack connection credentials
     :param network_confs: The list of network configurations
+    :param inventory: The TenantInventory shared by the deployment (Optional)
     :return: dictionary
     """
     if network_confs:
-        network_dict = {}
-        if network_confs:
-            for network_conf in network_confs:
-                net_name = network_conf['network']['name']
-                network_dict[net_name] = create_network(os_conn_config, network_conf)
+        network_dict = create_network_wave(os_conn_config, network_confs, inventory)
+        for network_creator in network_dict.values():
+            network_creator.create()
         logger.info('Created configured networks')
         return network_dict
     return dict()
 
 
-def create_keypairs(os_conn_config, keypair_confs):
+def create_keypairs(os_conn_config, keypair_confs, inventory=None):
     """
     Returns a dictionary of keypairs where the key is the keypair name and the value is the keypair object
     :param os_conn_config: The OpenStack connection credentials
     :param keypair_confs: The list of keypair configurations
+    :param inventory: The TenantInventory shared by the deployment (Optional)
     :return: dictionary
     """
     if keypair_confs:
@@ -203,13 +444,33 @@ def create_keypairs(os_conn_config, keypair_confs):
         if keypair_confs:
             for keypair_dict in keypair_confs:
                 keypair_config = keypair_dict['keypair']
-                keypairs_dict[keypair_config['name']] = create_keypair(os_conn_config, keypair_config)
+                keypairs_dict[keypair_config['name']] = create_keypair(os_conn_config, keypair_config, inventory)
         logger.info('Created configured keypairs')
         return keypairs_dict
     return dict()
 
 
-def create_instances(os_conn_config, instances_config, images, network_dict, keypairs_dict):
+def __get_instance_image(os_conn_config, instance, images, inventory=None):
+    """
+    Returns the image object with which a VM instance is to be created
+    :param os_conn_config: The OpenStack connection credentials
+    :param instance: The VM instance configuration
+    :param images: A dictionary of image creators where the key is the image name
+    :param inventory: The TenantInventory shared by the deployment (Optional)
+    :return: the image object or None
+    """
+    # Images not configured under 'images' are looked up in the tenant
+    image_creator = (images or dict()).get(instance.get('imageName'))
+    if image_creator:
+        return image_creator.image
+    elif inventory:
+        return inventory.find_by_name(tenant_inventory.IMAGES, instance.get('imageName'))
+    else:
+        nova = client_registry.get_client(get_os_credentials(os_conn_config), client_registry.COMPUTE)
+        return nova.images.find(name=instance.get('imageName'))
+
+
+def create_instances(os_conn_config, instances_config, images, network_dict, keypairs_dict, inventory=None):
     """
     Returns a dictionary of instances where the key is the instance name and the value is the VM object
     :param os_conn_config: The OpenStack connection credentials
@@ -217,6 +478,7 @@ def create_instances(os_conn_config, instances_config, images, network_dict, key
     :param images: A dictionary of images that will probably be used to instantiate the VM instance
     :param network_dict: A dictionary of networks that will probably be used to instantiate the VM instance
     :param keypairs_dict: A dictionary of keypairs that will probably be used to instantiate the VM instance
+    :param inventory: The TenantInventory shared by the deployment (Optional)
     :return: dictionary
     """
     if instances_config:
@@ -224,45 +486,31 @@ def create_instances(os_conn_config, instances_config, images, network_dict, key
         for instance_config in instances_config:
             instance = instance_config.get('instance')
             if instance:
-                if images:
-                    inst_image = images.get(instance.get('imageName')).image
-                else:
-                    nova = nova_utils.nova_client(os_credentials.OSCreds(os_conn_config.get('username'),
-                                                                         os_conn_config.get('password'),
-                                                                         os_conn_config.get('auth_url'),
-                                                                         os_conn_config.get('tenant_name'),
-                                                                         os_conn_config.get('http_proxy')))
-                    inst_image = nova.images.find(name=instance.get('imageName'))
+                inst_image = __get_instance_image(os_conn_config, instance, images, inventory)
                 if inst_image:
                     vm_dict[instance['name']] = create_vm_instance(os_conn_config, instance_config,
                                                                    inst_image, network_dict,
-                                                                   keypairs_dict[instance['keypair_name']])
+                                                                   keypairs_dict[instance['keypair_name']],
+                                                                   inventory)
 
         logger.info('Created configured instances')
         return vm_dict
     return dict()
 
 
-def __apply_ansible_playbooks(ansible_configs, vm_dict):
+def __apply_ansible_playbook_task(ansible_config, vm_dict):
     """
-    Applies ansible playbooks to running VMs with floating IPs
-    :param ansible_configs: a list of Ansible configurations
+    Waits for all of the playbook's hosts at once to accept SSH session requests and then applies the playbook
+    :param ansible_config: the configuration settings
     :param vm_dict: the dictionary of newly instantiated VMs where the VM name is the key
-    :return: t/f - true if successful
     """
-    logger.info("Applying Ansible Playbooks")
-    if ansible_configs:
-        # Ensure all hosts are accepting SSH session requests
-        for vm_inst in vm_dict.values():
-            if not vm_inst.vm_ssh_active(block=True):
-                logger.warn("Timeout waiting for instance to respond to SSH requests")
-                return False
+    from openstack.create_instance import fleet_ssh_active
 
-        # Apply playbooks
-        for ansible_config in ansible_configs:
-            apply_ansible_playbook(ansible_config, vm_dict)
-
-    return True
+    hosts = [vm_dict[host] for host in ansible_config.get('hosts') or list() if host in vm_dict]
+    ready, stragglers = fleet_ssh_active(hosts)
+    if stragglers:
+        raise Exception('Timeout waiting for instances [' + ', '.join(stragglers) + '] to respond to SSH requests')
+    apply_ansible_playbook(ansible_config, vm_dict)
 
 
 def apply_ansible_playbook(ansible_config, vm_dict):
@@ -412,6 +660,314 @@ def __get_vm_port_variable_value(var_config_values, vm_dict):
                             return port['port']['dns_assignment'][0]['ip_address']
 
 
+def __journal_begin(journal, resource_type, name, config):
+    """
+    Records that a resource is about to be created unless the journal already holds it
+    """
+    if journal:
+        entry = journal.get(resource_type, name)
+        if not entry or entry['status'] != deploy_journal.CREATED:
+            journal.begin(resource_type, name, config)
+
+
+def __journal_created(journal, resource_type, name, resource_id, config, adopted=False):
+    """
+    Records the ID of a created or adopted resource unless the journal already holds it
+    """
+    if journal and resource_id:
+        entry = journal.get(resource_type, name)
+        if not entry or entry['status'] != deploy_journal.CREATED or entry['id'] != resource_id:
+            journal.created(resource_type, name, resource_id, config, adopted)
+
+
+def __create_image_task(os_conn_config, image_config, inventory, image_dict, journal=None):
+    __journal_begin(journal, deploy_plan.IMAGE, image_config['name'], image_config)
+    image_creator = create_image(os_conn_config, image_config, inventory,
+                                 deploy_plan.adopted_resource(journal, inventory, deploy_plan.IMAGE,
+                                                              image_config['name']))
+    image_dict[image_config['name']] = image_creator
+    __journal_created(journal, deploy_plan.IMAGE, image_config['name'],
+                      tenant_inventory.get_attr(image_creator.image, 'id'), image_config, image_creator.adopted)
+
+
+def __create_network_wave_task(os_conn_config, network_confs, inventory, network_dict, journal=None):
+    for network_conf in network_confs:
+        __journal_begin(journal, deploy_plan.NETWORK, network_conf['network']['name'], network_conf['network'])
+    network_dict.update(create_network_wave(os_conn_config, network_confs, inventory))
+
+
+def __create_network_task(os_conn_config, network_conf, inventory, network_dict, journal=None):
+    config = network_conf['network']
+    network_creator = network_dict.get(config['name'])
+    if not network_creator:
+        __journal_begin(journal, deploy_plan.NETWORK, config['name'], config)
+        network_creator = __network_creator(os_conn_config, network_conf, inventory)
+    network_creator.create()
+    network_dict[config['name']] = network_creator
+    __journal_created(journal, deploy_plan.NETWORK, config['name'], network_creator.network['network']['id'], config)
+
+
+def __create_keypair_task(os_conn_config, keypair_config, inventory, keypairs_dict, journal=None):
+    __journal_begin(journal, deploy_plan.KEYPAIR, keypair_config['name'], keypair_config)
+    keypair_creator = create_keypair(os_conn_config, keypair_config, inventory)
+    keypairs_dict[keypair_config['name']] = keypair_creator
+    __journal_created(journal, deploy_plan.KEYPAIR, keypair_config['name'],
+                      tenant_inventory.get_attr(keypair_creator.keypair, 'id'), keypair_config)
+
+
+def __create_ports_wave_task(os_conn_config, instance_configs, network_dict, inventory):
+    create_ports_wave(os_conn_config, instance_configs, network_dict, inventory)
+
+
+def __create_ports_task(os_conn_config, instance_config, network_dict, inventory, ports_dict):
+    ports_dict[instance_config['instance']['name']] = create_vm_ports(os_conn_config, instance_config, network_dict,
+                                                                      inventory)
+
+
+def __create_instance_task(os_conn_config, instance_config, image_dict, network_dict, keypairs_dict, inventory,
+                           ports_dict, vm_dict, replace=False, journal=None):
+    instance = instance_config['instance']
+    inst_image = __get_instance_image(os_conn_config, instance, image_dict, inventory)
+    if inst_image:
+        __journal_begin(journal, deploy_plan.SERVER, instance['name'], instance)
+        vm_inst = create_vm_instance(os_conn_config, instance_config, inst_image, network_dict,
+                                     keypairs_dict[instance['keypair_name']], inventory, ports_dict[instance['name']],
+                                     replace)
+        vm_dict[instance['name']] = vm_inst
+        __journal_created(journal, deploy_plan.SERVER, instance['name'], tenant_inventory.get_attr(vm_inst.vm, 'id'),
+                          instance)
+
+
+def __config_nics_task(vm_name, vm_dict):
+    vm_inst = vm_dict.get(vm_name)
+    if vm_inst:
+        vm_inst.config_rpm_nics()
+
+
+def __playbook_vm_names(ansible_config):
+    """
+    Returns the names of the VMs a playbook is applied to or references in its variables
+    :param ansible_config: the configuration settings
+    :return: a set of VM names
+    """
+    vm_names = set(ansible_config.get('hosts') or list())
+    for value in (ansible_config.get('variables') or dict()).itervalues():
+        if value.get('vm_name'):
+            vm_names.add(value['vm_name'])
+    return vm_names
+
+
+def build_deploy_graph(os_conn_config, os_config, ansible_configs, inventory, image_dict, network_dict, keypairs_dict,
+                       vm_dict, plan=None, journal=None):
+    """
+    Compiles the environment configuration into a graph of tasks where each task depends only on the resources it
+    requires (image/network/keypair -> ports -> instance and floating IP -> NIC configuration -> playbooks).
+    The missing networks and subnets of all networks, then the missing ports of all VMs, are first created in bulk by
+    the 'networks' and 'ports' tasks; the task of each resource creates whatever they could not.
+    The dictionaries are populated by the tasks as they complete. When given a plan, only the VMs it creates have
+    their NICs configured and the servers it deletes are replaced. When given a journal, each image, network, keypair
+    and instance is recorded in it before and after it is created.
+    :param os_conn_config: The OpenStack connection credentials
+    :param os_config: The 'openstack' section of the environment configuration
+    :param ansible_configs: The list of Ansible configurations to apply (None when not provisioning)
+    :param inventory: The TenantInventory shared by the deployment
+    :param image_dict: dictionary populated with the image creators where the key is the image name
+    :param network_dict: dictionary populated with the network creators where the key is the network name
+    :param keypairs_dict: dictionary populated with the keypair creators where the key is the keypair name
+    :param vm_dict: dictionary populated with the VM instance creators where the key is the VM name
+    :param plan: The DeployPlan computed for the environment (Optional)
+    :param journal: The DeployJournal of the environment (Optional)
+    :return: the TaskGraph object
+    """
+    graph = task_graph.TaskGraph()
+
+    for image_config_dict in os_config.get('images') or list():
+        image_config = image_config_dict.get('image')
+        if image_config and image_config.get('name'):
+            graph.add('image:' + image_config['name'],
+                      functools.partial(__create_image_task, os_conn_config, image_config, inventory, image_dict,
+                                        journal))
+
+    network_confs = os_config.get('networks') or list()
+    if network_confs:
+        graph.add('networks', functools.partial(__create_network_wave_task, os_conn_config, network_confs, inventory,
+                                                network_dict, journal))
+    for network_conf in network_confs:
+        graph.add('network:' + network_conf['network']['name'],
+                  functools.partial(__create_network_task, os_conn_config, network_conf, inventory, network_dict,
+                                    journal),
+                  ['networks'])
+
+    for keypair_conf in os_config.get('keypairs') or list():
+        keypair_config = keypair_conf['keypair']
+        graph.add('keypair:' + keypair_config['name'],
+                  functools.partial(__create_keypair_task, os_conn_config, keypair_config, inventory, keypairs_dict,
+                                    journal))
+
+    instance_configs = [instance_config for instance_config in os_config.get('instances') or list()
+                        if instance_config.get('instance')]
+    if instance_configs:
+        # Only needs the networks and subnets, which the networks wave creates before any router
+        graph.add('ports', functools.partial(__create_ports_wave_task, os_conn_config, instance_configs, network_dict,
+                                             inventory),
+                  [dep for dep in ['networks'] if dep in graph.tasks])
+
+    ports_dict = dict()
+    # The last task readying each VM upon which its playbooks depend
+    vm_tasks = dict()
+    for instance_config in instance_configs:
+        instance = instance_config['instance']
+        vm_name = instance['name']
+
+        port_deps = ['ports'] + ['network:' + port_config['port']['network_name'] for port_config in instance['ports']]
+        graph.add('ports:' + vm_name,
+                  functools.partial(__create_ports_task, os_conn_config, instance_config, network_dict, inventory,
+                                    ports_dict),
+                  [dep for dep in port_deps if dep in graph.tasks])
+
+        instance_deps = ['ports:' + vm_name, 'image:' + str(instance.get('imageName')),
+                         'keypair:' + str(instance.get('keypair_name'))]
+        replace = bool(plan and plan.has(deploy_plan.DELETE, deploy_plan.SERVER, vm_name))
+        graph.add('instance:' + vm_name,
+                  functools.partial(__create_instance_task, os_conn_config, instance_config, image_dict, network_dict,
+                                    keypairs_dict, inventory, ports_dict, vm_dict, replace, journal),
+                  [dep for dep in instance_deps if dep in graph.tasks])
+
+        vm_tasks[vm_name] = 'instance:' + vm_name
+        if not plan or plan.has(deploy_plan.CREATE, deploy_plan.SERVER, vm_name):
+            vm_tasks[vm_name] = 'nics:' + vm_name
+            graph.add(vm_tasks[vm_name], functools.partial(__config_nics_task, vm_name, vm_dict),
+                      ['instance:' + vm_name])
+
+    if ansible_configs and vm_tasks:
+        previous = None
+        for index, ansible_config in enumerate(ansible_configs):
+            if not ansible_config:
+                continue
+            deps = [vm_tasks[vm_name] for vm_name in __playbook_vm_names(ansible_config) if vm_name in vm_tasks]
+            if not deps:
+                deps = vm_tasks.values()
+            if previous:
+                # Playbooks are applied in the configured order
+                deps.append(previous)
+            previous = 'playbook:' + str(index)
+            graph.add(previous, functools.partial(__apply_ansible_playbook_task, ansible_config, vm_dict), deps)
+
+    return graph
+
+
+def __clean_step(func, journal, resource_type, name):
+    """
+    Runs a clean step and then records the resource's deletion in the journal unless the step returned False
+    """
+    result = func()
+    if journal and result is not False:
+        journal.deleted(resource_type, name)
+    return result
+
+
+def build_clean_graph(image_dict, network_dict, keypairs_dict, vm_dict, clean_images, journal=None):
+    """
+    Returns a graph of tasks removing the deployed resources in the reverse order of their dependencies. Every server
+    delete is issued at once and the waits for them share one status poll, then floating IPs, ports, keypairs,
+    router interfaces, routers, subnets, networks and (optionally) images are each removed as soon as nothing
+    depending upon them remains. When given a journal, the deletion of each instance, keypair, network and image is
+    recorded in it and the images it records as adopted are forgotten without being deleted.
+    :param image_dict: dictionary of the image creators where the key is the image name
+    :param network_dict: dictionary of the network creators where the key is the network name
+    :param keypairs_dict: dictionary of the keypair creators where the key is the keypair name
+    :param vm_dict: dictionary of the VM instance creators where the key is the VM name
+    :param clean_images: T/F - when True the images are deleted too
+    :param journal: The DeployJournal of the environment (Optional)
+    :return: the TaskGraph object
+    """
+    graph = task_graph.TaskGraph()
+
+    net_names = dict()
+    for net_name, net_inst in network_dict.iteritems():
+        if net_inst.network:
+            net_names[net_inst.network['network']['id']] = net_name
+
+    network_port_tasks = dict()
+    for vm_name, vm_inst in vm_dict.iteritems():
+        graph.add('server-delete:' + vm_name, vm_inst.delete_vm)
+        graph.add('server-gone:' + vm_name,
+                  functools.partial(__clean_step, vm_inst.wait_vm_deleted, journal, deploy_plan.SERVER, vm_name),
+                  ['server-delete:' + vm_name])
+        graph.add('floating-ip:' + vm_name, vm_inst.clean_floating_ip, ['server-gone:' + vm_name])
+        graph.add('ports:' + vm_name, vm_inst.clean_ports, ['server-gone:' + vm_name])
+        for port in vm_inst.ports:
+            net_name = net_names.get(port['port'].get('network_id'))
+            if net_name:
+                network_port_tasks.setdefault(net_name, set()).update(['ports:' + vm_name, 'floating-ip:' + vm_name])
+
+    for kp_name, kp_inst in keypairs_dict.iteritems():
+        graph.add('keypair:' + kp_name,
+                  functools.partial(__clean_step, kp_inst.clean, journal, deploy_plan.KEYPAIR, kp_name),
+                  ['server-gone:' + vm_name for vm_name, vm_inst in vm_dict.iteritems()
+                   if vm_inst.keypair_creator is kp_inst])
+
+    for net_name, net_inst in network_dict.iteritems():
+        port_tasks = list(network_port_tasks.get(net_name, list()))
+        graph.add('router-interface:' + net_name, net_inst.clean_router_interface, port_tasks)
+        graph.add('router:' + net_name, net_inst.clean_router, ['router-interface:' + net_name])
+        graph.add('subnet:' + net_name, net_inst.clean_subnet, ['router-interface:' + net_name] + port_tasks)
+        graph.add('network:' + net_name,
+                  functools.partial(__clean_step, net_inst.clean_network, journal, deploy_plan.NETWORK, net_name),
+                  ['subnet:' + net_name])
+
+    if clean_images:
+        for image_name, image_inst in image_dict.iteritems():
+            graph.add('image:' + image_name,
+                      functools.partial(__clean_step, image_inst.clean, journal, deploy_plan.IMAGE, image_name),
+                      ['server-gone:' + vm_name for vm_name in vm_dict])
+        if journal:
+            # Images adopted from elsewhere by their content are left in place and only forgotten
+            for entry in journal.entries():
+                if entry['type'] == deploy_plan.IMAGE and entry.get('adopted') and entry['name'] not in image_dict:
+                    graph.add('image:' + entry['name'],
+                              functools.partial(journal.deleted, deploy_plan.IMAGE, entry['name']),
+                              ['server-gone:' + vm_name for vm_name in vm_dict])
+
+    return graph
+
+
+def __load_journal(journal, inventory):
+    """
+    Reads the journal of previous runs and makes the resources it records the ones found by name in the inventory
+    :param journal: the DeployJournal
+    :param inventory: the TenantInventory
+    :return: T/F - False when the journal is corrupt, belongs to another tenant or records resources that no longer
+             exist, in which case it must be rebuilt from the inventory
+    """
+    if not journal.load():
+        return False
+    for entry in journal.entries():
+        if entry['status'] == deploy_journal.CREATED and entry['type'] in deploy_plan.JOURNALED_TYPES:
+            inventory.pin(deploy_plan.JOURNALED_TYPES[entry['type']], entry['id'])
+    stale = deploy_plan.stale_entries(journal, inventory)
+    if stale:
+        logger.warn('Journal records resources that no longer exist - ' +
+                    ', '.join(sorted(entry['type'] + ':' + entry['name'] for entry in stale)))
+        return False
+    return True
+
+
+def __run_graph(graph, arguments):
+    """
+    Runs a task graph with the concurrency and failure policy from the command line and logs any failures
+    :param graph: the TaskGraph object
+    :param arguments: the command line arguments
+    :return: T/F - True when every task completed successfully
+    """
+    if graph.run(arguments.max_workers, arguments.continue_on_error is ARG_NOT_SET):
+        return True
+    logger.error('Failed tasks - ' + ', '.join(sorted(graph.errors.keys())))
+    if graph.skipped:
+        logger.error('Skipped tasks - ' + ', '.join(sorted(graph.skipped)))
+    return False
+
+
 def main(arguments):
     """
     Will need to set environment variable ANSIBLE_HOST_KEY_CHECKING=False or ...
@@ -436,6 +992,8 @@ def main(arguments):
         network_dict = {}
         keypairs_dict = {}
         vm_dict = {}
+        journal = None
+        failed = False
 
         if os_config:
             os_conn_config = os_config.get('connection')
@@ -444,52 +1002,88 @@ def main(arguments):
             if os_conn_config.get('http_proxy'):
                 os.environ['HTTP_PROXY'] = os_conn_config['http_proxy']
 
-            # Create images
-            image_dict = create_images(os_conn_config, os_config.get('images'))
-
-            # Create network
-            network_dict = create_networks(os_conn_config, os_config.get('networks'))
-
-            # Create keypairs
-            keypairs_dict = create_keypairs(os_conn_config, os_config.get('keypairs'))
-
-            # Create instance
-            # instances_config = os_config.get('instances')
-            # instance_config = None
-            vm_dict = create_instances(os_conn_config, os_config.get('instances'), image_dict, network_dict,
-                                       keypairs_dict)
-            logger.info('Completed creating all configured instances')
-
-            # TODO - Need to support other Linux flavors!
-            logger.info('Configuring RPM NICs where required')
-            for vm in vm_dict.itervalues():
-                vm.config_rpm_nics()
-            logger.info('Completed RPM NIC configuration')
+            # Size the HTTP connection pools shared by all clients
+            if os_conn_config.get('http'):
+                http_transport.configure(http_transport.TransportSettings(os_conn_config['http']))
+
+            # Reuse tokens from previous runs if requested
+            token_cache = arguments.token_cache or os_conn_config.get('token_cache')
+            if token_cache:
+                from openstack import keystone_utils
+                keystone_utils.enable_token_cache(token_cache)
+
+            # Share downloaded image files with other environments if requested
+            cache_config = os_config.get('image_cache') or dict()
+            cache_dir = arguments.image_cache or cache_config.get('path')
+            if cache_dir:
+                from openstack import create_image as create_image_module
+                max_size = cache_config.get('max_size_gb')
+                create_image_module.enable_image_cache(
+                    cache_dir, int(float(max_size) * 1024 * 1024 * 1024) if max_size else None)
+
+            # One snapshot of the tenant's resources is shared by every creator
+            inventory = tenant_inventory.TenantInventory(get_os_credentials(os_conn_config))
+            journal = deploy_journal.DeployJournal(
+                arguments.journal or deploy_journal.journal_path(arguments.environment),
+                os_conn_config.get('auth_url'), os_conn_config.get('tenant_name'))
+            rebuild_journal = not __load_journal(journal, inventory)
+
+            clean = arguments.clean is not ARG_NOT_SET
+            plan = deploy_plan.build_plan(os_config, inventory, clean, arguments.clean_image is not ARG_NOT_SET,
+                                          None if rebuild_journal else journal)
+            print plan.summary_table()
+            if arguments.plan is not ARG_NOT_SET:
+                logger.info('Plan only, no changes made')
+                __report_metrics(arguments)
+                exit(0)
+            if rebuild_journal:
+                journal.rebuild(deploy_plan.journal_resources(plan))
+
+            if clean:
+                # Only look up what exists, nothing is ever created when cleaning
+                discover_environment(os_conn_config, os_config, inventory, image_dict, network_dict, keypairs_dict,
+                                     vm_dict)
+            else:
+                # Create images, networks, keypairs and instances, then configure NICs and provision the VMs, each as
+                # soon as the resources it depends upon are ready
+                # TODO - Need to support other Linux flavors for the NIC configuration!
+                graph = build_deploy_graph(os_conn_config, os_config, config.get('ansible'), inventory, image_dict,
+                                           network_dict, keypairs_dict, vm_dict, plan, journal)
+                if not __run_graph(graph, arguments):
+                    failed = True
+                logger.info('Completed deploying configured resources')
 
         # Must enter either block
         if arguments.clean is not ARG_NOT_SET:
-            # Clean environment
-            for key, vm_inst in vm_dict.iteritems():
-                vm_inst.clean()
-            for key, kp_inst in keypairs_dict.iteritems():
-                kp_inst.clean()
-            for key, net_inst in network_dict.iteritems():
-                net_inst.clean()
-            if arguments.clean_image is not ARG_NOT_SET:
-                for key, image_inst in image_dict.iteritems():
-                    image_inst.clean()
-        elif arguments.deploy is not ARG_NOT_SET:
-            # Provision VMs
-            ansible_config = config.get('ansible')
-            if ansible_config and vm_dict:
-                if not __apply_ansible_playbooks(ansible_config, vm_dict):
-                    logger.error("Problem applying ansible playbooks")
+            # Clean environment, removing each resource once everything depending upon it has been removed
+            graph = build_clean_graph(image_dict, network_dict, keypairs_dict, vm_dict,
+                                      arguments.clean_image is not ARG_NOT_SET, journal)
+            if not __run_graph(graph, arguments):
+                failed = True
+            if journal:
+                journal.remove_if_empty()
+            logger.info('Completed cleaning configured resources')
     else:
         logger.error('Unable to read configuration file - ' + arguments.environment)
+        __report_metrics(arguments)
+        exit(1)
+    __report_metrics(arguments)
+    if failed:
         exit(1)
     exit(0)
 
 
+def __report_metrics(arguments):
+    """
+    Prints the per-operation API call summary and writes the JSON metrics file when requested
+    :param arguments: the command line arguments
+    """
+    metrics = api_metrics.get_metrics()
+    print metrics.summary_table()
+    if arguments.metrics_file:
+        metrics.dump(arguments.metrics_file)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--deploy', dest='deploy', nargs='?', default=ARG_NOT_SET,
@@ -498,8 +1092,28 @@ if __name__ == '__main__':
                         help='When used, the environment will be removed')
     parser.add_argument('-i', '--clean-image', dest='clean_image', nargs='?', default=ARG_NOT_SET,
                         help='When cleaning, if this is set, the image will be cleaned too')
+    parser.add_argument('-p', '--plan', dest='plan', nargs='?', default=ARG_NOT_SET,
+                        help='When used with -d or -c, the resources that would be created, deleted, left unchanged '
+                             'or found to differ from their configuration are printed and nothing is changed')
+    parser.add_argument('-g', '--image-cache', dest='image_cache', default=None,
+                        help='When set, downloaded image files are kept in this directory and reused by every '
+                             'environment')
+    parser.add_argument('-j', '--journal', dest='journal', default=None,
+                        help='The file in which the created resources are recorded (default: the environment file '
+                             'with the suffix .journal)')
     parser.add_argument('-e', '--env', dest='environment', required=True,
                         help='The environment configuration YAML file - REQUIRED')
+    parser.add_argument('-m', '--metrics-file', dest='metrics_file', default=None,
+                        help='When set, the API call counts, latencies, payload sizes and errors are written to this '
+                             'file as JSON')
+    parser.add_argument('-t', '--token-cache', dest='token_cache', default=None,
+                        help='When set, Keystone tokens and service catalogs are cached in this file (mode 0600) and '
+                             'reused by subsequent runs')
+    parser.add_argument('-w', '--max-workers', dest='max_workers', type=int, default=task_graph.DEFAULT_MAX_WORKERS,
+                        help='The maximum number of resources created or provisioned at once')
+    parser.add_argument('-x', '--continue-on-error', dest='continue_on_error', nargs='?', default=ARG_NOT_SET,
+                        help='When used, resources that do not depend on a failed one are still deployed rather than '
+                             'stopping at the first failure')
     args = parser.parse_args()
 
     if args.deploy is ARG_NOT_SET and args.clean is ARG_NOT_SET:
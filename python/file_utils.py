@@ -12,7 +12,13 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import hashlib
+import json
 import os
+import Queue
+import tempfile
+import threading
+import time
 import urllib2
 import logging
 
@@ -26,6 +32,34 @@ Utilities for basic file handling
 
 logger = logging.getLogger('file_utils')
 
+# The number of bytes read and written at once when downloading
+CHUNK_SIZE = 1024 * 1024
+
+# The minimum number of seconds between two download progress messages
+PROGRESS_INTERVAL = 5
+
+# Suffix of the temporary files into which downloads are written
+PART_SUFFIX = '.part'
+
+# Suffix of the file beside a partial download holding the progress of each of its segments
+STATE_SUFFIX = '.state'
+
+# The maximum number of connections on which a file is downloaded when the server supports range requests
+DOWNLOAD_CONNECTIONS = 4
+
+# The smallest number of bytes worth a connection of its own
+MIN_SEGMENT_SIZE = 16 * 1024 * 1024
+
+# The number of times a segment is resumed after its connection fails and the seconds between the first attempts
+SEGMENT_RETRIES = 3
+SEGMENT_RETRY_DELAY = 1
+
+# The minimum number of seconds between two writes of the progress of a segmented download
+STATE_INTERVAL = 1
+
+# The number of chunks a DownloadStream holds while its reader is busy
+STREAM_BUFFER_CHUNKS = 16
+
 
 def file_exists(file_path):
     """
@@ -39,25 +73,450 @@ def file_exists(file_path):
     return False
 
 
-def download(url, dest_path):
+def download(url, dest_path, chunk_size=CHUNK_SIZE, connections=DOWNLOAD_CONNECTIONS,
+             min_segment_size=MIN_SEGMENT_SIZE):
     """
-    Download a file to a destination path given a URL
-    :rtype : File object
+    Download a file to a destination path given a URL. The file is streamed in chunks of a fixed size into a
+    temporary file beside the destination, which is only renamed into place once it is complete so that an
+    interrupted download never leaves a partial file under the final name.
+    When the server supports range requests, the file is split into segments fetched on parallel connections and the
+    progress of each segment is persisted beside the temporary file so that calling download() again after a failure
+    resumes where it stopped. Otherwise the file is streamed on a single connection.
+    :param url: the URL of the file
+    :param dest_path: the directory into which the file is downloaded
+    :param chunk_size: the number of bytes read and written at once
+    :param connections: the maximum number of parallel connections
+    :param min_segment_size: the smallest number of bytes worth a connection of its own
+    :return: the path of the downloaded file
     """
     name = url.rsplit('/')[-1]
     dest = dest_path + '/' + name
+
+    response = open_url(url, (0, 0))
+    try:
+        size = __ranged_size(response)
+        if size is None:
+            logger.info('Downloading ' + url + ' on a single connection')
+            __download_stream(url, response, dest, chunk_size)
+            return dest
+        validator = response.info().getheader('ETag') or response.info().getheader('Last-Modified')
+    finally:
+        response.close()
+
+    part_path = dest + PART_SUFFIX
+    state_path = part_path + STATE_SUFFIX
+    state = __load_state(state_path, url, size, validator)
+    if state and os.path.isfile(part_path) and os.path.getsize(part_path) == size:
+        logger.info('Resuming download of ' + url)
+    else:
+        state = {'url': url, 'size': size, 'validator': validator,
+                 'segments': [[start, end, 0] for start, end in __segments(size, connections, min_segment_size)]}
+        with open(part_path, 'wb') as part_file:
+            part_file.truncate(size)
+
+    logger.info('Downloading ' + url + ' on ' + str(len(state['segments'])) + ' connections')
+    SegmentedDownload(url, part_path, state_path, state, chunk_size).run()
+    os.rename(part_path, dest)
+    os.remove(state_path)
+    return dest
+
+
+def open_url(url, byte_range=None):
+    """
+    Opens a URL without going through any configured proxy
+    :param url: the URL
+    :param byte_range: the (first, last) bytes to request (Optional)
+    :return: the response
+    """
+    request = urllib2.Request(url)
+    if byte_range:
+        request.add_header('Range', 'bytes=' + str(byte_range[0]) + '-' + str(byte_range[1]))
     try:
         # Override proxy settings to use localhost to download file
-        proxy_handler = urllib2.ProxyHandler({})
-        opener = urllib2.build_opener(proxy_handler)
-        urllib2.install_opener(opener)
-        response = urllib2.urlopen(url)
-    except (urllib2.HTTPError, urllib2.URLError):
-        raise Exception
-
-    with open(dest, 'wb') as f:
-        f.write(response.read())
-    return f
+        return urllib2.build_opener(urllib2.ProxyHandler({})).open(request)
+    except urllib2.HTTPError as e:
+        if e.code == 416 and byte_range:
+            # Range not satisfiable - i.e. an empty file
+            return open_url(url)
+        raise Exception('Unable to download ' + url + ' - ' + str(e))
+    except urllib2.URLError as e:
+        raise Exception('Unable to download ' + url + ' - ' + str(e))
+
+
+def __ranged_size(response):
+    """
+    Returns the size of a file from the response to a range request or None when the server ignored the range
+    """
+    if response.getcode() != 206:
+        return None
+    content_range = response.info().getheader('Content-Range') or ''
+    total = content_range.rsplit('/', 1)[-1]
+    if not total.isdigit():
+        return None
+    return int(total)
+
+
+def __segments(size, connections, min_segment_size):
+    """
+    Returns the (first, last) bytes of each segment of a file
+    """
+    count = max(1, min(connections, size / max(1, min_segment_size)))
+    step = size / count
+    bounds = [index * step for index in range(count)] + [size]
+    return [(bounds[index], bounds[index + 1] - 1) for index in range(count)]
+
+
+def __load_state(state_path, url, size, validator):
+    """
+    Returns the persisted progress of an interrupted download or None when there is none for this version of the file
+    """
+    if not os.path.isfile(state_path):
+        return None
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+    except (IOError, ValueError) as e:
+        logger.warn('Ignoring unreadable download state - ' + state_path + ' - ' + str(e))
+        return None
+    if state.get('url') != url or state.get('size') != size or state.get('validator') != validator:
+        logger.info('Restarting download of ' + url + ' as the file has changed')
+        return None
+    return state
+
+
+def __download_stream(url, response, dest, chunk_size):
+    """
+    Streams a response into a temporary file renamed to the destination once it is complete
+    """
+    dest_path, name = os.path.split(dest)
+    total = response.info().getheader('Content-Length')
+    total = int(total) if total else None
+    tmp_fd, tmp_path = tempfile.mkstemp(prefix='.' + name + '.', suffix=PART_SUFFIX, dir=dest_path)
+    try:
+        with os.fdopen(tmp_fd, 'wb') as tmp_file:
+            progress = DownloadProgress(url, total)
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                tmp_file.write(chunk)
+                progress.update(len(chunk))
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        progress.done()
+
+        if total is not None and progress.count != total:
+            raise Exception('Incomplete download of ' + url + ' - received ' + str(progress.count) + ' of ' +
+                            str(total) + ' bytes')
+        os.rename(tmp_path, dest)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class SegmentedDownload:
+    """
+    Downloads the segments of a file on parallel connections with range requests, each written at its offset in a
+    file already sized to the whole download. How much of each segment has been written is persisted at most once per
+    STATE_INTERVAL seconds and whenever the download stops, and a segment whose connection fails is resumed from
+    where it stopped up to SEGMENT_RETRIES times.
+    """
+
+    def __init__(self, url, part_path, state_path, state, chunk_size=CHUNK_SIZE):
+        """
+        Constructor
+        :param url: the URL of the file
+        :param part_path: the file into which the segments are written
+        :param state_path: the file into which the progress is persisted
+        :param state: a dictionary with the keys url, size, validator and segments, a list of
+                      [first byte, last byte, number of bytes written] lists
+        :param chunk_size: the number of bytes read and written at once
+        """
+        self.url = url
+        self.part_path = part_path
+        self.state_path = state_path
+        self.state = state
+        self.chunk_size = chunk_size
+        written = sum(segment[2] for segment in state['segments'])
+        self.progress = DownloadProgress(url, state['size'], initial=written)
+        self.__errors = list()
+        self.__last_save = 0
+        self.__lock = threading.Lock()
+
+    def run(self):
+        """
+        Downloads every segment not yet written
+        :raises Exception: when any segment could not be downloaded; the progress is kept to resume from
+        """
+        threads = list()
+        for index, segment in enumerate(self.state['segments']):
+            if segment[0] + segment[2] <= segment[1]:
+                thread = threading.Thread(target=self.__run_segment, args=(index,))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+        for thread in threads:
+            thread.join()
+        self.__save(True)
+
+        if self.__errors:
+            raise Exception('Download of ' + self.url + ' stopped after ' + str(self.progress.count) + ' of ' +
+                            str(self.state['size']) + ' bytes and will resume from there - ' + str(self.__errors[0]))
+        with open(self.part_path, 'rb') as part_file:
+            os.fsync(part_file.fileno())
+        self.progress.done()
+
+    def __run_segment(self, index):
+        attempt = 0
+        while True:
+            try:
+                self.__fetch_segment(index)
+                return
+            except Exception as e:
+                attempt += 1
+                if attempt > SEGMENT_RETRIES:
+                    logger.warn('Giving up on segment ' + str(index) + ' of ' + self.url + ' - ' + str(e))
+                    with self.__lock:
+                        self.__errors.append(e)
+                    return
+                logger.warn('Resuming segment ' + str(index) + ' of ' + self.url + ' after error - ' + str(e))
+                time.sleep(SEGMENT_RETRY_DELAY * attempt)
+
+    def __fetch_segment(self, index):
+        segment = self.state['segments'][index]
+        position = segment[0] + segment[2]
+        last = segment[1]
+        if position > last:
+            return
+
+        response = open_url(self.url, (position, last))
+        try:
+            if response.getcode() != 206:
+                raise Exception('Server ignored the range request for bytes ' + str(position) + '-' + str(last))
+            # Unbuffered so that the persisted progress never counts bytes still held in memory
+            with open(self.part_path, 'r+b', 0) as part_file:
+                part_file.seek(position)
+                while position <= last:
+                    chunk = response.read(min(self.chunk_size, last - position + 1))
+                    if not chunk:
+                        raise Exception('Connection closed at byte ' + str(position) + ' of segment ending at ' +
+                                        str(last))
+                    part_file.write(chunk)
+                    position += len(chunk)
+                    with self.__lock:
+                        segment[2] += len(chunk)
+                    self.progress.update(len(chunk))
+                    self.__save()
+        finally:
+            response.close()
+
+    def __save(self, force=False):
+        """
+        Persists the progress of every segment, atomically replacing the previous state
+        """
+        with self.__lock:
+            now = time.time()
+            if not force and now - self.__last_save < STATE_INTERVAL:
+                return
+            self.__last_save = now
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w') as state_file:
+                json.dump(self.state, state_file)
+            os.rename(tmp_path, self.state_path)
+
+
+class DownloadStream:
+    """
+    File-like object returning the content of a URL as a background thread downloads it into a bounded buffer, so
+    that the download overlaps with whatever reads it (i.e. an upload) and at most buffer_chunks chunks are ever held
+    in memory. The sha256 and md5 digests of the content are computed as it is downloaded and it can be copied into a
+    file at the same time.
+    """
+
+    def __init__(self, url, copy_path=None, chunk_size=CHUNK_SIZE, buffer_chunks=STREAM_BUFFER_CHUNKS):
+        """
+        Constructor - opens the URL and starts downloading
+        :param url: the URL
+        :param copy_path: a file into which the content is also written (Optional)
+        :param chunk_size: the number of bytes downloaded at once
+        :param buffer_chunks: the maximum number of chunks downloaded but not yet read
+        """
+        self.url = url
+        self.copy_path = copy_path
+        self.chunk_size = chunk_size
+        self.response = open_url(url)
+        size = self.response.info().getheader('Content-Length')
+        self.size = int(size) if size else None
+        self.progress = DownloadProgress(url, self.size)
+        self.__queue = Queue.Queue(buffer_chunks)
+        self.__pending = ''
+        self.__offset = 0
+        self.__eof = False
+        self.__closed = False
+        self.__error = None
+        self.__hashes = {'sha256': hashlib.sha256(), 'md5': hashlib.md5()}
+        self.__copy_file = open(copy_path, 'wb') if copy_path else None
+        self.__thread = threading.Thread(target=self.__fill)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def read(self, size=-1):
+        """
+        Returns the next bytes of the content, waiting for them to be downloaded
+        :param size: the maximum number of bytes to return (all of the remaining content when negative)
+        :return: the bytes, an empty string once all have been read
+        :raises Exception: when the download failed
+        """
+        parts = list()
+        remaining = size
+        while size < 0 or remaining > 0:
+            if self.__offset >= len(self.__pending):
+                if self.__eof:
+                    break
+                chunk = self.__queue.get()
+                if chunk is None:
+                    raise Exception('Download of ' + self.url + ' failed - ' + str(self.__error))
+                if not chunk:
+                    self.__eof = True
+                self.__pending = chunk
+                self.__offset = 0
+                continue
+            end = len(self.__pending)
+            if size >= 0:
+                end = min(end, self.__offset + remaining)
+                remaining -= end - self.__offset
+            parts.append(self.__pending[self.__offset:end])
+            self.__offset = end
+        return ''.join(parts)
+
+    def digests(self):
+        """
+        Returns the digests of the content once it has all been read
+        :return: a dictionary of hex digests keyed by algorithm (sha256 and md5)
+        """
+        if self.read(1):
+            raise Exception('Download of ' + self.url + ' has not been read completely')
+        return dict((algorithm, digest.hexdigest()) for algorithm, digest in self.__hashes.items())
+
+    def close(self):
+        """
+        Stops the download, if still running, and closes the copy
+        """
+        self.__closed = True
+        self.__thread.join()
+        self.response.close()
+        if self.__copy_file and not self.__copy_file.closed:
+            self.__copy_file.close()
+
+    def __fill(self):
+        try:
+            while True:
+                chunk = self.response.read(self.chunk_size)
+                if chunk:
+                    for digest in self.__hashes.values():
+                        digest.update(chunk)
+                    if self.__copy_file:
+                        self.__copy_file.write(chunk)
+                    self.progress.update(len(chunk))
+                elif self.size is not None and self.progress.count != self.size:
+                    raise Exception('received ' + str(self.progress.count) + ' of ' + str(self.size) + ' bytes')
+                else:
+                    if self.__copy_file:
+                        self.__copy_file.flush()
+                        os.fsync(self.__copy_file.fileno())
+                        self.__copy_file.close()
+                    self.progress.done()
+                if not self.__put(chunk) or not chunk:
+                    return
+        except Exception as e:
+            logger.warn('Download of ' + self.url + ' failed - ' + str(e))
+            self.__error = e
+            self.__put(None)
+
+    def __put(self, item):
+        """
+        Waits for room in the buffer unless the stream is closed
+        :return: T/F - False when the stream was closed
+        """
+        while not self.__closed:
+            try:
+                self.__queue.put(item, timeout=1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+
+class DownloadProgress:
+    """
+    Counts the bytes of a download and logs how many have been received and at what rate at most once per interval
+    """
+
+    def __init__(self, url, total=None, interval=PROGRESS_INTERVAL, initial=0):
+        """
+        Constructor
+        :param url: the URL being downloaded
+        :param total: the expected number of bytes (Optional)
+        :param interval: the minimum number of seconds between two log messages
+        :param initial: the number of bytes received before this run (i.e. when resuming)
+        """
+        self.url = url
+        self.total = total
+        self.interval = interval
+        self.initial = initial
+        self.count = initial
+        self.start = time.time()
+        self.__last_log = self.start
+        self.__lock = threading.Lock()
+
+    def update(self, count):
+        """
+        Adds bytes that have been received
+        :param count: the number of bytes
+        """
+        with self.__lock:
+            self.count += count
+            now = time.time()
+            if now - self.__last_log >= self.interval:
+                self.__last_log = now
+                self.__log(now)
+
+    def rate(self, now=None):
+        """
+        Returns the average number of bytes received per second since the download started
+        """
+        elapsed = (now or time.time()) - self.start
+        if elapsed <= 0:
+            return 0.0
+        return (self.count - self.initial) / elapsed
+
+    def done(self):
+        """
+        Logs the final size and rate of the download
+        """
+        now = time.time()
+        logger.info('Downloaded ' + str(self.count - self.initial) + ' bytes from ' + self.url + ' in ' +
+                    '%.1f' % (now - self.start) + 's (' + format_bytes(self.rate(now)) + '/s)')
+
+    def __log(self, now):
+        message = 'Downloaded ' + format_bytes(self.count)
+        if self.total:
+            message += ' of ' + format_bytes(self.total) + ' (' + str(self.count * 100 / self.total) + '%)'
+        logger.info(message + ' at ' + format_bytes(self.rate(now)) + '/s from ' + self.url)
+
+
+def format_bytes(count):
+    """
+    Returns a number of bytes in human readable form (i.e. 1.5 MB)
+    :param count: the number of bytes
+    :return: the string
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(count) < 1024.0:
+            return '%.1f %s' % (count, unit)
+        count /= 1024.0
+    return '%.1f TB' % count
 
 
 def read_yaml(config_file_path):
@@ -0,0 +1,321 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import functools
+import json
+import logging
+import threading
+import time
+import types
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('api_metrics')
+
+"""
+Call count, latency, payload size and error instrumentation for the OpenStack clients, with the time spent in the
+helpers making those calls reported separately
+"""
+
+# Upper bounds in seconds of each latency histogram bucket, the last bucket collects everything slower
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+class OperationStats:
+    """
+    Aggregated measurements for a single operation
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = 0.0
+        self.payload_bytes = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, elapsed, payload_size, error):
+        """
+        Adds a single call's measurements
+        :param elapsed: the call's duration in seconds
+        :param payload_size: the size in bytes of the call's response
+        :param error: True when the call raised an exception
+        """
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.total_time += elapsed
+        if self.min_time is None or elapsed < self.min_time:
+            self.min_time = elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.payload_bytes += payload_size
+
+        bucket = len(LATENCY_BUCKETS)
+        for index, upper_bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= upper_bound:
+                bucket = index
+                break
+        self.histogram[bucket] += 1
+
+    def as_dict(self):
+        """
+        Returns a JSON serializable representation of this object
+        """
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_time': self.total_time,
+            'mean_time': self.total_time / self.count if self.count else 0.0,
+            'min_time': self.min_time or 0.0,
+            'max_time': self.max_time,
+            'payload_bytes': self.payload_bytes,
+            'histogram': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['inf'], self.histogram)),
+        }
+
+
+class ApiMetrics:
+    """
+    Thread-safe collection of OperationStats keyed by operation name. The API calls recorded by the clients and the
+    helpers timed with timed() are kept apart as a helper's time includes the API calls it makes.
+    """
+
+    def __init__(self):
+        self.__stats = dict()
+        self.__helper_stats = dict()
+        self.__lock = threading.Lock()
+
+    def record(self, operation, elapsed, payload_size=0, error=False):
+        """
+        Adds a single API call's measurements to the named operation
+        :param operation: the operation name (i.e. 'network.create_port')
+        :param elapsed: the call's duration in seconds
+        :param payload_size: the size in bytes of the call's response
+        :param error: True when the call raised an exception
+        """
+        self.__record(self.__stats, operation, elapsed, payload_size, error)
+
+    def record_helper(self, operation, elapsed, error=False):
+        """
+        Adds a single helper call's duration to the named helper
+        :param operation: the helper name (i.e. 'neutron_utils.get_network')
+        :param elapsed: the call's duration in seconds
+        :param error: True when the call raised an exception
+        """
+        self.__record(self.__helper_stats, operation, elapsed, 0, error)
+
+    def __record(self, stats_dict, operation, elapsed, payload_size, error):
+        with self.__lock:
+            stats = stats_dict.get(operation)
+            if not stats:
+                stats = OperationStats()
+                stats_dict[operation] = stats
+            stats.record(elapsed, payload_size, error)
+
+    def reset(self):
+        """
+        Discards all measurements
+        """
+        with self.__lock:
+            self.__stats.clear()
+            self.__helper_stats.clear()
+
+    def as_dict(self):
+        """
+        Returns a JSON serializable dictionary of each API operation's statistics
+        """
+        with self.__lock:
+            return dict((operation, stats.as_dict()) for operation, stats in self.__stats.iteritems())
+
+    def helpers_as_dict(self):
+        """
+        Returns a JSON serializable dictionary of each helper's statistics
+        """
+        with self.__lock:
+            return dict((operation, stats.as_dict()) for operation, stats in self.__helper_stats.iteritems())
+
+    def dump(self, file_path):
+        """
+        Writes the statistics to a JSON file with the API operations under 'api' and the helpers under 'helpers'
+        :param file_path: the file to write
+        """
+        with open(file_path, 'w') as metrics_file:
+            json.dump({'api': self.as_dict(), 'helpers': self.helpers_as_dict()}, metrics_file, indent=2,
+                      sort_keys=True)
+        logger.info('Wrote API metrics to - ' + file_path)
+
+    def summary_table(self):
+        """
+        Returns a human readable table of each API operation sorted by total time spent followed by their totals, then
+        when any were timed, a table of the helpers which is not part of the totals
+        :return: the table string
+        """
+        rows = sorted(self.as_dict().iteritems(), key=lambda item: item[1]['total_time'], reverse=True)
+        helper_rows = sorted(self.helpers_as_dict().iteritems(), key=lambda item: item[1]['total_time'],
+                             reverse=True)
+        name_width = max([len('operation')] + [len(operation) for operation, _ in rows + helper_rows])
+        row_format = '{0:<' + str(name_width) + '} {1:>7} {2:>7} {3:>10} {4:>10} {5:>10} {6:>12}'
+        lines = [row_format.format('operation', 'calls', 'errors', 'total(s)', 'mean(s)', 'max(s)', 'bytes')]
+        for operation, stats in rows:
+            lines.append(row_format.format(operation, stats['count'], stats['errors'],
+                                           '%.3f' % stats['total_time'], '%.3f' % stats['mean_time'],
+                                           '%.3f' % stats['max_time'], stats['payload_bytes']))
+        count = sum(stats['count'] for _, stats in rows)
+        total_time = sum(stats['total_time'] for _, stats in rows)
+        lines.append(row_format.format('total', count, sum(stats['errors'] for _, stats in rows),
+                                       '%.3f' % total_time, '%.3f' % (total_time / count if count else 0.0),
+                                       '%.3f' % max([0.0] + [stats['max_time'] for _, stats in rows]),
+                                       sum(stats['payload_bytes'] for _, stats in rows)))
+
+        if helper_rows:
+            lines.append('')
+            lines.append(row_format.format('helper', 'calls', 'errors', 'total(s)', 'mean(s)', 'max(s)', ''))
+            for operation, stats in helper_rows:
+                lines.append(row_format.format(operation, stats['count'], stats['errors'],
+                                               '%.3f' % stats['total_time'], '%.3f' % stats['mean_time'],
+                                               '%.3f' % stats['max_time'], ''))
+        return '\n'.join(lines)
+
+
+_metrics = ApiMetrics()
+
+
+def get_metrics():
+    """
+    Returns the process-wide metrics collection
+    :return: the ApiMetrics object
+    """
+    return _metrics
+
+
+def payload_size(value):
+    """
+    Returns an estimate of the size in bytes of an API response
+    :param value: a response dictionary, client resource object or list of either
+    :return: the number of bytes
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(item) for item in value)
+    if isinstance(value, basestring):
+        return len(value)
+    body = getattr(value, '_info', value)
+    if isinstance(body, dict):
+        try:
+            return len(json.dumps(body))
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+def call(operation, func, *args, **kwargs):
+    """
+    Invokes an API function and records its latency, response size and whether it raised under the operation name.
+    A lazy result (i.e. the generator returned by glance.images.list) is recorded once it has been iterated over with
+    the time spent fetching its items.
+    :param operation: the operation name
+    :param func: the function to invoke
+    :return: the function's return value
+    """
+    start = time.time()
+    try:
+        result = func(*args, **kwargs)
+    except Exception:
+        _metrics.record(operation, time.time() - start, error=True)
+        raise
+    if isinstance(result, types.GeneratorType):
+        return __iterate(operation, time.time() - start, result)
+    _metrics.record(operation, time.time() - start, payload_size(result))
+    return result
+
+
+def __iterate(operation, elapsed, iterator):
+    """
+    Yields the items of a lazy API result and records the time spent fetching them along with their size once it is
+    exhausted, fails or is abandoned
+    """
+    size = 0
+    while True:
+        start = time.time()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            _metrics.record(operation, elapsed + time.time() - start, size)
+            return
+        except Exception:
+            _metrics.record(operation, elapsed + time.time() - start, size, error=True)
+            raise
+        elapsed += time.time() - start
+        size += payload_size(item)
+        try:
+            yield item
+        except GeneratorExit:
+            _metrics.record(operation, elapsed, size)
+            raise
+
+
+def timed(operation):
+    """
+    Decorator recording the duration of every call of the decorated helper under the operation name. Helpers are
+    reported apart from the API calls they make, which are recorded by the InstrumentedClient.
+    :param operation: the helper name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                _metrics.record_helper(operation, time.time() - start, error=True)
+                raise
+            _metrics.record_helper(operation, time.time() - start)
+            return result
+        return wrapper
+    return decorator
+
+
+class InstrumentedClient(object):
+    """
+    Proxy for an OpenStack client recording each method called on the client or on one of its managers
+    (i.e. nova.servers.create is recorded as 'compute.servers.create')
+    """
+
+    def __init__(self, client, prefix, depth=1):
+        """
+        Constructor
+        :param client: the client or manager object to proxy
+        :param prefix: the operation name prefix
+        :param depth: the number of attribute levels below this one that are also proxied
+        """
+        object.__setattr__(self, '_client', client)
+        object.__setattr__(self, '_prefix', prefix)
+        object.__setattr__(self, '_depth', depth)
+
+    def __getattr__(self, name):
+        value = getattr(self._client, name)
+        if name.startswith('_'):
+            return value
+        operation = self._prefix + '.' + name
+        if callable(value) and not isinstance(value, type):
+            def wrapper(*args, **kwargs):
+                return call(operation, value, *args, **kwargs)
+            return wrapper
+        if self._depth > 0 and hasattr(value, '__dict__') and not isinstance(value, type):
+            return InstrumentedClient(value, operation, self._depth - 1)
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
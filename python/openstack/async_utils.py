@@ -0,0 +1,225 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+import glance_utils
+import neutron_utils
+import nova_utils
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('async_utils')
+
+"""
+Non-blocking variants of the neutron_utils, nova_utils and glance_utils operations used for provisioning.
+
+Each function has the same name and parameters as its blocking counterpart but returns immediately with an
+AsyncResult whose get() method returns the value (or raises the exception) of the underlying call. All calls share
+one bounded worker pool, so many requests can be in flight at once without a thread per request. Keep the pool size
+at or below the HTTP transport's pool_maxsize so that every worker has a persistent connection available.
+"""
+
+DEFAULT_POOL_SIZE = 20
+
+_pool = None
+_pool_size = DEFAULT_POOL_SIZE
+_pool_lock = threading.Lock()
+
+
+def set_pool_size(size):
+    """
+    Sets the number of requests that may be in flight at once. Takes effect on the next submitted call.
+    :param size: the number of worker threads
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        _pool_size = size
+        if _pool:
+            _pool.close()
+        _pool = None
+
+
+def submit(func, *args, **kwargs):
+    """
+    Runs any blocking function on the shared worker pool
+    :param func: the function to call
+    :return: the AsyncResult object
+    """
+    global _pool
+    with _pool_lock:
+        if not _pool:
+            logger.debug('Starting async worker pool with ' + str(_pool_size) + ' workers')
+            _pool = ThreadPool(_pool_size)
+        return _pool.apply_async(func, args, kwargs)
+
+
+def wait_all(async_results, timeout=None):
+    """
+    Blocks until every call has completed and returns their values in order
+    :param async_results: a list of AsyncResult objects
+    :param timeout: (Optional) the maximum number of seconds to wait for each result
+    :return: the list of values
+    :raises: the first exception raised by any of the calls
+    """
+    return [async_result.get(timeout) for async_result in async_results]
+
+
+"""
+Neutron
+"""
+
+
+def create_network(neutron, network_settings):
+    return submit(neutron_utils.create_network, neutron, network_settings)
+
+
+def create_networks(neutron, network_settings_list):
+    return submit(neutron_utils.create_networks, neutron, network_settings_list)
+
+
+def delete_network(neutron, network):
+    return submit(neutron_utils.delete_network, neutron, network)
+
+
+def get_networks(neutron):
+    return submit(neutron_utils.get_networks, neutron)
+
+
+def get_network_by_name(neutron, network_name):
+    return submit(neutron_utils.get_network_by_name, neutron, network_name)
+
+
+def create_subnet(neutron, subnet_settings, network=None):
+    return submit(neutron_utils.create_subnet, neutron, subnet_settings, network)
+
+
+def create_subnets(neutron, subnet_requests):
+    return submit(neutron_utils.create_subnets, neutron, subnet_requests)
+
+
+def delete_subnet(neutron, subnet):
+    return submit(neutron_utils.delete_subnet, neutron, subnet)
+
+
+def get_subnets(neutron):
+    return submit(neutron_utils.get_subnets, neutron)
+
+
+def get_subnet_by_name(neutron, subnet_name):
+    return submit(neutron_utils.get_subnet_by_name, neutron, subnet_name)
+
+
+def create_router(neutron, router_settings):
+    return submit(neutron_utils.create_router, neutron, router_settings)
+
+
+def delete_router(neutron, router):
+    return submit(neutron_utils.delete_router, neutron, router)
+
+
+def get_routers(neutron):
+    return submit(neutron_utils.get_routers, neutron)
+
+
+def get_router_by_name(neutron, router_name):
+    return submit(neutron_utils.get_router_by_name, neutron, router_name)
+
+
+def add_interface_router(neutron, router, subnet):
+    return submit(neutron_utils.add_interface_router, neutron, router, subnet)
+
+
+def remove_interface_router(neutron, router, subnet):
+    return submit(neutron_utils.remove_interface_router, neutron, router, subnet)
+
+
+def create_port(neutron, port_settings, network, subnet=None):
+    return submit(neutron_utils.create_port, neutron, port_settings, network, subnet)
+
+
+def create_ports(neutron, port_requests):
+    return submit(neutron_utils.create_ports, neutron, port_requests)
+
+
+def delete_port(neutron, port):
+    return submit(neutron_utils.delete_port, neutron, port)
+
+
+def get_ports(neutron, network_ids=None):
+    return submit(neutron_utils.get_ports, neutron, network_ids)
+
+
+"""
+Nova
+"""
+
+
+def create_server(nova, name, flavor, image, nics, key_name=None, userdata=None):
+    return submit(nova_utils.create_server, nova, name, flavor, image, nics, key_name, userdata)
+
+
+def get_servers(nova, search_opts=None):
+    return submit(nova_utils.get_servers, nova, search_opts)
+
+
+def delete_server(nova, server):
+    return submit(nova_utils.delete_server, nova, server)
+
+
+def upload_keypair(nova, name, key):
+    return submit(nova_utils.upload_keypair, nova, name, key)
+
+
+def get_keypairs(nova):
+    return submit(nova_utils.get_keypairs, nova)
+
+
+def delete_keypair(nova, key):
+    return submit(nova_utils.delete_keypair, nova, key)
+
+
+def get_flavors(nova):
+    return submit(nova_utils.get_flavors, nova)
+
+
+def create_floating_ip(nova, ext_net_name):
+    return submit(nova_utils.create_floating_ip, nova, ext_net_name)
+
+
+def get_floating_ips(nova):
+    return submit(nova_utils.get_floating_ips, nova)
+
+
+def delete_floating_ip(nova, floating_ip):
+    return submit(nova_utils.delete_floating_ip, nova, floating_ip)
+
+
+"""
+Glance
+"""
+
+
+def create_image(glance, name, disk_format, image_file_path):
+    return submit(glance_utils.create_image, glance, name, disk_format, image_file_path)
+
+
+def get_images(glance):
+    return submit(glance_utils.get_images, glance)
+
+
+def delete_image(glance, image):
+    return submit(glance_utils.delete_image, glance, image)
@@ -0,0 +1,113 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import threading
+
+import api_metrics
+import glance_utils
+import neutron_utils
+import nova_utils
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('client_registry')
+
+"""
+Process-wide registry of OpenStack clients so each credential set and service type is only ever served by one client
+"""
+
+NETWORK = 'network'
+COMPUTE = 'compute'
+IMAGE = 'image'
+
+
+class ClientRegistry:
+    """
+    Thread-safe cache of OpenStack client objects keyed by credentials and service type. Each client is wrapped so
+    that every call made through it is recorded by api_metrics.
+    """
+
+    def __init__(self, factories=None):
+        """
+        Constructor
+        :param factories: (Optional) dictionary of service type to a function accepting an OSCreds object and
+                          returning a new client. Defaults to the *_utils client factories.
+        """
+        if factories:
+            self.factories = factories
+        else:
+            self.factories = {
+                NETWORK: neutron_utils.neutron_client,
+                COMPUTE: nova_utils.nova_client,
+                IMAGE: glance_utils.glance_client,
+            }
+        self.__clients = dict()
+        self.__lock = threading.Lock()
+
+    def get_client(self, os_creds, service_type):
+        """
+        Returns the client for the credentials and service type, building it on the first request
+        :param os_creds: the credentials for connecting to the OpenStack remote API
+        :param service_type: one of NETWORK, COMPUTE or IMAGE
+        :return: the client object
+        """
+        key = (os_creds, service_type)
+        with self.__lock:
+            client = self.__clients.get(key)
+            if not client:
+                factory = self.factories.get(service_type)
+                if not factory:
+                    raise Exception('No client factory registered for service type - ' + str(service_type))
+                logger.debug('Registering new ' + service_type + ' client')
+                client = api_metrics.InstrumentedClient(factory(os_creds), service_type)
+                self.__clients[key] = client
+            return client
+
+    def clear(self):
+        """
+        Discards all cached clients
+        """
+        with self.__lock:
+            self.__clients.clear()
+
+
+_registry = ClientRegistry()
+
+
+def set_registry(registry):
+    """
+    Replaces the process-wide registry (i.e. with one built from stub factories for testing)
+    :param registry: the ClientRegistry instance to use from now on
+    """
+    global _registry
+    _registry = registry
+
+
+def get_registry():
+    """
+    Returns the process-wide registry
+    :return: the ClientRegistry instance
+    """
+    return _registry
+
+
+def get_client(os_creds, service_type):
+    """
+    The single entry point through which creators and deployment helpers obtain OpenStack clients
+    :param os_creds: the credentials for connecting to the OpenStack remote API
+    :param service_type: one of NETWORK, COMPUTE or IMAGE
+    :return: the shared client object
+    """
+    return _registry.get_client(os_creds, service_type)
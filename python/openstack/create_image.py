@@ -14,16 +14,35 @@
 # limitations under the License.
 import logging
 import os
-import shutil
 
 import file_utils
 
 import glance_utils
+from openstack import client_registry
+from openstack import image_cache
+from openstack import tenant_inventory
 
 __author__ = 'spisarski'
 
 logger = logging.getLogger('create_image')
 
+# The visibilities Glance may give an image created without one
+DEFAULT_VISIBILITIES = ('private', 'shared')
+
+_image_cache = None
+
+
+def enable_image_cache(cache_dir, max_size=None):
+    """
+    Opts in to keeping downloaded image files in a cache shared by every environment deployed from this host. Applies
+    to the OpenStackImage objects created afterwards.
+    :param cache_dir: the cache directory
+    :param max_size: the maximum number of bytes of image files kept (Optional)
+    """
+    global _image_cache
+    logger.info('Caching image files in - ' + cache_dir)
+    _image_cache = image_cache.ImageCache(cache_dir, max_size)
+
 
 class OpenStackImage:
     """
@@ -31,7 +50,8 @@ class OpenStackImage:
     """
 
     def __init__(self, os_creds=None, image_user=None, image_format=None, image_url=None, image_name=None,
-                 download_path=None, image=None):
+                 download_path=None, image=None, inventory=None, checksum=None, cache=None, stream=False,
+                 visibility=None):
         """
         Constructor
         :param os_creds: The OpenStack connection credentials
@@ -40,6 +60,14 @@ class OpenStackImage:
         :param image_url: The download location of the image file
         :param image_name: The name to register the image
         :param download_path: The local filesystem location to where the image file will be downloaded
+        :param image: The existing image object (Optional)
+        :param inventory: The TenantInventory shared by the deployment used to find existing objects (Optional)
+        :param checksum: The expected checksum of the image file, i.e. 'sha256:<hex digest>' (Optional)
+        :param cache: The ImageCache from which the image file is taken (Optional - the one enabled with
+                      enable_image_cache() when not given)
+        :param stream: T/F - when True, the image file is uploaded as it is downloaded rather than staged in
+                       download_path first (Optional)
+        :param visibility: The visibility of the image, i.e. 'public' (Optional - Glance's default when not given)
         :return:
         """
         self.os_creds = os_creds
@@ -54,22 +82,67 @@ class OpenStackImage:
             self.image_file_path = download_path + '/' + filename
 
         self.image = image
+        # True when an existing image with the same content but another name is used rather than one created
+        self.adopted = False
         self.image_file = None
+        self.inventory = inventory
+        self.checksum = checksum
+        self.cache = cache or _image_cache
+        self.stream = stream
+        self.visibility = visibility
 
         if os_creds:
-            self.glance = glance_utils.glance_client(os_creds)
+            self.glance = client_registry.get_client(os_creds, client_registry.IMAGE)
 
     def create(self):
         """
-        Creates the image in OpenStack if it does not already exist
+        Creates the image in OpenStack if it does not already exist. An active image with the same content, format and
+        visibility is reused whatever its name. Its content is identified by the configured checksum, else by the
+        digests of the image file when it is already on this host, else by those of the downloaded file before it is
+        uploaded.
         :return: The OpenStack Image object
         """
 
-        if self.image:
+        if self.image or self.discover():
+            return self.image
+
+        expected = image_cache.parse_checksum(self.checksum)
+        if expected:
+            digests = dict([expected])
+        else:
+            digests = self.__local_digests()
+        if digests and self.__reuse_by_checksum(digests):
+            return self.image
+
+        if self.stream and not (self.cache and self.cache.find(self.image_url, self.checksum)):
+            self.image = self.__create_streamed()
+        else:
+            self.image_file = self.__get_image_file()
+            if image_cache.MD5 not in digests:
+                # Glance always records the md5 of an image but not necessarily any of the other digests
+                digests = image_cache.file_digests(self.image_file)
+                if self.__reuse_by_checksum(digests):
+                    return self.image
+            self.image = glance_utils.create_image(self.glance, self.image_name, self.image_format, self.image_file,
+                                                   self.visibility)
+        if self.inventory:
+            self.inventory.add(tenant_inventory.IMAGES, self.image)
+        return self.image
+
+    def discover(self):
+        """
+        Looks up the existing image without downloading or creating anything
+        :return: the image object or None
+        """
+        if self.inventory:
+            self.image = self.inventory.find_by_name(tenant_inventory.IMAGES, self.image_name)
+            if self.image:
+                logger.info('Found image with name - ' + self.image_name)
+            else:
+                logger.info('No existing image found with name - ' + self.image_name)
             return self.image
 
-        import nova_utils
-        nova = nova_utils.nova_client(self.os_creds)
+        nova = client_registry.get_client(self.os_creds, client_registry.COMPUTE)
         image_dict = None
         try:
             # TODO/FIXME - Certain scenarios, such as when the name has whitespace,
@@ -83,46 +156,148 @@ class OpenStackImage:
             self.image = self.glance.images.get(image_dict.id)
             if self.image:
                 logger.info('Found image with name - ' + self.image_name)
-                return self.image
-
-        self.image_file = self.__get_image_file()
-        self.image = self.glance.images.create(name=self.image_name, disk_format=self.image_format,
-                                               container_format="bare")
-        logger.info('Uploading image file')
-        self.glance.images.upload(self.image.id, open(self.image_file.name, 'rb'))
-        logger.info('Image file upload complete')
         return self.image
 
     def clean(self):
         """
-        Cleanse environment of all artifacts
+        Cleanse environment of all artifacts. An image reused by its checksum under another name is left in place.
         :return: void
         """
         if self.image:
-            self.glance.images.delete(self.image['id'])
+            if self.adopted:
+                # The image was found by its content under another name and belongs to someone else
+                logger.info('Keeping image reused by checksum for - ' + self.image_name)
+            else:
+                glance_utils.delete_image(self.glance, self.image)
+                if self.inventory:
+                    self.inventory.remove(tenant_inventory.IMAGES, self.image)
 
         if self.image_file:
-            shutil.rmtree(self.download_path)
+            # Only this image's file as the directory may be shared with other images
+            if os.path.isfile(self.image_file):
+                os.remove(self.image_file)
+            try:
+                os.rmdir(self.download_path)
+            except OSError:
+                pass
+
+    def __local_digests(self):
+        """
+        Returns the digests of the image file when it is already on this host, either in the cache or in the download
+        path
+        :return: a dictionary of hex digests keyed by algorithm, empty when there is no such file
+        """
+        file_path = None
+        if self.cache:
+            file_path = self.cache.find(self.image_url)
+        if not file_path and file_utils.file_exists(self.image_file_path):
+            file_path = self.image_file_path
+        if file_path:
+            return image_cache.file_digests(file_path)
+        return dict()
+
+    def __reuse_by_checksum(self, digests):
+        """
+        Looks for an active image with the same format and visibility whose content has one of the given digests
+        :param digests: a dictionary of hex digests keyed by algorithm
+        :return: T/F - True when one was found, and is now this object's image
+        """
+        if self.inventory:
+            images = self.inventory.get_all(tenant_inventory.IMAGES)
+        else:
+            images = glance_utils.get_images(self.glance)
+
+        for image in images:
+            if tenant_inventory.get_attr(image, 'status') != 'active' or \
+                    tenant_inventory.get_attr(image, 'disk_format') != self.image_format:
+                continue
+            visibility = tenant_inventory.get_attr(image, 'visibility')
+            if (self.visibility and visibility != self.visibility) or \
+                    (not self.visibility and visibility not in DEFAULT_VISIBILITIES):
+                continue
+            # Glance records the md5 as the checksum and possibly another digest as the os_hash_value
+            image_digests = {image_cache.MD5: tenant_inventory.get_attr(image, 'checksum'),
+                             tenant_inventory.get_attr(image, 'os_hash_algo'):
+                                 tenant_inventory.get_attr(image, 'os_hash_value')}
+            if any(digest and image_digests.get(algorithm) == digest for algorithm, digest in digests.items()):
+                logger.info('Reusing image ' + str(tenant_inventory.get_attr(image, 'name')) + ' with the same content '
+                            'as - ' + self.image_name)
+                self.image = image
+                self.adopted = True
+                return True
+        return False
+
+    def __create_streamed(self):
+        """
+        Uploads the image file to Glance as it is downloaded, verifying its checksum on the fly and adding it to the
+        cache when one is enabled. An image whose data does not match the checksum is deleted.
+        :return: the image object
+        """
+        copy_path = None
+        if self.cache:
+            copy_path = self.cache.staging_path(self.image_url)
+        logger.info('Streaming Image from - ' + self.image_url)
+        image = None
+        try:
+            stream = file_utils.DownloadStream(self.image_url, copy_path)
+            try:
+                image = glance_utils.create_image_from_stream(self.glance, self.image_name, self.image_format,
+                                                              stream, stream.size, self.visibility)
+                digests = stream.digests()
+            finally:
+                stream.close()
+
+            expected = image_cache.parse_checksum(self.checksum)
+            if expected and digests[expected[0]] != expected[1]:
+                raise Exception('Checksum mismatch for image downloaded from ' + self.image_url + ' - expected ' +
+                                expected[0] + ' ' + expected[1] + ' but was ' + digests[expected[0]])
+        except Exception:
+            if image:
+                glance_utils.delete_image(self.glance, image)
+            if copy_path and os.path.isfile(copy_path):
+                os.remove(copy_path)
+            raise
+
+        if copy_path:
+            self.cache.store(self.image_url, copy_path, digests)
+        return image
 
     def __get_image_file(self):
         """
-        Returns the image file reference.
-        If the image file does not exist, download it
-        :return: the image file object
+        Returns the path of the image file.
+        If the image file does not exist or does not match the expected checksum, download it
+        :return: the image file path
         """
+        if not os.path.exists(self.download_path):
+            os.makedirs(self.download_path)
+        if self.cache:
+            return self.cache.fetch(self.image_url, self.download_path, self.checksum)
+
         if file_utils.file_exists(self.image_file_path):
-            return open(self.image_file_path, 'r')
-        else:
-            if not os.path.exists(self.download_path):
-                os.makedirs(self.download_path)
-            logger.info('Found existing image file')
-            return self.__download_image_file()
+            if not self.checksum:
+                logger.info('Found existing image file')
+                return self.image_file_path
+            try:
+                image_cache.verify(self.image_file_path, self.checksum)
+                logger.info('Found existing image file matching its checksum')
+                return self.image_file_path
+            except Exception as e:
+                logger.warn('Downloading the image file again - ' + str(e))
+                os.remove(self.image_file_path)
+
+        image_file_path = self.__download_image_file()
+        if self.checksum:
+            try:
+                image_cache.verify(image_file_path, self.checksum)
+            except Exception:
+                os.remove(image_file_path)
+                raise
+        return image_file_path
 
     def __download_image_file(self):
         """
         Downloads the image file
-        :return: the image file object
+        :return: the image file path
         """
-        if not file_utils.file_exists(self.image_file_path):
-            logger.info('Downloading Image from - ' + self.image_url)
-            return file_utils.download(self.image_url, self.download_path)
+        logger.info('Downloading Image from - ' + self.image_url)
+        return file_utils.download(self.image_url, self.download_path)
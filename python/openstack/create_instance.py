@@ -12,25 +12,32 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import Queue
 import logging
+import threading
 import time
+from multiprocessing.pool import ThreadPool
 
-from novaclient.exceptions import NotFound
 from provisioning import ansible_utils
 
 import nova_utils
+import wait_policy
+from openstack import client_registry
+from openstack import fleet_waiter
 from openstack import neutron_utils
+from openstack import tenant_inventory
 
 __author__ = 'spisarski'
 
 logger = logging.getLogger('create_instance')
 
-VM_BOOT_TIMEOUT = 1500
-VM_DELETE_TIMEOUT = 600
-SSH_TIMEOUT = 120
-POLL_INTERVAL = 3
+VM_BOOT_TIMEOUT = wait_policy.BOOT_TIMEOUT
+VM_DELETE_TIMEOUT = wait_policy.DELETE_TIMEOUT
+SSH_TIMEOUT = wait_policy.SSH_TIMEOUT
 STATUS_ACTIVE = 'ACTIVE'
 STATUS_DELETED = 'DELETED'
+# Maximum number of VMs probed for SSH readiness at once
+MAX_SSH_PROBES = 50
 
 
 class OpenStackVmInstance:
@@ -39,7 +46,7 @@ class OpenStackVmInstance:
     """
 
     def __init__(self, os_creds, name, flavor, image_creator, ports, remote_user, keypair_creator=None,
-                 floating_ip_conf=None, userdata=None):
+                 floating_ip_conf=None, userdata=None, inventory=None, policy=None):
         """
         Constructor
         :param os_creds: The connection credentials to the OpenStack API
@@ -51,6 +58,8 @@ class OpenStackVmInstance:
         :param keypair_creator: The object responsible for creating the keypair for this instance (Optional)
         :param floating_ip_conf: The configuration for the addition of a floating IP to an instance (Optional)
         :param userdata: The post installation script as a string or a file object (Optional)
+        :param inventory: The TenantInventory shared by the deployment used to find existing objects (Optional)
+        :param policy: The WaitPolicy pacing the waits for the instance to boot, accept SSH and be deleted (Optional)
         :raises Exception
         """
         self.os_creds = os_creds
@@ -60,15 +69,21 @@ class OpenStackVmInstance:
         self.remote_user = remote_user
         self.keypair_creator = keypair_creator
         self.floating_ip_conf = floating_ip_conf
+        self.inventory = inventory
+        self.policy = policy or wait_policy.WaitPolicy()
 
         # TODO - need to potentially support multiple floating IPs
         self.floating_ip = None
         self.userdata = userdata
         self.vm = None
-        self.nova = nova_utils.nova_client(os_creds)
+        self.__created_at = None
+        self.nova = client_registry.get_client(os_creds, client_registry.COMPUTE)
 
         # Validate that the flavor is supported
-        self.flavor = self.nova.flavors.find(name=flavor)
+        if inventory:
+            self.flavor = inventory.find_by_name(tenant_inventory.FLAVORS, flavor)
+        else:
+            self.flavor = self.nova.flavors.find(name=flavor)
         if not self.flavor:
             raise Exception
 
@@ -77,16 +92,10 @@ class OpenStackVmInstance:
         Creates a VM instance
         :return: The VM reference object
         """
-        servers = self.nova.servers.list()
-        for server in servers:
-            if server.name == self.name:
-                self.vm = server
-                logger.info('Found existing machine with name - ' + self.name)
-                fips = self.nova.floating_ips.list()
-                for fip in fips:
-                    if fip.instance_id == server.id:
-                        self.floating_ip = fip
-                return self.vm
+        if self.discover():
+            if self.floating_ip_conf and not self.floating_ip:
+                self.__create_floating_ip()
+            return self.vm
 
         if not self.vm:
             nics = []
@@ -95,74 +104,162 @@ class OpenStackVmInstance:
                 kv['port-id'] = port['port']['id']
                 nics.append(kv)
 
-            logger.info('Creating VM with name - ' + self.name)
             keypair_name = None
             if self.keypair_creator:
                 keypair_name = self.keypair_creator.keypair_settings.name
 
-            self.vm = self.nova.servers.create(
-                name=self.name,
-                flavor=self.flavor,
-                image=self.image_creator.image,
-                nics=nics,
-                key_name=keypair_name,
-                userdata=self.userdata)
+            self.vm = nova_utils.create_server(self.nova, self.name, self.flavor, self.image_creator.image, nics,
+                                               keypair_name, self.userdata)
+            self.__created_at = time.time()
+            self.__inventory_add(tenant_inventory.SERVERS, self.vm)
 
             logger.info('Created instance with name - ' + self.name)
 
             if self.floating_ip_conf:
-                for port in self.ports:
-                    if port['port']['name'] == self.floating_ip_conf['port_name']:
-                        self.floating_ip = nova_utils.create_floating_ip(self.nova, self.floating_ip_conf['ext_net'])
-                        logger.info('Created floating IP ' + self.floating_ip.ip)
-                        self._add_floating_ip(port['port']['fixed_ips'][0]['ip_address'])
+                self.__create_floating_ip()
+
+        return self.vm
+
+    def __create_floating_ip(self):
+        """
+        Creates the configured floating IP and associates it with its port
+        """
+        for port in self.ports:
+            if port['port']['name'] == self.floating_ip_conf['port_name']:
+                self.floating_ip = nova_utils.create_floating_ip(self.nova, self.floating_ip_conf['ext_net'])
+                self.__inventory_add(tenant_inventory.FLOATING_IPS, self.floating_ip)
+                logger.info('Created floating IP ' + self.floating_ip.ip)
+                self._add_floating_ip(port['port']['fixed_ips'][0]['ip_address'])
 
+    def discover(self):
+        """
+        Looks up the existing VM and its floating IP without creating anything
+        :return: the VM object or None
+        """
+        if self.inventory:
+            server = self.inventory.find_by_name(tenant_inventory.SERVERS, self.name)
+            if server:
+                self.vm = server
+                logger.info('Found existing machine with name - ' + self.name)
+                fips = self.inventory.filter(tenant_inventory.FLOATING_IPS, instance_id=server.id)
+                if fips:
+                    self.floating_ip = fips[-1]
+        else:
+            servers = nova_utils.get_servers(self.nova)
+            for server in servers:
+                if server.name == self.name:
+                    self.vm = server
+                    logger.info('Found existing machine with name - ' + self.name)
+                    fips = nova_utils.get_floating_ips(self.nova)
+                    for fip in fips:
+                        if fip.instance_id == server.id:
+                            self.floating_ip = fip
+                    break
         return self.vm
 
     def clean(self):
         """
         Destroys the VM instance
         """
+        self.delete_vm()
+        self.wait_vm_deleted()
+        self.clean_floating_ip()
+        self.clean_ports()
+
+    def remove_vm(self):
+        """
+        Deletes the VM and releases its floating IP but keeps its ports so that the VM can be created again on them
+        :return: T/F - False when the VM still exists after the policy's delete_timeout
+        """
+        self.delete_vm()
+        if not self.wait_vm_deleted():
+            return False
+        self.clean_floating_ip()
+        self.vm = None
+        self.floating_ip = None
+        return True
+
+    def delete_vm(self):
+        """
+        Requests the deletion of the VM without waiting for it to complete
+        """
         if self.vm:
             try:
-                self.nova.servers.delete(self.vm)
+                nova_utils.delete_server(self.nova, self.vm)
             except Exception as e:
                 logger.error('Error deleting VM - ' + str(e))
 
-            # Block until instance cannot be found or returns the status of DELETED
-            if self.vm_deleted(block=True, timeout=VM_DELETE_TIMEOUT):
+    def wait_vm_deleted(self):
+        """
+        Blocks until the VM requested for deletion cannot be found or returns the status of DELETED
+        :return: T/F - False when the VM still exists after the policy's delete_timeout
+        """
+        if self.vm:
+            if self.vm_deleted(block=True):
                 logger.info('VM has been properly deleted')
+                self.__inventory_remove(tenant_inventory.SERVERS, self.vm)
             else:
-                logger.error('VM not deleted within the timeout period of ' + str(VM_DELETE_TIMEOUT) + ' seconds')
+                logger.error('VM not deleted within the timeout period of ' + str(self.policy.delete_timeout) +
+                             ' seconds')
+                return False
+        return True
 
+    def clean_floating_ip(self):
+        """
+        Releases the floating IP. Must be called after the VM has been deleted.
+        """
         if self.floating_ip:
             try:
                 nova_utils.delete_floating_ip(self.nova, self.floating_ip)
+                self.__inventory_remove(tenant_inventory.FLOATING_IPS, self.floating_ip)
             except Exception as e:
-                logger.error('Error deleting Floating IP - ' + e.message)
+                logger.error('Error deleting Floating IP - ' + str(e))
 
-        neutron = neutron_utils.neutron_client(self.os_creds)
+    def clean_ports(self):
+        """
+        Deletes the VM's ports. Must be called after the VM has been deleted.
+        """
+        neutron = client_registry.get_client(self.os_creds, client_registry.NETWORK)
         for port in self.ports:
             neutron_utils.delete_port(neutron, port)
+            self.__inventory_remove(tenant_inventory.PORTS, port['port'])
+
+    def __inventory_add(self, resource_type, item):
+        if self.inventory:
+            self.inventory.add(resource_type, item)
+
+    def __inventory_remove(self, resource_type, item):
+        if self.inventory:
+            self.inventory.remove(resource_type, item)
 
-    def _add_floating_ip(self, port_ip, timeout=30, poll_interval=POLL_INTERVAL):
+    def _add_floating_ip(self, port_ip, timeout=None, poll_interval=None):
         """
-        Returns True when active else False
-        TODO - Make timeout and poll_interval configurable...
+        Associates the floating IP with the port IP, retrying while the instance is not ready for it
+        :param port_ip: the fixed IP to which the floating IP is mapped
+        :param timeout: The timeout value (default the policy's floating_ip_timeout)
+        :param poll_interval: A fixed polling interval in seconds (default backs off according to the policy)
         """
-        count = timeout / poll_interval
-        while count > 0:
+        deadline = self.__deadline(timeout or self.policy.floating_ip_timeout, poll_interval)
+        while True:
             logger.debug('Attempting to add floating IP to instance')
             try:
                 self.vm.add_floating_ip(self.floating_ip, port_ip)
                 logger.info('Added floating IP to port IP - ' + port_ip)
                 return
             except Exception as e:
-                logger.warn('Error adding floating IP to instance - ' + e.message)
-                time.sleep(poll_interval)
-                pass
+                logger.warn('Error adding floating IP to instance - ' + str(e))
+            if not deadline.sleep():
+                break
         logger.error('Timeout attempting to add the floating IP to instance.')
 
+    def __deadline(self, timeout, poll_interval=None):
+        """
+        Starts a wait paced by the instance's policy or, when given, by a fixed polling interval
+        """
+        if poll_interval:
+            return wait_policy.fixed_interval(poll_interval).deadline(timeout)
+        return self.policy.deadline(timeout)
+
     def config_rpm_nics(self):
         """
         Responsible for configuring NICs on RPM systems where the instance has more than one configured port
@@ -199,57 +296,68 @@ class OpenStackVmInstance:
                                      self.keypair_creator.keypair_settings.private_filepath, variables,
                                      self.os_creds.proxy)
 
-    def vm_deleted(self, block=False, timeout=VM_DELETE_TIMEOUT, poll_interval=POLL_INTERVAL):
+    def vm_deleted(self, block=False, timeout=None, poll_interval=None):
         """
         Returns true when the VM status returns the value of expected_status_code or instance retrieval throws
         a NotFound exception.
         :param block: When true, thread will block until active or timeout value in seconds has been exceeded (False)
-        :param timeout: The timeout value
-        :param poll_interval: The polling interval in seconds
+        :param timeout: The timeout value (default the policy's delete_timeout)
+        :param poll_interval: Unused, blocking checks are paced by the shared fleet_waiter
         :return: T/F
         """
+        from novaclient.exceptions import NotFound
         try:
-            return self._vm_status_check(STATUS_DELETED, block, timeout, poll_interval)
+            return self._vm_status_check(STATUS_DELETED, block, timeout or self.policy.delete_timeout, poll_interval)
         except NotFound as e:
             logger.info("Instance not found when querying status for " + STATUS_DELETED + ' with message ' + e.message)
             return True
 
-    def vm_active(self, block=False, timeout=VM_BOOT_TIMEOUT, poll_interval=POLL_INTERVAL):
+    def vm_active(self, block=False, timeout=None, poll_interval=None, cancel=None):
         """
         Returns true when the VM status returns the value of expected_status_code
         :param block: When true, thread will block until active or timeout value in seconds has been exceeded (False)
-        :param timeout: The timeout value
-        :param poll_interval: The polling interval in seconds
+        :param timeout: The timeout value (default the policy's boot_timeout)
+        :param poll_interval: Unused, blocking checks are paced by the shared fleet_waiter
+        :param cancel: A threading.Event that stops a blocking check early when set (Optional)
         :return: T/F
         """
-        return self._vm_status_check(STATUS_ACTIVE, block, timeout, poll_interval)
+        return self._vm_status_check(STATUS_ACTIVE, block, timeout or self.policy.boot_timeout, poll_interval, cancel)
 
-    def _vm_status_check(self, expected_status_code, block, timeout, poll_interval):
+    def _vm_status_check(self, expected_status_code, block, timeout, poll_interval, cancel=None):
         """
         Returns true when the VM status returns the value of expected_status_code
         :param expected_status_code: instance status evaluated with this string value
         :param block: When true, thread will block until active or timeout value in seconds has been exceeded (False)
         :param timeout: The timeout value
-        :param poll_interval: The polling interval in seconds
+        :param poll_interval: Unused, blocking checks are polled by the shared fleet_waiter
+        :param cancel: A threading.Event that stops a blocking check early when set (Optional)
         :return: T/F
         """
-        # sleep and wait for VM status change
-        if block:
-            start = time.time()
-        else:
-            start = time.time() - timeout
-
-        while timeout > time.time() - start:
-            status = self._status(expected_status_code)
-            if status:
-                logger.info('VM is active')
-                return True
-
-            logger.debug('Retry querying VM status in ' + str(poll_interval) + ' seconds')
-            time.sleep(poll_interval)
-            logger.debug('VM status query timeout in ' + str(timeout - (time.time() - start)))
+        if not block:
+            return self._status(expected_status_code)
+
+        deadline = self.policy.deadline(timeout)
+        boot_key = self.flavor.name
+        if expected_status_code == STATUS_ACTIVE and self.__created_at:
+            # Skip the probes that would almost certainly find the VM still building
+            estimate = self.policy.expected_boot_time or wait_policy.boot_times().estimate(boot_key)
+            if estimate:
+                deadline.sleep(self.__created_at + estimate * wait_policy.ESTIMATE_FRACTION - time.time(), cancel)
+
+        # Wait alongside every other VM being deployed so that Nova is polled once per interval for all of them
+        if not (cancel and cancel.is_set()) and \
+                fleet_waiter.get_waiter(self.os_creds, self.policy).wait(self.vm, expected_status_code,
+                                                                         deadline.remaining(), cancel):
+            logger.info('VM status is ' + expected_status_code)
+            if expected_status_code == STATUS_ACTIVE and self.__created_at:
+                wait_policy.boot_times().record(boot_key, time.time() - self.__created_at)
+                self.__created_at = None
+            return True
 
-        logger.error('Timeout checking for VM status for ' + expected_status_code)
+        if cancel and cancel.is_set():
+            logger.info('Stopped checking for VM status for ' + expected_status_code)
+        else:
+            logger.error('Timeout checking for VM status for ' + expected_status_code)
         return False
 
     def _status(self, expected_status_code):
@@ -268,44 +376,104 @@ class OpenStackVmInstance:
         logger.debug('Instance status is - ' + instance.status)
         return instance.status == expected_status_code
 
-    def vm_ssh_active(self, block=False, timeout=SSH_TIMEOUT, poll_interval=POLL_INTERVAL):
+    def vm_ssh_active(self, block=False, timeout=None, poll_interval=None, cancel=None):
         """
         Returns true when the VM can be accessed via SSH
         :param block: When true, thread will block until active or timeout value in seconds has been exceeded (False)
-        :param timeout: The timeout value
-        :param poll_interval: The polling interval
+        :param timeout: The timeout value (default the policy's ssh_timeout)
+        :param poll_interval: A fixed polling interval in seconds (default backs off according to the policy)
+        :param cancel: A threading.Event that stops a blocking check early when set (Optional)
         :return: T/F
         """
         # sleep and wait for VM status change
         logger.info('Checking if VM is active')
 
-        if self.vm_active(block=True):
-            if block:
-                start = time.time()
-            else:
-                start = time.time() - timeout
+        if self.vm_active(block=True, cancel=cancel):
+            if not block:
+                return self._ssh_active()
 
-            while timeout > time.time() - start:
-                status = self._ssh_active()
-                if status:
+            deadline = self.__deadline(timeout or self.policy.ssh_timeout, poll_interval)
+            while not (cancel and cancel.is_set()):
+                if self._ssh_active():
                     logger.info('SSH is active for VM instance')
                     return True
+                if not deadline.sleep(cancel=cancel):
+                    break
 
-                logger.debug('Retry SSH connection in ' + str(poll_interval) + ' seconds')
-                time.sleep(poll_interval)
-                logger.debug('SSH connection timeout in ' + str(timeout - (time.time() - start)))
-
-        logger.error('Timeout attempting to connect with VM via SSH')
+        if cancel and cancel.is_set():
+            logger.info('Stopped attempting to connect with VM via SSH')
+        else:
+            logger.error('Timeout attempting to connect with VM via SSH')
         return False
 
     def _ssh_active(self):
         """
-        Returns True when can create a SSH session else False
+        Returns True when can create a SSH session else False. The full handshake is only attempted once the SSH port
+        answers with a banner and the session is closed straight after.
         :return: T/F
         """
+        if not ansible_utils.ssh_banner(self.floating_ip.ip, self.os_creds.proxy):
+            logger.debug('SSH port not answering yet on - ' + self.floating_ip.ip)
+            return False
 
         ssh = ansible_utils.ssh_client(self.floating_ip.ip, self.remote_user,
                                        self.keypair_creator.keypair_settings.private_filepath, self.os_creds.proxy)
         if ssh:
+            ssh.close()
             return True
         return False
+
+
+def fleet_ssh_active(vm_insts, required=None, timeout=None):
+    """
+    Probes the SSH readiness of many VM instances at once rather than one after the other. Returns as soon as every
+    required instance is reachable or one of them has timed out; the probes of the others are then stopped.
+    :param vm_insts: the list of OpenStackVmInstance objects to probe
+    :param required: the names of the instances that must be reachable (default all of them)
+    :param timeout: the timeout value applied to each instance (default each instance's policy ssh_timeout)
+    :return: a tuple where the first element is the set of reachable instance names and the second is the sorted list
+             of the names of the stragglers that were not reachable
+    """
+    if not vm_insts:
+        return set(), list()
+    if required is None:
+        required = set([vm_inst.name for vm_inst in vm_insts])
+    else:
+        required = set(required)
+
+    cancel = threading.Event()
+    completed = Queue.Queue()
+    pool = ThreadPool(min(len(vm_insts), MAX_SSH_PROBES))
+    for vm_inst in vm_insts:
+        pool.apply_async(__probe_ssh, (vm_inst, timeout, cancel, completed))
+    pool.close()
+
+    ready = set()
+    finished = 0
+    try:
+        while not required.issubset(ready) and finished < len(vm_insts):
+            name, active = completed.get()
+            finished += 1
+            if active:
+                ready.add(name)
+            elif name in required:
+                break
+    finally:
+        cancel.set()
+
+    stragglers = sorted([vm_inst.name for vm_inst in vm_insts if vm_inst.name not in ready])
+    if stragglers:
+        logger.warn('VM instances not responding to SSH requests - ' + ', '.join(stragglers))
+    return ready, stragglers
+
+
+def __probe_ssh(vm_inst, timeout, cancel, completed):
+    """
+    Blocks until a VM instance accepts SSH sessions and reports the outcome on the completed queue
+    """
+    try:
+        active = vm_inst.vm_ssh_active(block=True, timeout=timeout, cancel=cancel)
+    except Exception as e:
+        logger.error('Error probing SSH on VM [' + vm_inst.name + '] - ' + str(e))
+        active = False
+    completed.put((vm_inst.name, active))
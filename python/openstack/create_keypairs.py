@@ -15,9 +15,9 @@
 import logging
 import os
 
-from Crypto.PublicKey import RSA
-
 import nova_utils
+from openstack import client_registry
+from openstack import tenant_inventory
 
 __author__ = 'spisarski'
 
@@ -29,15 +29,17 @@ class OpenStackKeypair:
     Class responsible for creating a keypair in OpenStack
     """
 
-    def __init__(self, os_creds, keypair_settings):
+    def __init__(self, os_creds, keypair_settings, inventory=None):
         """
-        Constructor - all parameters are required
+        Constructor - all parameters are required except inventory
         :param os_creds: The credentials to connect with OpenStack
         :param keypair_settings: The settings used to create a keypair
+        :param inventory: The TenantInventory shared by the deployment used to find existing keypairs (Optional)
         """
         self.os_creds = os_creds
         self.keypair_settings = keypair_settings
-        self.nova = nova_utils.nova_client(os_creds)
+        self.inventory = inventory
+        self.nova = client_registry.get_client(os_creds, client_registry.COMPUTE)
 
         # Attributes instantiated on create()
         self.keypair = None
@@ -48,14 +50,7 @@ class OpenStackKeypair:
         """
         logger.info('Creating keypair %s...' % self.keypair_settings.name)
 
-        keypair_insts = nova_utils.get_keypairs(self.nova)
-        found = False
-        for keypair_inst in keypair_insts:
-            if keypair_inst.name == self.keypair_settings.name:
-                self.keypair = keypair_inst
-                found = True
-
-        if not found:
+        if not self.discover():
             if self.keypair_settings.public_filepath:
                 if os.path.isfile(self.keypair_settings.public_filepath):
                     logger.info("Uploading existing keypair")
@@ -63,12 +58,29 @@ class OpenStackKeypair:
                                                                   self.keypair_settings.public_filepath)
                 else:
                     logger.info("Creating new keypair")
+                    from Crypto.PublicKey import RSA
                     # TODO - Make this value configurable
                     keys = RSA.generate(1024)
                     self.keypair = nova_utils.upload_keypair(self.nova, self.keypair_settings.name,
                                                              keys.publickey().exportKey('OpenSSH'))
                     nova_utils.save_keys_to_files(keys, self.keypair_settings.public_filepath,
                                                   self.keypair_settings.private_filepath)
+            if self.keypair and self.inventory:
+                self.inventory.add(tenant_inventory.KEYPAIRS, self.keypair)
+
+    def discover(self):
+        """
+        Looks up the existing keypair without creating anything
+        :return: the keypair object or None
+        """
+        if self.inventory:
+            self.keypair = self.inventory.find_by_name(tenant_inventory.KEYPAIRS, self.keypair_settings.name)
+        else:
+            keypair_insts = nova_utils.get_keypairs(self.nova)
+            for keypair_inst in keypair_insts:
+                if keypair_inst.name == self.keypair_settings.name:
+                    self.keypair = keypair_inst
+        return self.keypair
 
     def clean(self):
         """
@@ -76,6 +88,8 @@ class OpenStackKeypair:
         """
         if self.keypair:
             nova_utils.delete_keypair(self.nova, self.keypair)
+            if self.inventory:
+                self.inventory.remove(tenant_inventory.KEYPAIRS, self.keypair)
 
 
 class KeypairSettings:
@@ -14,15 +14,63 @@
 # limitations under the License.
 import logging
 
-import neutronclient
-
 import neutron_utils
+from openstack import client_registry
+from openstack import tenant_inventory
 
 __author__ = 'spisarski'
 
 logger = logging.getLogger('OpenStackNetwork')
 
 
+def create_networks_and_subnets(network_creators):
+    """
+    Creates the missing networks of several OpenStackNetwork creators with a single Neutron request and then their
+    missing subnets with another. Routers are left to each creator's create(), which also creates anything that could
+    not be created here and reports why.
+    :param network_creators: the OpenStackNetwork objects, all connecting with the same credentials
+    """
+    network_creators = list(network_creators)
+    if not network_creators:
+        return
+    neutron = network_creators[0].neutron
+    for creator in network_creators:
+        creator.discover()
+
+    missing = [creator for creator in network_creators if not creator.network]
+    for creator, network in zip(missing, __create_wave(neutron_utils.create_networks, neutron,
+                                                       [creator.network_settings for creator in missing])):
+        if network:
+            creator.network = network
+            if creator.inventory:
+                creator.inventory.add(tenant_inventory.NETWORKS, network['network'])
+
+    missing = [creator for creator in network_creators if creator.network and not creator.subnet]
+    for creator, subnet in zip(missing, __create_wave(neutron_utils.create_subnets, neutron,
+                                                      [(creator.subnet_settings, creator.network)
+                                                       for creator in missing])):
+        if subnet:
+            creator.subnet = subnet
+            if creator.inventory:
+                creator.inventory.add(tenant_inventory.SUBNETS, subnet['subnets'][0])
+
+
+def __create_wave(create_func, neutron, requests):
+    """
+    Returns the objects created by a neutron_utils bulk create function with None in place of those that failed
+    """
+    if not requests:
+        return list()
+    try:
+        return create_func(neutron, requests)
+    except neutron_utils.BulkCreateError as e:
+        logger.warn(str(e))
+        return e.created
+    except Exception as e:
+        logger.warn('Unable to create ' + str(len(requests)) + ' objects in bulk - ' + str(e))
+        return [None] * len(requests)
+
+
 class OpenStackNetwork:
     """
     Class responsible for creating a network in OpenStack
@@ -32,21 +80,23 @@ class OpenStackNetwork:
     should probably make their way into a file named something like neutron_utils.py.
     """
 
-    def __init__(self, os_creds, network_settings, subnet_settings, router_settings):
+    def __init__(self, os_creds, network_settings, subnet_settings, router_settings, inventory=None):
         """
-        Constructor - all parameters are required
+        Constructor - all parameters are required except inventory
         :param os_creds: The credentials to connect with OpenStack
         :param network_settings: The settings used to create a network
         :param subnet_settings: The settings used to create a subnet object (must be an instance of the
                                 SubnetSettings class)
         :param router_settings: The settings used to create a router object (must be an instance of the
                                 RouterSettings class)
+        :param inventory: The TenantInventory shared by the deployment used to find existing objects (Optional)
         """
         self.os_creds = os_creds
         self.network_settings = network_settings
         self.subnet_settings = subnet_settings
         self.router_settings = router_settings
-        self.neutron = neutron_utils.neutron_client(os_creds)
+        self.inventory = inventory
+        self.neutron = client_registry.get_client(os_creds, client_registry.NETWORK)
         self.neutron.format = 'json'
 
         # Attributes instantiated on create()
@@ -60,45 +110,124 @@ class OpenStackNetwork:
         Responsible for creating not only the network but then a private subnet, router, and an interface to the router.
         """
         logger.info('Creating neutron network %s...' % self.network_settings.name)
-        net_inst = neutron_utils.get_network_by_name(self.neutron, self.network_settings.name)
-        if net_inst:
-            self.network = net_inst
-        else:
+        self.discover()
+        if not self.network:
             self.network = neutron_utils.create_network(self.neutron, self.network_settings)
+            self.__inventory_add(tenant_inventory.NETWORKS, self.network['network'])
         logger.debug("Network '%s' created successfully" % self.network['network']['id'])
 
         logger.debug('Creating Subnet....')
         # TODO - Consider supporting multiple subnets for a single network
-        sub_inst = neutron_utils.get_subnet_by_name(self.neutron, self.subnet_settings.name)
-        if sub_inst:
-            self.subnet = sub_inst
-        else:
+        if not self.subnet:
             self.subnet = neutron_utils.create_subnet(self.neutron, self.subnet_settings, self.network)
+            self.__inventory_add(tenant_inventory.SUBNETS, self.subnet['subnets'][0])
         logger.debug("Subnet '%s' created successfully" % self.subnet['subnets'][0]['id'])
 
         logger.debug('Creating Router...')
         if self.router_settings.name:
-            router_inst = neutron_utils.get_router_by_name(self.neutron, self.router_settings.name)
-            if router_inst:
-                self.router = router_inst
-            else:
-                self.router = neutron_utils.create_router(self.neutron, self.router_settings)
+            if not self.router:
+                self.router = neutron_utils.create_router(self.neutron, self.router_settings, self.inventory)
+                self.__inventory_add(tenant_inventory.ROUTERS, self.router['router'])
             logger.debug("Router '%s' created successfully" % self.router['router']['id'])
 
-            logger.debug('Adding router to subnet...')
-            try:
-                self.interface_router = neutron_utils.add_interface_router(self.neutron, self.router, self.subnet)
-            except neutronclient.common.exceptions.BadRequest:
-                pass
+            if self.inventory:
+                if tenant_inventory.find_router_interface(self.inventory, self.router['router']['id'],
+                                                          self.subnet['subnets'][0]['id']):
+                    logger.debug('Router already attached to subnet')
+                else:
+                    logger.debug('Adding router to subnet...')
+                    self.interface_router = neutron_utils.add_interface_router(self.neutron, self.router,
+                                                                               self.subnet)
+            else:
+                logger.debug('Adding router to subnet...')
+                from neutronclient.common.exceptions import BadRequest
+                try:
+                    self.interface_router = neutron_utils.add_interface_router(self.neutron, self.router, self.subnet)
+                except BadRequest:
+                    pass
+
+    def discover(self):
+        """
+        Looks up the existing network, subnet and router without creating anything
+        :return: T/F - True when any of them exist
+        """
+        self.network = self.__find(tenant_inventory.NETWORKS, self.network_settings.name, 'network',
+                                   neutron_utils.get_network_by_name)
+        self.subnet = self.__find(tenant_inventory.SUBNETS, self.subnet_settings.name, 'subnets',
+                                  neutron_utils.get_subnet_by_name)
+        if self.router_settings.name:
+            self.router = self.__find(tenant_inventory.ROUTERS, self.router_settings.name, 'router',
+                                      neutron_utils.get_router_by_name)
+        return bool(self.network or self.subnet or self.router)
 
     def clean(self):
         """
         Removes and deletes all items created in reverse order.
         """
-        neutron_utils.remove_interface_router(self.neutron, self.router, self.subnet)
+        self.clean_router_interface()
+        self.clean_router()
+        self.clean_subnet()
+        self.clean_network()
+
+    def clean_router_interface(self):
+        """
+        Detaches the subnet from the router. Must be called after every port on the subnet has been deleted.
+        """
+        from neutronclient.common.exceptions import NotFound
+        try:
+            neutron_utils.remove_interface_router(self.neutron, self.router, self.subnet)
+        except NotFound:
+            logger.info('Subnet not attached to router - ' + str(self.router_settings.name))
+
+    def clean_router(self):
+        """
+        Deletes the router. Must be called after clean_router_interface().
+        """
         neutron_utils.delete_router(self.neutron, self.router)
+        if self.router:
+            self.__inventory_remove(tenant_inventory.ROUTERS, self.router['router'])
+
+    def clean_subnet(self):
+        """
+        Deletes the subnet. Must be called after clean_router_interface().
+        """
         neutron_utils.delete_subnet(self.neutron, self.subnet)
+        if self.subnet:
+            self.__inventory_remove(tenant_inventory.SUBNETS, self.subnet['subnets'][0])
+
+    def clean_network(self):
+        """
+        Deletes the network. Must be called after clean_subnet().
+        """
         neutron_utils.delete_network(self.neutron, self.network)
+        if self.network:
+            self.__inventory_remove(tenant_inventory.NETWORKS, self.network['network'])
+
+    def __find(self, resource_type, name, key, lookup_func):
+        """
+        Returns the existing object with the given name from the inventory when configured else from Neutron
+        :param resource_type: the inventory resource type
+        :param name: the name to find
+        :param key: the key under which the object is wrapped ('subnets' wraps a list)
+        :param lookup_func: the neutron_utils get_*_by_name function used when there is no inventory
+        :return: the wrapped object or None
+        """
+        if self.inventory:
+            inst = self.inventory.find_by_name(resource_type, name)
+            if inst:
+                if key == 'subnets':
+                    return {key: [inst]}
+                return {key: inst}
+            return None
+        return lookup_func(self.neutron, name)
+
+    def __inventory_add(self, resource_type, item):
+        if self.inventory:
+            self.inventory.add(resource_type, item)
+
+    def __inventory_remove(self, resource_type, item):
+        if self.inventory:
+            self.inventory.remove(resource_type, item)
 
 
 class NetworkSettings:
@@ -442,13 +571,14 @@ class RouterSettings:
             self.enable_snat = enable_snat
             self.external_fixed_ips = external_fixed_ips
 
-    def dict_for_neutron(self, neutron):
+    def dict_for_neutron(self, neutron, inventory=None):
         """
         Returns a dictionary object representing this object.
         This is meant to be converted into JSON designed for use by the Neutron API
 
         TODO - expand automated testing to exercise all parameters
         :param neutron: The neutron client to retrieve external network information if necessary
+        :param inventory: The TenantInventory in which to look up the external network instead of Neutron (Optional)
         :return: the dictionary object
         """
         out = dict()
@@ -458,9 +588,14 @@ class RouterSettings:
         if self.admin_state_up:
             out['admin_state_up'] = self.admin_state_up
         if self.external_gateway:
-            ext_net = neutron_utils.get_network_by_name(neutron, self.external_gateway)
+            if inventory:
+                ext_net = inventory.find_by_name(tenant_inventory.NETWORKS, self.external_gateway)
+            else:
+                ext_net = neutron_utils.get_network_by_name(neutron, self.external_gateway, fields=['id'])
+                if ext_net:
+                    ext_net = ext_net['network']
             if ext_net:
-                out['external_gateway_info'] = {'network_id': ext_net['network']['id']}
+                out['external_gateway_info'] = {'network_id': ext_net['id']}
 
         # TODO/FIXME - specs say this is key/value is optional but the API call fails
         # if self.enable_snat:
@@ -0,0 +1,212 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import threading
+import time
+
+import nova_utils
+import wait_policy
+from openstack import client_registry
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('fleet_waiter')
+
+"""
+Waits on the status of many VM instances at once with a single server listing per polling interval
+"""
+
+STATUS_DELETED = 'DELETED'
+STATUS_ERROR = 'ERROR'
+
+# Seconds between checks of a caller's cancel event while it waits
+CANCEL_CHECK_INTERVAL = 0.5
+
+# The longest name filter sent to Nova, beyond which the listing is not filtered by name
+MAX_NAME_FILTER_LENGTH = 2048
+
+# Characters with a special meaning in the regular expressions Nova matches server names against
+REGEX_SPECIAL_CHARS = '\\.^$*+?()[]{}|'
+
+_waiters = dict()
+_waiters_lock = threading.Lock()
+
+
+class _Wait:
+    """
+    A single caller waiting for a server to reach a status
+    """
+
+    def __init__(self, expected_status):
+        self.expected_status = expected_status
+        self.event = threading.Event()
+        self.error = None
+
+
+class FleetWaiter:
+    """
+    Tracks the servers being waited upon and polls Nova for all of them with one detailed server listing per tick.
+    Each listing is filtered by the names of the servers being waited upon so that its size does not depend on the
+    rest of the tenant. Each caller is released as soon as its server reaches the expected status. Servers missing
+    from the listing are considered DELETED and servers reporting ERROR fail their callers immediately, except those
+    waiting for the server to be deleted as Nova keeps listing a deleted ERROR server as ERROR until it is gone.
+    """
+
+    def __init__(self, nova, policy=None, search_opts=None):
+        """
+        Constructor
+        :param nova: the Nova client
+        :param policy: (Optional) the WaitPolicy pacing the listings. Probing restarts at the policy's initial
+                       interval whenever a new server is waited upon and then backs off.
+        :param search_opts: (Optional) Nova server filters applied to each listing (i.e. a deployment's name prefix
+                            {'name': '^deploy-'}). A 'name' filter given here replaces the one built from the names
+                            of the servers being waited upon.
+        """
+        self.nova = nova
+        self.policy = policy or wait_policy.WaitPolicy()
+        self.search_opts = search_opts
+        self.__pending = dict()
+        self.__names = dict()
+        self.__restart = False
+        self.__poller = None
+        self.__lock = threading.Lock()
+
+    def wait(self, server, expected_status, timeout, cancel=None):
+        """
+        Blocks until the server reaches the expected status or the timeout expires
+        :param server: the server object
+        :param expected_status: the status to wait for (i.e. 'ACTIVE' or 'DELETED')
+        :param timeout: the maximum number of seconds to wait
+        :param cancel: (Optional) a threading.Event that ends the wait early when set
+        :return: T/F - False when the timeout expired or the wait was cancelled
+        :raises: Exception when the server reports the ERROR status while not waiting for DELETED
+        """
+        wait = _Wait(expected_status)
+        with self.__lock:
+            self.__pending.setdefault(server.id, list()).append(wait)
+            self.__names[server.id] = getattr(server, 'name', None)
+            self.__restart = True
+            if not self.__poller:
+                self.__poller = threading.Thread(target=self.__poll, name='fleet-waiter')
+                self.__poller.daemon = True
+                self.__poller.start()
+
+        if cancel:
+            expires = time.time() + timeout
+            while not wait.event.is_set() and not cancel.is_set() and time.time() < expires:
+                wait.event.wait(min(CANCEL_CHECK_INTERVAL, max(0.0, expires - time.time())))
+        else:
+            wait.event.wait(timeout)
+
+        with self.__lock:
+            waits = self.__pending.get(server.id, list())
+            if wait in waits:
+                waits.remove(wait)
+                if not waits:
+                    del self.__pending[server.id]
+                    self.__names.pop(server.id, None)
+
+        if wait.error:
+            raise wait.error
+        return wait.event.is_set()
+
+    def pending_count(self):
+        """
+        Returns the number of servers currently being waited upon
+        """
+        with self.__lock:
+            return len(self.__pending)
+
+    def __poll(self):
+        """
+        Lists the servers once per interval until no callers remain
+        """
+        pace = None
+        while True:
+            with self.__lock:
+                if not self.__pending:
+                    self.__poller = None
+                    return
+                if self.__restart:
+                    pace = self.policy.deadline(float('inf'))
+                    self.__restart = False
+                search_opts = self.__search_opts()
+            try:
+                servers = nova_utils.get_servers(self.nova, search_opts)
+            except Exception as e:
+                logger.warn('Error listing servers, will retry - ' + str(e))
+            else:
+                self.__update(dict((server.id, server.status) for server in servers))
+            pace.sleep()
+
+    def __search_opts(self):
+        """
+        Returns the filters of the next listing, matching the names of the servers being waited upon when they are all
+        known and the filter is not too long. Must be called while holding the lock.
+        """
+        search_opts = dict(self.search_opts or dict())
+        names = self.__names.values()
+        if 'name' not in search_opts and names and None not in names:
+            pattern = name_filter(names)
+            if len(pattern) <= MAX_NAME_FILTER_LENGTH:
+                search_opts['name'] = pattern
+        return search_opts or None
+
+    def __update(self, statuses):
+        """
+        Releases every caller whose server has reached its expected status or has failed
+        :param statuses: dictionary of server ID to status from the latest listing
+        """
+        with self.__lock:
+            for server_id, waits in self.__pending.items():
+                status = statuses.get(server_id, STATUS_DELETED)
+                logger.debug('Instance [' + server_id + '] status is - ' + status)
+                for wait in list(waits):
+                    if status == STATUS_ERROR and wait.expected_status != STATUS_DELETED:
+                        wait.error = Exception('Instance had an error during deployment')
+                    elif status != wait.expected_status:
+                        continue
+                    waits.remove(wait)
+                    wait.event.set()
+                if not waits:
+                    del self.__pending[server_id]
+                    self.__names.pop(server_id, None)
+
+
+def name_filter(names):
+    """
+    Returns the Nova server filter matching exactly the given server names
+    :param names: the server names
+    :return: the filter value (i.e. '^(vm1|vm2)$')
+    """
+    escaped = [''.join('\\' + char if char in REGEX_SPECIAL_CHARS else char for char in name)
+               for name in sorted(set(names))]
+    return '^(' + '|'.join(escaped) + ')$'
+
+
+def get_waiter(os_creds, policy=None):
+    """
+    Returns the waiter shared by every VM instance created with the same credentials
+    :param os_creds: the credentials for connecting to the OpenStack remote API
+    :param policy: (Optional) the WaitPolicy pacing the listings. It is only used by the first call for the
+                   credentials; later calls return the existing waiter and ignore it.
+    :return: the FleetWaiter object
+    """
+    with _waiters_lock:
+        waiter = _waiters.get(os_creds)
+        if not waiter:
+            waiter = FleetWaiter(client_registry.get_client(os_creds, client_registry.COMPUTE), policy)
+            _waiters[os_creds] = waiter
+        return waiter
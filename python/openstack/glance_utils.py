@@ -13,36 +13,102 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
-from glanceclient import Client
-from keystoneclient.auth.identity import v2 as identity
-from keystoneclient import session
-import keystoneclient.v2_0.client as ksclient
+
+import api_metrics
 
 __author__ = 'spisarski'
 
 logger = logging.getLogger('glance_utils')
 
 """
-Utilities for basic neutron API calls
+Utilities for basic Glance API calls
 """
 
 
 def glance_client(os_creds):
     """
     Creates and returns a glance client object
+    :param os_creds: the credentials for connecting to the OpenStack remote API
     :return: the glance client
     """
-    logger.info('Retrieving Keystone Client')
-    keystone = ksclient.Client(**{
-        'username': os_creds.username,
-        'password': os_creds.password,
-        'auth_url': os_creds.auth_url,
-        'tenant_name': os_creds.tenant_name})
-    glance_endpoint = keystone.service_catalog.url_for(service_type='image', endpoint_type='publicURL')
-    auth = identity.Password(auth_url=os_creds.auth_url, username=os_creds.username, password=os_creds.password,
-                             tenant_name=os_creds.tenant_name)
-    sess = session.Session(auth=auth)
-    token = auth.get_token(sess)
+    from glanceclient import Client
+    import keystone_utils
+
+    glance_endpoint = keystone_utils.get_endpoint(os_creds, 'image')
 
     logger.info('Retrieving Glance Client')
-    return Client('2', endpoint=glance_endpoint, token=token)
+    return Client('2', endpoint=glance_endpoint, session=keystone_utils.keystone_session(os_creds))
+
+
+@api_metrics.timed('glance_utils.create_image')
+def create_image(glance, name, disk_format, image_file_path, visibility=None):
+    """
+    Registers an image and uploads its file
+    :param glance: the Glance client
+    :param name: the image name
+    :param disk_format: the image format (i.e. 'qcow2')
+    :param image_file_path: the path to the local image file
+    :param visibility: the image's visibility, i.e. 'public' (Optional - Glance's default when None)
+    :return: the image object
+    """
+    image = __create(glance, name, disk_format, visibility)
+    logger.info('Uploading image file')
+    with open(image_file_path, 'rb') as image_file:
+        glance.images.upload(image.id, image_file)
+    logger.info('Image file upload complete')
+    return image
+
+
+@api_metrics.timed('glance_utils.create_image_from_stream')
+def create_image_from_stream(glance, name, disk_format, stream, size=None, visibility=None):
+    """
+    Registers an image and uploads its data from a file-like object as it is read. The image is deleted when the
+    upload fails.
+    :param glance: the Glance client
+    :param name: the image name
+    :param disk_format: the image format (i.e. 'qcow2')
+    :param stream: the file-like object returning the image's data
+    :param size: the number of bytes of the image (Optional)
+    :param visibility: the image's visibility, i.e. 'public' (Optional - Glance's default when None)
+    :return: the image object
+    """
+    image = __create(glance, name, disk_format, visibility)
+    logger.info('Uploading image data as it is downloaded')
+    try:
+        glance.images.upload(image.id, stream, image_size=size)
+    except Exception:
+        logger.warn('Deleting image after failed upload - ' + image.id)
+        glance.images.delete(image.id)
+        raise
+    logger.info('Image data upload complete')
+    return image
+
+
+def __create(glance, name, disk_format, visibility):
+    """
+    Registers an image without any data
+    """
+    if visibility:
+        return glance.images.create(name=name, disk_format=disk_format, container_format="bare", visibility=visibility)
+    return glance.images.create(name=name, disk_format=disk_format, container_format="bare")
+
+
+@api_metrics.timed('glance_utils.get_images')
+def get_images(glance):
+    """
+    Returns a list of all images visible to the tenant
+    :param glance: the Glance client
+    :return: the list of image objects
+    """
+    return list(glance.images.list())
+
+
+@api_metrics.timed('glance_utils.delete_image')
+def delete_image(glance, image):
+    """
+    Deletes an image
+    :param glance: the Glance client
+    :param image: the image object to delete
+    """
+    logger.debug('Deleting image - ' + image['id'])
+    glance.images.delete(image['id'])
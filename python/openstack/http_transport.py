@@ -0,0 +1,123 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('http_transport')
+
+"""
+The single pooled, keep-alive HTTP transport used by every OpenStack client
+"""
+
+_settings = None
+_session = None
+_session_lock = threading.Lock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    Connection pooling adapter that applies a default (connect, read) timeout to requests that do not set their own
+    """
+
+    def __init__(self, connect_timeout, read_timeout, **kwargs):
+        """
+        Constructor
+        :param connect_timeout: seconds to wait for a TCP/TLS connection to be established
+        :param read_timeout: seconds to wait between bytes received from the server
+        :param kwargs: passed through to requests.adapters.HTTPAdapter
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        super(TimeoutHTTPAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = (self.connect_timeout, self.read_timeout)
+        return super(TimeoutHTTPAdapter, self).send(request, **kwargs)
+
+
+class TransportSettings:
+    """
+    Class representing the HTTP connection pool configuration
+    """
+
+    def __init__(self, config=None, pool_connections=10, pool_maxsize=20, pool_block=False, connect_timeout=10,
+                 read_timeout=300, max_retries=0):
+        """
+        Constructor - all parameters are optional
+        :param config: Should be a dict object containing the configuration settings using the attribute names below
+                       as each member's the key and overrides any of the other parameters.
+        :param pool_connections: The number of hosts (i.e. Keystone, Nova, Neutron, Glance) for which connection pools
+                                 are kept
+        :param pool_maxsize: The maximum number of persistent connections kept to any one host
+        :param pool_block: When True, requests wait for a free pooled connection instead of opening a throwaway one
+                           once pool_maxsize connections to a host are in use
+        :param connect_timeout: Seconds to wait for a connection to be established
+        :param read_timeout: Seconds to wait for the server to send data
+        :param max_retries: The number of times failed connections are retried
+        """
+        if config:
+            self.pool_connections = config.get('pool_connections', pool_connections)
+            self.pool_maxsize = config.get('pool_maxsize', pool_maxsize)
+            self.pool_block = config.get('pool_block', pool_block)
+            self.connect_timeout = config.get('connect_timeout', connect_timeout)
+            self.read_timeout = config.get('read_timeout', read_timeout)
+            self.max_retries = config.get('max_retries', max_retries)
+        else:
+            self.pool_connections = pool_connections
+            self.pool_maxsize = pool_maxsize
+            self.pool_block = pool_block
+            self.connect_timeout = connect_timeout
+            self.read_timeout = read_timeout
+            self.max_retries = max_retries
+
+
+def configure(transport_settings):
+    """
+    Sets the pool configuration. Only takes effect for sessions created after this call, so it should be called
+    before the first OpenStack client is created.
+    :param transport_settings: the TransportSettings object
+    """
+    global _settings, _session
+    with _session_lock:
+        _settings = transport_settings
+        if _session:
+            _session.close()
+        _session = None
+
+
+def http_session():
+    """
+    Returns the shared requests session whose connection pools are used by all Keystone sessions
+    :return: the requests.Session object
+    """
+    global _session
+    with _session_lock:
+        if not _session:
+            settings = _settings or TransportSettings()
+            logger.info('Creating HTTP transport with pool size ' + str(settings.pool_maxsize) + ' per host')
+            _session = requests.Session()
+            adapter = TimeoutHTTPAdapter(settings.connect_timeout, settings.read_timeout,
+                                         pool_connections=settings.pool_connections,
+                                         pool_maxsize=settings.pool_maxsize, pool_block=settings.pool_block,
+                                         max_retries=settings.max_retries)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
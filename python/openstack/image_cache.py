@@ -0,0 +1,351 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import contextlib
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import file_utils
+
+__author__ = 'spisarski'
+
+"""
+Local cache of downloaded image files shared by every environment deployed from a host
+"""
+
+logger = logging.getLogger('image_cache')
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = '.lock'
+OBJECTS_DIR = 'objects'
+DOWNLOADS_DIR = 'downloads'
+
+# The supported checksum algorithms
+SHA256 = 'sha256'
+MD5 = 'md5'
+
+# The number of bytes read at once when computing a file's digests
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def parse_checksum(checksum):
+    """
+    Returns the algorithm and digest of an expected checksum
+    :param checksum: '<algorithm>:<hex digest>' or a bare sha256 or md5 hex digest (Optional)
+    :return: a tuple of the algorithm and lower case hex digest or None when no checksum is given
+    :raises Exception: when the checksum cannot be interpreted
+    """
+    if not checksum:
+        return None
+    algorithm, separator, digest = str(checksum).strip().rpartition(':')
+    digest = digest.lower()
+    if algorithm:
+        algorithm = algorithm.lower()
+    else:
+        algorithm = {64: SHA256, 32: MD5}.get(len(digest))
+    if algorithm not in (SHA256, MD5) or not digest or any(char not in '0123456789abcdef' for char in digest):
+        raise Exception('Unsupported checksum - ' + str(checksum))
+    return algorithm, digest
+
+
+def file_digests(file_path):
+    """
+    Returns the sha256 and md5 digests of a file, reading it once
+    :param file_path: the path to the file
+    :return: a dictionary of hex digests keyed by algorithm
+    """
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as digest_file:
+        while True:
+            chunk = digest_file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            md5.update(chunk)
+    return {SHA256: sha256.hexdigest(), MD5: md5.hexdigest()}
+
+
+def verify(file_path, checksum):
+    """
+    Checks that a file matches its expected checksum
+    :param file_path: the path to the file
+    :param checksum: the expected checksum (Optional - see parse_checksum())
+    :return: the digests of the file as returned by file_digests()
+    :raises Exception: when the file does not match
+    """
+    digests = file_digests(file_path)
+    expected = parse_checksum(checksum)
+    if expected and digests[expected[0]] != expected[1]:
+        raise Exception('Checksum mismatch for ' + file_path + ' - expected ' + expected[0] + ' ' + expected[1] +
+                        ' but was ' + digests[expected[0]])
+    return digests
+
+
+class ImageCache:
+    """
+    Directory of downloaded image files shared by every environment deployed from this host. Each file is stored once
+    under its sha256 digest after it has been verified and is indexed by the URLs it was downloaded from. Callers
+    receive a hard link to it (or a copy when their directory is on another file system) so that removing their file
+    never affects the cache. The least recently used files are removed once they exceed the size limit. The index is
+    only read and written while holding an exclusive lock on the cache directory so that concurrent deployments can
+    share it.
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        """
+        Constructor
+        :param cache_dir: the cache directory (created when missing)
+        :param max_size: the maximum number of bytes of image files kept (Optional - unlimited when None)
+        """
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+        for directory in (OBJECTS_DIR, DOWNLOADS_DIR):
+            path = os.path.join(self.cache_dir, directory)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+    def fetch(self, url, dest_path, checksum=None):
+        """
+        Places an image file into a directory, downloading it only when the cache holds no file for the URL or, when
+        given, the expected checksum
+        :param url: the download URL of the image file
+        :param dest_path: the directory into which the image file is placed
+        :param checksum: the expected checksum (Optional - see parse_checksum())
+        :return: the path of the image file, named after the URL's basename in dest_path
+        :raises Exception: when the downloaded file does not match the checksum
+        """
+        dest = dest_path + '/' + url.rsplit('/')[-1]
+        expected = parse_checksum(checksum)
+        if self.__reuse(url, expected, dest):
+            return dest
+
+        download_dir = self.__download_dir(url)
+        # Only one process downloads a URL at a time, the others find it in the cache once it is done
+        with self.__file_lock(os.path.join(download_dir, LOCK_FILE)):
+            if self.__reuse(url, expected, dest):
+                return dest
+
+            logger.info('Downloading image into cache from - ' + url)
+            downloaded = file_utils.download(url, download_dir)
+            try:
+                digests = verify(downloaded, checksum)
+            except Exception:
+                os.remove(downloaded)
+                raise
+            self.store(url, downloaded, digests, dest)
+        # The download directory is kept as other processes may be waiting on its lock or staging files in it
+        return dest
+
+    def find(self, url, checksum=None):
+        """
+        Returns the cached file for a URL or, when given, the expected checksum and marks it as used
+        :param url: the download URL of the image file
+        :param checksum: the expected checksum (Optional - see parse_checksum())
+        :return: the path of the cached file or None
+        """
+        with self.__index() as index:
+            digest = self.__lookup(index, url, parse_checksum(checksum))
+            if not digest:
+                return None
+            index['objects'][digest]['last_used'] = time.time()
+            index['urls'][url] = digest
+            return self.__object_path(digest)
+
+    def staging_path(self, url):
+        """
+        Creates an empty file on the cache's file system into which a file downloaded by other means can be written
+        before being passed to store(). Each call returns a new file so that concurrent downloads of the same URL never
+        write into the same one.
+        :param url: the download URL of the file
+        :return: the path
+        """
+        fd, path = tempfile.mkstemp(prefix=url.rsplit('/')[-1] + '.', suffix='.staged', dir=self.__download_dir(url))
+        os.close(fd)
+        return path
+
+    def store(self, url, file_path, digests, dest=None):
+        """
+        Moves a verified file into the cache, links it to the destination and evicts the least recently used files
+        over the size limit
+        :param url: the download URL of the file
+        :param file_path: the file, on the cache's file system (see staging_path())
+        :param digests: the digests of the file as returned by file_digests()
+        :param dest: the path to which the cached file is linked (Optional)
+        """
+        digest = digests[SHA256]
+        object_path = self.__object_path(digest)
+        with self.__index() as index:
+            if os.path.isfile(object_path):
+                # The same content was downloaded from another URL
+                os.remove(file_path)
+            else:
+                os.chmod(file_path, 0444)
+                os.rename(file_path, object_path)
+            index['objects'][digest] = {'size': os.path.getsize(object_path), MD5: digests[MD5],
+                                        'last_used': time.time()}
+            index['urls'][url] = digest
+            if dest:
+                self.__link(digest, dest)
+            self.__evict(index, digest)
+
+    def size(self):
+        """
+        Returns the number of bytes of image files held by the cache
+        """
+        with self.__index() as index:
+            return sum(entry['size'] for entry in index['objects'].itervalues())
+
+    def __reuse(self, url, expected, dest):
+        """
+        Links the cached file for a URL or expected checksum to the destination
+        :return: T/F - False when the cache holds no such file
+        """
+        with self.__index() as index:
+            digest = self.__lookup(index, url, expected)
+            if not digest:
+                return False
+            logger.info('Using cached image file for - ' + url)
+            index['objects'][digest]['last_used'] = time.time()
+            index['urls'][url] = digest
+            self.__link(digest, dest)
+            return True
+
+    def __lookup(self, index, url, expected):
+        """
+        Returns the digest of the cached file matching the expected checksum, or when none is given, the one last
+        downloaded from the URL. Entries whose file has gone or changed size are forgotten.
+        """
+        if expected:
+            if expected[0] == SHA256:
+                candidates = [expected[1]]
+            else:
+                candidates = [digest for digest, entry in index['objects'].iteritems()
+                              if entry.get(MD5) == expected[1]]
+        else:
+            candidates = [index['urls'].get(url)]
+
+        for digest in candidates:
+            entry = index['objects'].get(digest)
+            if not entry:
+                continue
+            object_path = self.__object_path(digest)
+            if os.path.isfile(object_path) and os.path.getsize(object_path) == entry['size']:
+                return digest
+            logger.warn('Forgetting missing or damaged cached image file - ' + object_path)
+            self.__forget(index, digest)
+        return None
+
+    def __evict(self, index, keep):
+        """
+        Removes the least recently used files other than the one to keep until the cache fits its size limit
+        """
+        if self.max_size is None:
+            return
+        total = sum(entry['size'] for entry in index['objects'].itervalues())
+        for digest, entry in sorted(index['objects'].items(), key=lambda item: item[1].get('last_used', 0)):
+            if total <= self.max_size:
+                break
+            if digest == keep:
+                continue
+            logger.info('Evicting cached image file ' + digest + ' of ' + str(entry['size']) + ' bytes')
+            self.__forget(index, digest)
+            total -= entry['size']
+
+    def __forget(self, index, digest):
+        index['objects'].pop(digest, None)
+        for url in [url for url, url_digest in index['urls'].iteritems() if url_digest == digest]:
+            del index['urls'][url]
+        object_path = self.__object_path(digest)
+        if os.path.isfile(object_path):
+            os.remove(object_path)
+
+    def __link(self, digest, dest):
+        """
+        Hard links a cached file to the destination, copying it when the destination is on another file system
+        """
+        object_path = self.__object_path(digest)
+        if os.path.exists(dest):
+            if os.path.samefile(object_path, dest):
+                return
+            os.remove(dest)
+        try:
+            os.link(object_path, dest)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            logger.info('Copying cached image file as it cannot be linked - ' + str(e))
+            tmp_path = dest + file_utils.PART_SUFFIX
+            shutil.copyfile(object_path, tmp_path)
+            os.rename(tmp_path, dest)
+
+    def __download_dir(self, url):
+        download_dir = os.path.join(self.cache_dir, DOWNLOADS_DIR, hashlib.sha1(url).hexdigest())
+        if not os.path.isdir(download_dir):
+            os.makedirs(download_dir)
+        return download_dir
+
+    def __object_path(self, digest):
+        return os.path.join(self.cache_dir, OBJECTS_DIR, digest)
+
+    @contextlib.contextmanager
+    def __file_lock(self, lock_path):
+        """
+        Holds an exclusive lock on a file shared with other processes
+        """
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def __index(self):
+        """
+        Yields the index while holding the cache's lock and atomically writes it back afterwards
+        """
+        with self.__lock:
+            with self.__file_lock(os.path.join(self.cache_dir, LOCK_FILE)):
+                index = self.__read_index()
+                yield index
+                self.__write_index(index)
+
+    def __read_index(self):
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        if os.path.isfile(index_path):
+            try:
+                with open(index_path) as index_file:
+                    index = json.load(index_file)
+                if isinstance(index, dict) and 'urls' in index and 'objects' in index:
+                    return index
+            except (IOError, ValueError) as e:
+                logger.warn('Ignoring unreadable image cache index [' + index_path + '] - ' + str(e))
+        return {'urls': dict(), 'objects': dict()}
+
+    def __write_index(self, index):
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        tmp_path = index_path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_path, 'w') as index_file:
+            json.dump(index, index_file)
+        os.rename(tmp_path, index_path)
@@ -0,0 +1,160 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import calendar
+import logging
+import threading
+
+from openstack import http_transport
+from openstack.token_cache import TokenCache
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('keystone_utils')
+
+"""
+Utilities for managing the Keystone sessions shared by all of the OpenStack clients
+"""
+
+# Tokens expiring within this number of seconds are refreshed before being handed to a client
+TOKEN_EXPIRY_BUFFER = 300
+
+_sessions = dict()
+_sessions_lock = threading.Lock()
+_token_cache = None
+_password_class = None
+
+
+def refreshing_password(os_creds, token_cache=None):
+    """
+    Returns the Keystone password authentication plugin for the given credentials. The plugin class is built on the
+    first call so that keystoneclient is only imported once a client is actually needed.
+    :param os_creds: the credentials for connecting to the OpenStack remote API
+    :param token_cache: (Optional) the TokenCache object holding tokens from previous runs
+    :return: the RefreshingPassword object
+    """
+    global _password_class
+    if not _password_class:
+        _password_class = __password_class()
+    return _password_class(os_creds, token_cache)
+
+
+def __password_class():
+    """
+    Defines the RefreshingPassword class on top of the keystoneclient password plugin
+    :return: the class
+    """
+    from keystoneclient import access
+    from keystoneclient.auth.identity import v2 as identity
+
+    class RefreshingPassword(identity.Password):
+        """
+        Password authentication plugin that re-authenticates once the current token is within TOKEN_EXPIRY_BUFFER
+        seconds of expiring. When a TokenCache is supplied, tokens are read from and saved to it so that separate
+        processes can share them.
+        """
+        MIN_TOKEN_LIFE_SECONDS = TOKEN_EXPIRY_BUFFER
+
+        def __init__(self, os_creds, token_cache=None):
+            """
+            Constructor
+            :param os_creds: the credentials for connecting to the OpenStack remote API
+            :param token_cache: (Optional) the TokenCache object holding tokens from previous runs
+            """
+            super(RefreshingPassword, self).__init__(auth_url=os_creds.auth_url, username=os_creds.username,
+                                                     password=os_creds.password, tenant_name=os_creds.tenant_name)
+            self.os_creds = os_creds
+            self.token_cache = token_cache
+
+        def get_auth_ref(self, session, **kwargs):
+            """
+            Returns the cached token and service catalog when still valid, else authenticates with Keystone
+            """
+            if self.token_cache:
+                body = self.token_cache.get(self.os_creds, self.MIN_TOKEN_LIFE_SECONDS)
+                if body:
+                    return access.AccessInfo.factory(body={'access': body})
+
+            auth_ref = super(RefreshingPassword, self).get_auth_ref(session, **kwargs)
+            if self.token_cache and auth_ref.expires:
+                self.token_cache.put(self.os_creds, dict(auth_ref), calendar.timegm(auth_ref.expires.utctimetuple()))
+            return auth_ref
+
+        def invalidate(self):
+            """
+            Called by the session when a request is rejected with a 401 so the stale token is not reused by other runs
+            """
+            if self.token_cache:
+                self.token_cache.invalidate(self.os_creds)
+            return super(RefreshingPassword, self).invalidate()
+
+    return RefreshingPassword
+
+
+def keystone_session(os_creds):
+    """
+    Returns the Keystone session shared by every client built with the same credentials. The session is created on
+    the first call, authenticates lazily on its first request and sends everything over the pooled HTTP transport.
+    :param os_creds: the credentials for connecting to the OpenStack remote API
+    :return: the session object
+    """
+    from keystoneclient import session
+
+    with _sessions_lock:
+        sess = _sessions.get(os_creds)
+        if not sess:
+            logger.info('Creating Keystone session for user - ' + os_creds.username)
+            auth = refreshing_password(os_creds, _token_cache)
+            sess = session.Session(auth=auth, session=http_transport.http_session())
+            _sessions[os_creds] = sess
+        return sess
+
+
+def get_token(os_creds):
+    """
+    Returns a valid token for the given credentials, re-authenticating only when the cached one is about to expire
+    :param os_creds: the credentials for connecting to the OpenStack remote API
+    :return: the token string
+    """
+    return keystone_session(os_creds).get_token()
+
+
+def get_endpoint(os_creds, service_type, interface='public'):
+    """
+    Returns the endpoint URL for a service from the service catalog of the shared session
+    :param os_creds: the credentials for connecting to the OpenStack remote API
+    :param service_type: the catalog service type (i.e. 'image', 'network', 'compute')
+    :param interface: the endpoint interface (default 'public')
+    :return: the endpoint URL
+    """
+    return keystone_session(os_creds).get_endpoint(service_type=service_type, interface=interface)
+
+
+def enable_token_cache(file_path):
+    """
+    Opts in to persisting tokens and service catalogs to disk so that subsequent processes need not authenticate.
+    Must be called before the first client is created.
+    :param file_path: the location of the cache file
+    """
+    global _token_cache
+    logger.info('Caching Keystone tokens in - ' + file_path)
+    _token_cache = TokenCache(file_path)
+
+
+def clear_sessions():
+    """
+    Discards all cached sessions so the next client factory call authenticates again
+    """
+    with _sessions_lock:
+        _sessions.clear()
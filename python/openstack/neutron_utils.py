@@ -14,7 +14,7 @@
 # limitations under the License.
 import logging
 
-from neutronclient.v2_0 import client as neutronclient
+import api_metrics
 
 __author__ = 'spisarski'
 
@@ -25,19 +25,36 @@ Utilities for basic neutron API calls
 """
 
 
+class BulkCreateError(Exception):
+    """
+    Raised when some of the resources requested in bulk could not be created
+    """
+
+    def __init__(self, message, created, failures):
+        """
+        Constructor
+        :param message: the error message
+        :param created: the created objects in the order requested where None marks each one that failed
+        :param failures: a list of (index, settings, exception) tuples, one for each resource that failed
+        """
+        super(BulkCreateError, self).__init__(message)
+        self.created = created
+        self.failures = failures
+
+
 def neutron_client(os_creds):
     """
     Instantiates and returns a client for communications with OpenStack's Neutron server
     :param os_creds: the credentials for connecting to the OpenStack remote API
     :return: the client object
     """
-    return neutronclient.Client(**{
-        'username': os_creds.username,
-        'password': os_creds.password,
-        'auth_url': os_creds.auth_url,
-        'tenant_name': os_creds.tenant_name})
+    from neutronclient.v2_0 import client as neutronclient
+    import keystone_utils
 
+    return neutronclient.Client(session=keystone_utils.keystone_session(os_creds))
 
+
+@api_metrics.timed('neutron_utils.create_network')
 def create_network(neutron, network_settings):
     """
     Creates a network for OpenStack
@@ -54,6 +71,22 @@ def create_network(neutron, network_settings):
         raise Exception
 
 
+@api_metrics.timed('neutron_utils.create_networks')
+def create_networks(neutron, network_settings_list):
+    """
+    Creates several networks for OpenStack with a single bulk request
+    :param neutron: the client
+    :param network_settings_list: a list of NetworkSettings objects, one for each network to create
+    :return: a list of the network objects in the same order as the settings
+    :raises BulkCreateError: when any of the networks could not be created
+    """
+    return __create_bulk(neutron.create_network, 'network', 'networks', network_settings_list,
+                         [network_settings.dict_for_neutron()['network']
+                          for network_settings in network_settings_list],
+                         lambda network: {'network': network})
+
+
+@api_metrics.timed('neutron_utils.delete_network')
 def delete_network(neutron, network):
     """
     Deletes a network for OpenStack
@@ -64,21 +97,39 @@ def delete_network(neutron, network):
         neutron.delete_network(network['network']['id'])
 
 
-def get_network_by_name(neutron, network_name):
+@api_metrics.timed('neutron_utils.get_networks_by_name')
+def get_networks_by_name(neutron, network_name, tenant_id=None, fields=None):
+    """
+    Returns all networks with a given name, filtered by the Neutron server rather than by this client
+    :param neutron: the client
+    :param network_name: the name of the networks to retrieve
+    :param tenant_id: (Optional) only return networks owned by this tenant
+    :param fields: (Optional) list of the attributes to return for each network (default all)
+    :return: a list of network dictionaries
+    """
+    return __list_by_name(neutron.list_networks, 'networks', network_name, tenant_id, fields)
+
+
+@api_metrics.timed('neutron_utils.get_network_by_name')
+def get_network_by_name(neutron, network_name, tenant_id=None, fields=None, unique=False):
     """
     Returns a network object (dictionary) of the first network found with a given name
     :param neutron: the client
     :param network_name: the name of the network to retrieve
+    :param tenant_id: (Optional) only consider networks owned by this tenant
+    :param fields: (Optional) list of the attributes to return (default all)
+    :param unique: when True, raise an Exception if more than one network has this name (default False which logs a
+                   warning and returns the first)
     :return:
     """
-    networks = neutron.list_networks()
-    for network, netInsts in networks.iteritems():
-        for inst in netInsts:
-            if inst.get('name') == network_name:
-                return {'network': inst}
+    networks = get_networks_by_name(neutron, network_name, tenant_id, fields)
+    inst = __first_match(networks, 'network', network_name, unique)
+    if inst:
+        return {'network': inst}
     return None
 
 
+@api_metrics.timed('neutron_utils.create_subnet')
 def create_subnet(neutron, subnet_settings, network=None):
     """
     Creates a network subnet for OpenStack
@@ -96,6 +147,22 @@ def create_subnet(neutron, subnet_settings, network=None):
         raise Exception
 
 
+@api_metrics.timed('neutron_utils.create_subnets')
+def create_subnets(neutron, subnet_requests):
+    """
+    Creates several subnets for OpenStack with a single bulk request
+    :param neutron: the client
+    :param subnet_requests: a list of (subnet_settings, network) tuples, one for each subnet to create
+    :return: a list of the subnet objects in the same order as the requests
+    :raises BulkCreateError: when any of the subnets could not be created; the failures hold the SubnetSettings
+    """
+    return __create_bulk(neutron.create_subnet, 'subnet', 'subnets',
+                         [subnet_settings for subnet_settings, network in subnet_requests],
+                         [subnet_settings.dict_for_neutron(network) for subnet_settings, network in subnet_requests],
+                         lambda subnet: {'subnets': [subnet]})
+
+
+@api_metrics.timed('neutron_utils.delete_subnet')
 def delete_subnet(neutron, subnet):
     """
     Deletes a network subnet for OpenStack
@@ -106,37 +173,57 @@ def delete_subnet(neutron, subnet):
         neutron.delete_subnet(subnet['subnets'][0]['id'])
 
 
-def get_subnet_by_name(neutron, subnet_name):
+@api_metrics.timed('neutron_utils.get_subnets_by_name')
+def get_subnets_by_name(neutron, subnet_name, tenant_id=None, fields=None):
+    """
+    Returns all subnets with a given name, filtered by the Neutron server rather than by this client
+    :param neutron: the client
+    :param subnet_name: the name of the subnets to retrieve
+    :param tenant_id: (Optional) only return subnets owned by this tenant
+    :param fields: (Optional) list of the attributes to return for each subnet (default all)
+    :return: a list of subnet dictionaries
+    """
+    return __list_by_name(neutron.list_subnets, 'subnets', subnet_name, tenant_id, fields)
+
+
+@api_metrics.timed('neutron_utils.get_subnet_by_name')
+def get_subnet_by_name(neutron, subnet_name, tenant_id=None, fields=None, unique=False):
     """
     Returns a subnet object (dictionary) of the first subnet found with a given name
     :param neutron: the client
     :param subnet_name: the name of the network to retrieve
+    :param tenant_id: (Optional) only consider subnets owned by this tenant
+    :param fields: (Optional) list of the attributes to return (default all)
+    :param unique: when True, raise an Exception if more than one subnet has this name (default False which logs a
+                   warning and returns the first)
     :return:
     """
-    subnets = neutron.list_subnets()
-    for subnet, subnetInst in subnets.iteritems():
-        for inst in subnetInst:
-            if inst.get('name') == subnet_name:
-                return {'subnets': [inst]}
+    subnets = get_subnets_by_name(neutron, subnet_name, tenant_id, fields)
+    inst = __first_match(subnets, 'subnet', subnet_name, unique)
+    if inst:
+        return {'subnets': [inst]}
     return None
 
 
-def create_router(neutron, router_settings):
+@api_metrics.timed('neutron_utils.create_router')
+def create_router(neutron, router_settings, inventory=None):
     """
     Creates a router for OpenStack
     :param neutron: the client
     :param router_settings: A dictionary containing the router configuration and is responsible for creating the subnet
                             request JSON body
+    :param inventory: (Optional) the TenantInventory used to resolve the external gateway network
     :return: the router object
     """
     if neutron:
-        json_body = router_settings.dict_for_neutron(neutron)
+        json_body = router_settings.dict_for_neutron(neutron, inventory)
         return neutron.create_router(json_body)
     else:
         logger.error("Failed to create router.")
         raise Exception
 
 
+@api_metrics.timed('neutron_utils.delete_router')
 def delete_router(neutron, router):
     """
     Deletes a router for OpenStack
@@ -148,21 +235,39 @@ def delete_router(neutron, router):
         return True
 
 
-def get_router_by_name(neutron, router_name):
+@api_metrics.timed('neutron_utils.get_routers_by_name')
+def get_routers_by_name(neutron, router_name, tenant_id=None, fields=None):
+    """
+    Returns all routers with a given name, filtered by the Neutron server rather than by this client
+    :param neutron: the client
+    :param router_name: the name of the routers to retrieve
+    :param tenant_id: (Optional) only return routers owned by this tenant
+    :param fields: (Optional) list of the attributes to return for each router (default all)
+    :return: a list of router dictionaries
+    """
+    return __list_by_name(neutron.list_routers, 'routers', router_name, tenant_id, fields)
+
+
+@api_metrics.timed('neutron_utils.get_router_by_name')
+def get_router_by_name(neutron, router_name, tenant_id=None, fields=None, unique=False):
     """
     Returns a subnet object (dictionary) of the first subnet found with a given name
     :param neutron: the client
     :param router_name: the name of the network to retrieve
+    :param tenant_id: (Optional) only consider routers owned by this tenant
+    :param fields: (Optional) list of the attributes to return (default all)
+    :param unique: when True, raise an Exception if more than one router has this name (default False which logs a
+                   warning and returns the first)
     :return:
     """
-    routers = neutron.list_routers()
-    for router, routerInst in routers.iteritems():
-        for inst in routerInst:
-            if inst.get('name') == router_name:
-                return {'router': inst}
+    routers = get_routers_by_name(neutron, router_name, tenant_id, fields)
+    inst = __first_match(routers, 'router', router_name, unique)
+    if inst:
+        return {'router': inst}
     return None
 
 
+@api_metrics.timed('neutron_utils.add_interface_router')
 def add_interface_router(neutron, router, subnet):
     """
     Adds an interface router for OpenStack
@@ -180,6 +285,7 @@ def add_interface_router(neutron, router, subnet):
         raise Exception
 
 
+@api_metrics.timed('neutron_utils.remove_interface_router')
 def remove_interface_router(neutron, router, subnet):
     """
     Removes an interface router for OpenStack
@@ -193,6 +299,7 @@ def remove_interface_router(neutron, router, subnet):
         neutron.remove_interface_router(router=router['router']['id'], body=json_body)
 
 
+@api_metrics.timed('neutron_utils.create_port')
 def create_port(neutron, port_settings, network, subnet=None):
     """
     Creates a port for OpenStack
@@ -206,6 +313,23 @@ def create_port(neutron, port_settings, network, subnet=None):
     return neutron.create_port(body=json_body)
 
 
+@api_metrics.timed('neutron_utils.create_ports')
+def create_ports(neutron, port_requests):
+    """
+    Creates several ports for OpenStack with a single bulk request
+    :param neutron: the client
+    :param port_requests: a list of (port_settings, network, subnet) tuples, one for each port to create
+    :return: a list of the port objects in the same order as the requests
+    :raises BulkCreateError: when any of the ports could not be created; the failures hold the PortSettings
+    """
+    return __create_bulk(neutron.create_port, 'port', 'ports',
+                         [port_settings for port_settings, network, subnet in port_requests],
+                         [port_settings.dict_for_neutron(network, subnet)['port']
+                          for port_settings, network, subnet in port_requests],
+                         lambda port: {'port': port})
+
+
+@api_metrics.timed('neutron_utils.delete_port')
 def delete_port(neutron, port):
     """
     Removes an OpenStack port
@@ -214,3 +338,128 @@ def delete_port(neutron, port):
     :return:
     """
     neutron.delete_port(port['port']['id'])
+
+
+@api_metrics.timed('neutron_utils.get_networks')
+def get_networks(neutron):
+    """
+    Returns a list of all networks visible to the tenant
+    :param neutron: the client
+    :return: the list of network dictionaries
+    """
+    return neutron.list_networks()['networks']
+
+
+@api_metrics.timed('neutron_utils.get_subnets')
+def get_subnets(neutron):
+    """
+    Returns a list of all subnets visible to the tenant
+    :param neutron: the client
+    :return: the list of subnet dictionaries
+    """
+    return neutron.list_subnets()['subnets']
+
+
+@api_metrics.timed('neutron_utils.get_routers')
+def get_routers(neutron):
+    """
+    Returns a list of all routers visible to the tenant
+    :param neutron: the client
+    :return: the list of router dictionaries
+    """
+    return neutron.list_routers()['routers']
+
+
+@api_metrics.timed('neutron_utils.get_ports')
+def get_ports(neutron, network_ids=None):
+    """
+    Returns a list of all ports visible to the tenant
+    :param neutron: the client
+    :param network_ids: (Optional) only return the ports attached to one of these network IDs
+    :return: the list of port dictionaries
+    """
+    if network_ids is not None:
+        if not network_ids:
+            return list()
+        return neutron.list_ports(network_id=list(network_ids))['ports']
+    return neutron.list_ports()['ports']
+
+
+def __create_bulk(create_func, key, collection, settings_list, bodies, wrap):
+    """
+    Creates resources with a single bulk request. Neutron rolls back the whole request when any resource in it fails,
+    so on failure each resource is requested on its own to create the valid ones and identify those that fail.
+    :param create_func: the client's create function (i.e. neutron.create_port)
+    :param key: the resource type used for reporting (i.e. 'port')
+    :param collection: the key of the list in a bulk request and response body (i.e. 'ports')
+    :param settings_list: the settings objects of the resources, used to report failures
+    :param bodies: the resource dictionaries in the same order as the settings
+    :param wrap: function returning the object for a resource dictionary as returned by the single create functions
+    :return: the list of objects in the requested order
+    :raises BulkCreateError: when any of the resources could not be created
+    """
+    if not bodies:
+        return list()
+    try:
+        return [wrap(item) for item in create_func(body={collection: bodies})[collection]]
+    except Exception as e:
+        if len(bodies) == 1:
+            raise
+        logger.warn('Bulk creation of ' + str(len(bodies)) + ' ' + collection + ' failed, creating each on its own - ' +
+                    str(e))
+
+    created = list()
+    failures = list()
+    for index, (settings, body) in enumerate(zip(settings_list, bodies)):
+        try:
+            created.append(wrap(create_func(body={collection: [body]})[collection][0]))
+        except Exception as e:
+            logger.error('Unable to create ' + key + ' [' + str(getattr(settings, 'name', None)) + '] - ' + str(e))
+            created.append(None)
+            failures.append((index, settings, e))
+    if failures:
+        raise BulkCreateError('Unable to create ' + collection + ' - ' +
+                              ', '.join([str(getattr(settings, 'name', None)) for _, settings, _ in failures]),
+                              created, failures)
+    return created
+
+
+def __list_by_name(list_func, collection, name, tenant_id, fields):
+    """
+    Issues a list request with the name (and optionally tenant and field) filters applied by the Neutron server
+    :param list_func: the client's list function (i.e. neutron.list_networks)
+    :param collection: the key of the list in the response body (i.e. 'networks')
+    :param name: the name to match
+    :param tenant_id: the optional tenant filter
+    :param fields: the optional list of attributes to return
+    :return: the list of matching dictionaries
+    """
+    if name is None:
+        return list()
+
+    filters = {'name': name}
+    if tenant_id:
+        filters['tenant_id'] = tenant_id
+    if fields:
+        filters['fields'] = fields
+    return list_func(**filters)[collection]
+
+
+def __first_match(items, resource_type, name, unique):
+    """
+    Returns the first of the items, reporting when the name has matched more than one
+    :param items: the list of matching dictionaries
+    :param resource_type: the resource type used for reporting (i.e. 'network')
+    :param name: the name that was matched
+    :param unique: when True, raise an Exception when more than one item matched
+    :return: the first item or None
+    """
+    if len(items) > 1:
+        message = ('Found ' + str(len(items)) + ' ' + resource_type + 's with name [' + name + '] - ' +
+                   ', '.join([str(item.get('id')) for item in items]))
+        if unique:
+            raise Exception(message)
+        logger.warn(message)
+    if items:
+        return items[0]
+    return None
@@ -15,7 +15,7 @@
 import os
 import logging
 
-import novaclient.v2.client as novaclient
+import api_metrics
 
 __author__ = 'spisarski'
 
@@ -32,13 +32,51 @@ def nova_client(os_creds):
     :param os_creds: The connection credentials to the OpenStack API
     :return: the client object
     """
+    import novaclient.v2.client as novaclient
+    import keystone_utils
+
     logger.info('Retrieving Nova Client')
-    return novaclient.Client(**{
-        'username': os_creds.username,
-        'api_key': os_creds.password,
-        'auth_url': os_creds.auth_url,
-        'project_id': os_creds.tenant_name,
-    })
+    return novaclient.Client(session=keystone_utils.keystone_session(os_creds))
+
+
+@api_metrics.timed('nova_utils.create_server')
+def create_server(nova, name, flavor, image, nics, key_name=None, userdata=None):
+    """
+    Creates a VM instance
+    :param nova: the Nova client
+    :param name: the name of the instance
+    :param flavor: the flavor object
+    :param image: the image object
+    :param nics: a list of dictionaries containing the 'port-id' of each NIC
+    :param key_name: (Optional) the name of the keypair to inject
+    :param userdata: (Optional) the post installation script
+    :return: the server object
+    """
+    logger.info('Creating VM with name - ' + name)
+    return nova.servers.create(name=name, flavor=flavor, image=image, nics=nics, key_name=key_name,
+                               userdata=userdata)
+
+
+@api_metrics.timed('nova_utils.get_servers')
+def get_servers(nova, search_opts=None):
+    """
+    Returns a list of all VM instances in the tenant with their details (including status)
+    :param nova: the Nova client
+    :param search_opts: (Optional) dictionary of Nova server filters (i.e. {'name': '^deploy-'})
+    :return: the list of server objects
+    """
+    return nova.servers.list(detailed=True, search_opts=search_opts)
+
+
+@api_metrics.timed('nova_utils.delete_server')
+def delete_server(nova, server):
+    """
+    Deletes a VM instance
+    :param nova: the Nova client
+    :param server: the server object to delete
+    """
+    logger.debug('Deleting VM - ' + server.name)
+    nova.servers.delete(server)
 
 
 def save_keys_to_files(keys=None, pub_file_path=None, priv_file_path=None):
@@ -70,6 +108,7 @@ def save_keys_to_files(keys=None, pub_file_path=None, priv_file_path=None):
             logger.info("Saved private key to - " + priv_file_path)
 
 
+@api_metrics.timed('nova_utils.upload_keypair_file')
 def upload_keypair_file(nova, name, file_path):
     """
     Uploads a public key from a file
@@ -83,6 +122,7 @@ def upload_keypair_file(nova, name, file_path):
         return upload_keypair(nova, name, fpubkey.read())
 
 
+@api_metrics.timed('nova_utils.upload_keypair')
 def upload_keypair(nova, name, key):
     """
     Uploads a public key from a file
@@ -95,6 +135,7 @@ def upload_keypair(nova, name, key):
     return nova.keypairs.create(name=name, public_key=key)
 
 
+@api_metrics.timed('nova_utils.keypair_exists')
 def keypair_exists(nova, keypair_obj):
     """
     Returns a copy of the keypair object if found
@@ -108,6 +149,7 @@ def keypair_exists(nova, keypair_obj):
         return None
 
 
+@api_metrics.timed('nova_utils.get_keypairs')
 def get_keypairs(nova):
     """
     Returns a list of all available keypairs
@@ -117,6 +159,7 @@ def get_keypairs(nova):
     return nova.keypairs.list()
 
 
+@api_metrics.timed('nova_utils.delete_keypair')
 def delete_keypair(nova, key):
     """
     Deletes a keypair object from OpenStack
@@ -127,6 +170,17 @@ def delete_keypair(nova, key):
     nova.keypairs.delete(key)
 
 
+@api_metrics.timed('nova_utils.get_flavors')
+def get_flavors(nova):
+    """
+    Returns all of the flavors available to the tenant
+    :param nova: the Nova client
+    :return: a list of flavors
+    """
+    return nova.flavors.list()
+
+
+@api_metrics.timed('nova_utils.get_floating_ip_pools')
 def get_floating_ip_pools(nova):
     """
     Returns all of the available floating IP pools
@@ -136,6 +190,7 @@ def get_floating_ip_pools(nova):
     return nova.floating_ip_pools.list()
 
 
+@api_metrics.timed('nova_utils.get_floating_ips')
 def get_floating_ips(nova):
     """
     Returns all of the floating IPs
@@ -145,6 +200,7 @@ def get_floating_ips(nova):
     return nova.floating_ips.list()
 
 
+@api_metrics.timed('nova_utils.create_floating_ip')
 def create_floating_ip(nova, ext_net_name):
     """
     Returns the floating IP object that was created with this call
@@ -156,6 +212,7 @@ def create_floating_ip(nova, ext_net_name):
     return nova.floating_ips.create(ext_net_name)
 
 
+@api_metrics.timed('nova_utils.get_floating_ip')
 def get_floating_ip(nova, floating_ip):
     """
     Returns a floating IP object that should be identical to the floating_ip parameter
@@ -167,6 +224,7 @@ def get_floating_ip(nova, floating_ip):
     return nova.floating_ips.get(floating_ip)
 
 
+@api_metrics.timed('nova_utils.delete_floating_ip')
 def delete_floating_ip(nova, floating_ip):
     """
     Responsible for deleting a floating IP
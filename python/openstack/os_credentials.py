@@ -26,3 +26,15 @@ class OSCreds:
         self.auth_url = auth_url
         self.tenant_name = tenant_name
         self.proxy = proxy_settings
+
+    def __key(self):
+        return self.username, self.password, self.auth_url, self.tenant_name
+
+    def __eq__(self, other):
+        return isinstance(other, OSCreds) and self.__key() == other.__key()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.__key())
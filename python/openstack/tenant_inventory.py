@@ -0,0 +1,270 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import threading
+
+import glance_utils
+import neutron_utils
+import nova_utils
+from openstack import client_registry
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('tenant_inventory')
+
+NETWORKS = 'networks'
+SUBNETS = 'subnets'
+ROUTERS = 'routers'
+PORTS = 'ports'
+SERVERS = 'servers'
+FLOATING_IPS = 'floating_ips'
+KEYPAIRS = 'keypairs'
+IMAGES = 'images'
+FLAVORS = 'flavors'
+
+
+def get_attr(item, key):
+    """
+    Returns an attribute from either a Neutron dictionary or a Nova/Glance resource object
+    :param item: the resource
+    :param key: the attribute name
+    :return: the value or None
+    """
+    if isinstance(item, dict):
+        return item.get(key)
+    return getattr(item, key, None)
+
+
+def find_router_interface(inventory, router_id, subnet_id):
+    """
+    Returns the port attaching a subnet to a router (whichever of the router's interface owner types it has)
+    :param inventory: the TenantInventory
+    :param router_id: the router's ID
+    :param subnet_id: the subnet's ID
+    :return: the port dictionary or None
+    """
+    for port in inventory.filter(PORTS, device_id=router_id):
+        for fixed_ip in port.get('fixed_ips') or list():
+            if fixed_ip.get('subnet_id') == subnet_id:
+                return port
+    return None
+
+
+class TenantInventory:
+    """
+    Snapshot of the resources in a tenant shared by all creators in a deployment. Each resource type is listed in bulk
+    the first time it is needed and indexed by name and ID. Creators must call add() and remove() as they create and
+    delete resources so that the snapshot stays current for the remainder of the run.
+    Neutron resources are held as the bare dictionaries (i.e. without the {'network': ...} wrapper).
+    Listings run outside of the inventory's lock so that a slow one never blocks the lookups of other types, and a
+    listing that fails leaves its type unloaded so that the next lookup lists it again.
+    """
+
+    def __init__(self, os_creds):
+        """
+        Constructor
+        :param os_creds: The credentials to connect with OpenStack
+        """
+        self.os_creds = os_creds
+        self.__loaders = {
+            NETWORKS: lambda: neutron_utils.get_networks(self.__client(client_registry.NETWORK)),
+            SUBNETS: lambda: neutron_utils.get_subnets(self.__client(client_registry.NETWORK)),
+            ROUTERS: lambda: neutron_utils.get_routers(self.__client(client_registry.NETWORK)),
+            PORTS: lambda: neutron_utils.get_ports(self.__client(client_registry.NETWORK)),
+            SERVERS: lambda: nova_utils.get_servers(self.__client(client_registry.COMPUTE)),
+            FLOATING_IPS: lambda: nova_utils.get_floating_ips(self.__client(client_registry.COMPUTE)),
+            KEYPAIRS: lambda: nova_utils.get_keypairs(self.__client(client_registry.COMPUTE)),
+            IMAGES: lambda: glance_utils.get_images(self.__client(client_registry.IMAGE)),
+            FLAVORS: lambda: nova_utils.get_flavors(self.__client(client_registry.COMPUTE)),
+        }
+        self.__items = dict()
+        self.__by_id = dict()
+        self.__by_name = dict()
+        # Changes made while a type is being listed, replayed once the listing has been indexed
+        self.__loading = dict()
+        self.__load_locks = dict((resource_type, threading.Lock()) for resource_type in self.__loaders)
+        self.__lock = threading.RLock()
+
+    def __client(self, service_type):
+        return client_registry.get_client(self.os_creds, service_type)
+
+    def __load(self, resource_type):
+        """
+        Lists and indexes a resource type the first time it is requested. Must not be called while holding the lock.
+        """
+        loader = self.__loaders.get(resource_type)
+        if not loader:
+            raise Exception('Unsupported inventory resource type - ' + str(resource_type))
+        # Only one thread lists a type, the others wait for it without holding up the other types
+        with self.__load_locks[resource_type]:
+            with self.__lock:
+                if resource_type in self.__items:
+                    return
+                self.__loading[resource_type] = list()
+
+            logger.debug('Loading inventory of ' + resource_type)
+            try:
+                items = list(loader())
+            except Exception:
+                with self.__lock:
+                    del self.__loading[resource_type]
+                raise
+
+            with self.__lock:
+                self.__items[resource_type] = list()
+                self.__by_id[resource_type] = dict()
+                self.__by_name[resource_type] = dict()
+                for item in items:
+                    self.__index(resource_type, item)
+                for change, item in self.__loading.pop(resource_type):
+                    change(resource_type, item)
+
+    def __index(self, resource_type, item):
+        self.__items[resource_type].append(item)
+        item_id = get_attr(item, 'id')
+        if item_id is not None:
+            self.__by_id[resource_type][item_id] = item
+        name = get_attr(item, 'name')
+        if name is not None:
+            self.__by_name[resource_type].setdefault(name, list()).append(item)
+
+    def load(self, *resource_types):
+        """
+        Eagerly lists the given resource types (or all supported types when none are given)
+        """
+        for resource_type in resource_types or self.__loaders.keys():
+            self.__load(resource_type)
+
+    def loaded(self, resource_type):
+        """
+        Returns True when the resource type has already been listed
+        """
+        with self.__lock:
+            return resource_type in self.__items
+
+    def get_all(self, resource_type):
+        """
+        Returns every known resource of a type
+        :param resource_type: one of the resource type constants
+        :return: a list of the resources
+        """
+        self.__load(resource_type)
+        with self.__lock:
+            return list(self.__items[resource_type])
+
+    def find_all_by_name(self, resource_type, name):
+        """
+        Returns every resource of a type with the given name
+        :param resource_type: one of the resource type constants
+        :param name: the name to match
+        :return: a list of the resources
+        """
+        self.__load(resource_type)
+        with self.__lock:
+            return list(self.__by_name[resource_type].get(name, list()))
+
+    def find_by_name(self, resource_type, name):
+        """
+        Returns the first resource of a type with the given name, logging a warning when the name is shared
+        :param resource_type: one of the resource type constants
+        :param name: the name to match
+        :return: the resource or None
+        """
+        items = self.find_all_by_name(resource_type, name)
+        if len(items) > 1:
+            logger.warn('Found ' + str(len(items)) + ' ' + resource_type + ' with name [' + name + ']')
+        if items:
+            return items[0]
+        return None
+
+    def find_by_id(self, resource_type, item_id):
+        """
+        Returns the resource of a type with the given ID
+        :param resource_type: one of the resource type constants
+        :param item_id: the ID to match
+        :return: the resource or None
+        """
+        self.__load(resource_type)
+        with self.__lock:
+            return self.__by_id[resource_type].get(item_id)
+
+    def filter(self, resource_type, **attrs):
+        """
+        Returns the resources of a type whose attributes equal all of the given values
+        (i.e. filter(FLOATING_IPS, instance_id=server.id))
+        :param resource_type: one of the resource type constants
+        :return: a list of the resources
+        """
+        return [item for item in self.get_all(resource_type)
+                if all(get_attr(item, key) == value for key, value in attrs.iteritems())]
+
+    def pin(self, resource_type, item_id):
+        """
+        Makes the resource with the given ID the one returned by find_by_name() for its name (i.e. the one recorded by
+        a previous run when others share its name)
+        :param resource_type: one of the resource type constants
+        :param item_id: the ID of the resource
+        :return: the resource or None when no resource has the ID
+        """
+        self.__load(resource_type)
+        with self.__lock:
+            item = self.__by_id[resource_type].get(item_id)
+            if item is not None:
+                name = get_attr(item, 'name')
+                if name is not None:
+                    others = [known for known in self.__by_name[resource_type][name] if known is not item]
+                    self.__by_name[resource_type][name] = [item] + others
+            return item
+
+    def add(self, resource_type, item):
+        """
+        Records a resource created during this run. Ignored when the type has not been loaded yet as the eventual
+        bulk listing will include it.
+        :param resource_type: one of the resource type constants
+        :param item: the resource
+        """
+        with self.__lock:
+            if resource_type in self.__loading:
+                self.__loading[resource_type].append((self.add, item))
+            elif resource_type in self.__items:
+                self.remove(resource_type, item)
+                self.__index(resource_type, item)
+
+    def remove(self, resource_type, item):
+        """
+        Forgets a resource deleted during this run
+        :param resource_type: one of the resource type constants
+        :param item: the resource
+        """
+        with self.__lock:
+            if resource_type in self.__loading:
+                self.__loading[resource_type].append((self.remove, item))
+                return
+            if resource_type not in self.__items:
+                return
+            item_id = get_attr(item, 'id')
+            existing = self.__by_id[resource_type].pop(item_id, None)
+            if existing is None:
+                return
+            self.__items[resource_type] = [known for known in self.__items[resource_type]
+                                           if get_attr(known, 'id') != item_id]
+            name = get_attr(existing, 'name')
+            if name is not None:
+                remaining = [known for known in self.__by_name[resource_type].get(name, list())
+                             if get_attr(known, 'id') != item_id]
+                if remaining:
+                    self.__by_name[resource_type][name] = remaining
+                else:
+                    self.__by_name[resource_type].pop(name, None)
@@ -0,0 +1,146 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import unittest
+
+from openstack import api_metrics
+
+__author__ = 'spisarski'
+
+
+class StubManager:
+    def create(self, name):
+        return {'server': {'name': name}}
+
+    def delete(self, server_id):
+        raise Exception('Not found')
+
+
+class StubClient:
+    def __init__(self):
+        self.servers = StubManager()
+        self.format = 'xml'
+
+    def list_networks(self):
+        return {'networks': [{'name': 'foo'}]}
+
+    def list_images(self):
+        for name in ['foo', 'bar']:
+            yield {'name': name}
+
+
+class ApiMetricsTests(unittest.TestCase):
+    """
+    Tests the instrumentation defined in api_metrics.py
+    """
+
+    def setUp(self):
+        api_metrics.get_metrics().reset()
+        self.metrics_file = '/tmp/api_metrics_tests.json'
+
+    def tearDown(self):
+        if os.path.exists(self.metrics_file):
+            os.remove(self.metrics_file)
+
+    def test_instrumented_client(self):
+        """
+        Tests that calls on a client and on its managers are recorded with their payload sizes
+        """
+        client = api_metrics.InstrumentedClient(StubClient(), 'compute')
+        client.list_networks()
+        client.servers.create('vm1')
+        client.servers.create('vm2')
+        stats = api_metrics.get_metrics().as_dict()
+        self.assertEquals(1, stats['compute.list_networks']['count'])
+        self.assertEquals(2, stats['compute.servers.create']['count'])
+        self.assertEquals(len(json.dumps({'server': {'name': 'vm1'}})) * 2,
+                          stats['compute.servers.create']['payload_bytes'])
+
+    def test_errors_recorded(self):
+        """
+        Tests that a call raising an exception is counted as an error and the exception is re-raised
+        """
+        client = api_metrics.InstrumentedClient(StubClient(), 'compute')
+        with self.assertRaises(Exception):
+            client.servers.delete('foo')
+        stats = api_metrics.get_metrics().as_dict()['compute.servers.delete']
+        self.assertEquals(1, stats['count'])
+        self.assertEquals(1, stats['errors'])
+
+    def test_attribute_passthrough(self):
+        """
+        Tests that attributes set on the proxy are set on the underlying client
+        """
+        stub = StubClient()
+        client = api_metrics.InstrumentedClient(stub, 'network')
+        client.format = 'json'
+        self.assertEquals('json', stub.format)
+        self.assertEquals('json', client.format)
+
+    def test_timed_decorator(self):
+        """
+        Tests that the timed decorator records helper calls in the histogram's first bucket when fast
+        """
+        @api_metrics.timed('test.echo')
+        def echo(value):
+            return value
+
+        self.assertEquals('abc', echo('abc'))
+        stats = api_metrics.get_metrics().helpers_as_dict()['test.echo']
+        self.assertEquals(1, stats['histogram'][str(api_metrics.LATENCY_BUCKETS[0])])
+
+    def test_helpers_not_in_api_totals(self):
+        """
+        Tests that nested helpers only record their time apart from the single API call they make
+        """
+        client = api_metrics.InstrumentedClient(StubClient(), 'network')
+
+        @api_metrics.timed('test.get_networks')
+        def get_networks():
+            return client.list_networks()
+
+        @api_metrics.timed('test.get_network')
+        def get_network():
+            return get_networks()['networks'][0]
+
+        get_network()
+        metrics = api_metrics.get_metrics()
+        self.assertEquals(['network.list_networks'], metrics.as_dict().keys())
+        self.assertEquals(set(['test.get_networks', 'test.get_network']), set(metrics.helpers_as_dict().keys()))
+        total = [line for line in metrics.summary_table().split('\n') if line.startswith('total ')]
+        self.assertEquals(1, int(total[0].split()[1]))
+
+    def test_lazy_result(self):
+        """
+        Tests that a generator returned by a client is recorded once iterated over with the size of its items
+        """
+        client = api_metrics.InstrumentedClient(StubClient(), 'image')
+        images = client.list_images()
+        self.assertNotIn('image.list_images', api_metrics.get_metrics().as_dict())
+        self.assertEquals(['foo', 'bar'], [image['name'] for image in images])
+        stats = api_metrics.get_metrics().as_dict()['image.list_images']
+        self.assertEquals(1, stats['count'])
+        self.assertEquals(len(json.dumps({'name': 'foo'})) * 2, stats['payload_bytes'])
+
+    def test_summary_and_dump(self):
+        """
+        Tests that the summary table lists each operation and the dump is valid JSON
+        """
+        api_metrics.get_metrics().record('network.create_port', 0.2, 100)
+        self.assertIn('network.create_port', api_metrics.get_metrics().summary_table())
+        api_metrics.get_metrics().dump(self.metrics_file)
+        with open(self.metrics_file) as metrics_file:
+            self.assertEquals(1, json.load(metrics_file)['api']['network.create_port']['count'])
@@ -0,0 +1,63 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+import unittest
+
+from openstack import async_utils
+
+__author__ = 'spisarski'
+
+
+def slow_echo(value, delay=0.2):
+    time.sleep(delay)
+    return value
+
+
+def fail():
+    raise Exception('expected failure')
+
+
+class AsyncUtilsTests(unittest.TestCase):
+    """
+    Tests the worker pool functions defined in async_utils.py
+    """
+
+    def tearDown(self):
+        async_utils.set_pool_size(async_utils.DEFAULT_POOL_SIZE)
+
+    def test_calls_overlap(self):
+        """
+        Tests that submitted calls run concurrently and results are returned in submission order
+        """
+        start = time.time()
+        results = async_utils.wait_all([async_utils.submit(slow_echo, i) for i in range(10)])
+        self.assertEquals(range(10), results)
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_pool_size_bounds_concurrency(self):
+        """
+        Tests that no more than the configured number of calls are in flight at once
+        """
+        async_utils.set_pool_size(2)
+        start = time.time()
+        async_utils.wait_all([async_utils.submit(slow_echo, i) for i in range(4)])
+        self.assertGreaterEqual(time.time() - start, 0.4)
+
+    def test_exception_propagated(self):
+        """
+        Tests that an exception raised by a call is raised by wait_all
+        """
+        with self.assertRaises(Exception):
+            async_utils.wait_all([async_utils.submit(slow_echo, 1), async_utils.submit(fail)])
@@ -0,0 +1,96 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import unittest
+
+from openstack import client_registry
+from openstack import os_credentials
+
+__author__ = 'spisarski'
+
+
+class ClientRegistryTests(unittest.TestCase):
+    """
+    Tests the ClientRegistry class defined in client_registry.py using stub client factories
+    """
+
+    def setUp(self):
+        self.built = list()
+        self.registry = client_registry.ClientRegistry({client_registry.NETWORK: self.__stub_factory,
+                                                        client_registry.COMPUTE: self.__stub_factory})
+        self.creds = os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'tenant')
+
+    def __stub_factory(self, os_creds):
+        client = object()
+        self.built.append(client)
+        return client
+
+    def test_client_reused(self):
+        """
+        Tests that equal credentials and service type always return the same client
+        """
+        creds_copy = os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'tenant')
+        client1 = self.registry.get_client(self.creds, client_registry.NETWORK)
+        client2 = self.registry.get_client(creds_copy, client_registry.NETWORK)
+        self.assertIs(client1, client2)
+        self.assertEquals(1, len(self.built))
+
+    def test_client_per_service_type(self):
+        """
+        Tests that each service type receives its own client
+        """
+        network = self.registry.get_client(self.creds, client_registry.NETWORK)
+        compute = self.registry.get_client(self.creds, client_registry.COMPUTE)
+        self.assertIsNot(network, compute)
+        self.assertEquals(2, len(self.built))
+
+    def test_client_per_creds(self):
+        """
+        Tests that different credentials do not share a client
+        """
+        other_creds = os_credentials.OSCreds('user2', 'pass', 'http://foo:5000/v2.0/', 'tenant')
+        self.assertIsNot(self.registry.get_client(self.creds, client_registry.NETWORK),
+                         self.registry.get_client(other_creds, client_registry.NETWORK))
+
+    def test_unknown_service_type(self):
+        """
+        Tests that an Exception is raised for a service type without a factory
+        """
+        with self.assertRaises(Exception):
+            self.registry.get_client(self.creds, client_registry.IMAGE)
+
+    def test_concurrent_requests(self):
+        """
+        Tests that concurrent requests for the same client only build it once
+        """
+        threads = [threading.Thread(target=self.registry.get_client, args=(self.creds, client_registry.NETWORK))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(1, len(self.built))
+
+    def test_set_registry(self):
+        """
+        Tests that the module entry point delegates to the injected registry
+        """
+        original = client_registry.get_registry()
+        try:
+            client_registry.set_registry(self.registry)
+            self.assertIs(self.registry.get_client(self.creds, client_registry.COMPUTE),
+                          client_registry.get_client(self.creds, client_registry.COMPUTE))
+        finally:
+            client_registry.set_registry(original)
@@ -0,0 +1,140 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from openstack import client_registry
+from openstack import create_image
+from openstack import os_credentials
+from openstack.tests.create_image_stream_tests import StubGlance, StubInventory
+from tests.file_utils_tests import LocalHttpServer
+
+__author__ = 'spisarski'
+
+
+class CreateImageDedupTests(unittest.TestCase):
+    """
+    Tests that the OpenStackImage class defined in create_image.py reuses an existing image with the same content
+    rather than uploading it again
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.serve_dir = os.path.join(self.tmp_dir, 'served')
+        os.makedirs(self.serve_dir)
+        self.content = os.urandom(1024 * 20)
+        self.md5 = hashlib.md5(self.content).hexdigest()
+        self.server = LocalHttpServer(self.serve_dir)
+        self.download_path = os.path.join(self.tmp_dir, 'env')
+
+        self.glance = StubGlance()
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry({client_registry.IMAGE: lambda os_creds:
+                                                                     self.glance}))
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def __existing(self, **attrs):
+        image = {'id': 'existing-id', 'name': 'other name', 'status': 'active', 'disk_format': 'qcow2',
+                 'visibility': 'private', 'checksum': self.md5}
+        image.update(attrs)
+        return image
+
+    def __serve(self):
+        with open(os.path.join(self.serve_dir, 'cirros.img'), 'wb') as image_file:
+            image_file.write(self.content)
+
+    def __create(self, inventory, checksum=None, visibility=None):
+        return create_image.OpenStackImage(os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'tenant'),
+                                           'cirros', 'qcow2', self.server.url('cirros.img'), 'cirros',
+                                           self.download_path, inventory=inventory, checksum=checksum,
+                                           visibility=visibility).create()
+
+    def test_configured_checksum(self):
+        """
+        Tests that an image matching the configured checksum is reused without downloading anything
+        """
+        image = self.__create(StubInventory([self.__existing()]), 'md5:' + self.md5)
+        self.assertEquals('existing-id', image['id'])
+        self.assertEquals(list(), self.glance.images.created)
+        self.assertFalse(os.path.exists(self.download_path))
+
+    def test_clean_keeps_reused(self):
+        """
+        Tests that cleaning does not delete an image reused by checksum but does delete one it created
+        """
+        creator = create_image.OpenStackImage(os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'tenant'),
+                                              'cirros', 'qcow2', self.server.url('cirros.img'), 'cirros',
+                                              self.download_path, inventory=StubInventory([self.__existing()]),
+                                              checksum='md5:' + self.md5)
+        creator.create()
+        creator.clean()
+        self.assertEquals(list(), self.glance.images.deleted)
+
+        self.__serve()
+        creator = create_image.OpenStackImage(os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'tenant'),
+                                              'cirros', 'qcow2', self.server.url('cirros.img'), 'cirros',
+                                              self.download_path, inventory=StubInventory())
+        image = creator.create()
+        creator.clean()
+        self.assertEquals([image.id], self.glance.images.deleted)
+
+    def test_local_file(self):
+        """
+        Tests that an image matching the file already in the download path is reused
+        """
+        os.makedirs(self.download_path)
+        with open(os.path.join(self.download_path, 'cirros.img'), 'wb') as image_file:
+            image_file.write(self.content)
+        image = self.__create(StubInventory([self.__existing()]))
+        self.assertEquals('existing-id', image['id'])
+        self.assertEquals(list(), self.glance.images.created)
+
+    def test_downloaded_file(self):
+        """
+        Tests that an image matching the downloaded file, identified by its os_hash_value, is reused without
+        uploading the file
+        """
+        self.__serve()
+        existing = self.__existing(checksum=None, os_hash_algo='sha256',
+                                   os_hash_value=hashlib.sha256(self.content).hexdigest())
+        image = self.__create(StubInventory([existing]))
+        self.assertEquals('existing-id', image['id'])
+        self.assertEquals(list(), self.glance.images.created)
+
+    def test_no_match(self):
+        """
+        Tests that images with the same content but another status, format or visibility are not reused
+        """
+        self.__serve()
+        inventory = StubInventory([self.__existing(status='queued'), self.__existing(disk_format='raw'),
+                                   self.__existing(visibility='public')])
+        image = self.__create(inventory, 'md5:' + self.md5)
+        self.assertNotEquals('existing-id', image['id'])
+        self.assertEquals(self.content, self.glance.images.uploaded[image.id])
+
+    def test_configured_visibility(self):
+        """
+        Tests that only an image with the configured visibility is reused
+        """
+        image = self.__create(StubInventory([self.__existing(), self.__existing(id='public-id', visibility='public')]),
+                              self.md5, 'public')
+        self.assertEquals('public-id', image['id'])
@@ -0,0 +1,149 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from openstack import client_registry
+from openstack import create_image
+from openstack import image_cache
+from openstack import os_credentials
+from tests.file_utils_tests import LocalHttpServer
+
+__author__ = 'spisarski'
+
+
+class StubImage(dict):
+    def __init__(self, image_id, name):
+        super(StubImage, self).__init__(id=image_id, name=name)
+        self.id = image_id
+        self.name = name
+
+
+class StubImages:
+    """
+    Stand-in for the Glance client's images manager recording the data uploaded
+    """
+
+    def __init__(self):
+        self.created = list()
+        self.uploaded = dict()
+        self.deleted = list()
+
+    def create(self, name, disk_format, container_format, visibility=None):
+        image = StubImage('image-' + str(len(self.created)), name)
+        self.created.append(image)
+        return image
+
+    def upload(self, image_id, image_data, image_size=None):
+        data = ''
+        while True:
+            chunk = image_data.read(65536)
+            if not chunk:
+                break
+            data += chunk
+        self.uploaded[image_id] = data
+
+    def delete(self, image_id):
+        self.deleted.append(image_id)
+
+
+class StubGlance:
+    def __init__(self):
+        self.images = StubImages()
+
+
+class StubInventory:
+    def __init__(self, images=None):
+        self.images = images or list()
+
+    def find_by_name(self, resource_type, name):
+        for image in self.images:
+            if image.get('name') == name:
+                return image
+        return None
+
+    def get_all(self, resource_type):
+        return list(self.images)
+
+    def add(self, resource_type, item):
+        self.images.append(item)
+
+    def remove(self, resource_type, item):
+        self.images.remove(item)
+
+
+class CreateImageStreamTests(unittest.TestCase):
+    """
+    Tests the streaming mode of the OpenStackImage class defined in create_image.py against a local HTTP server and a
+    stub Glance client
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        serve_dir = os.path.join(self.tmp_dir, 'served')
+        os.makedirs(serve_dir)
+        self.content = os.urandom(1024 * 50)
+        self.served_file = os.path.join(serve_dir, 'cirros.img')
+        with open(self.served_file, 'wb') as image_file:
+            image_file.write(self.content)
+        self.server = LocalHttpServer(serve_dir)
+        self.download_path = os.path.join(self.tmp_dir, 'env')
+        self.cache = image_cache.ImageCache(os.path.join(self.tmp_dir, 'cache'))
+
+        self.glance = StubGlance()
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry({client_registry.IMAGE: lambda os_creds:
+                                                                     self.glance}))
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def __image_creator(self, checksum=None, cache=None):
+        return create_image.OpenStackImage(os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'tenant'),
+                                           'cirros', 'qcow2', self.server.url('cirros.img'), 'cirros',
+                                           self.download_path, inventory=StubInventory(), checksum=checksum,
+                                           cache=cache, stream=True)
+
+    def test_streamed_into_cache(self):
+        """
+        Tests that the image data is uploaded without being staged in the download path and is added to the cache
+        """
+        image = self.__image_creator('sha256:' + hashlib.sha256(self.content).hexdigest(), self.cache).create()
+        self.assertEquals(self.content, self.glance.images.uploaded[image.id])
+        self.assertFalse(os.path.exists(self.download_path))
+        self.assertIsNotNone(self.cache.find(self.server.url('cirros.img')))
+
+    def test_cached_file_uploaded(self):
+        """
+        Tests that an image already in the cache is uploaded from it rather than downloaded again
+        """
+        self.cache.fetch(self.server.url('cirros.img'), self.tmp_dir)
+        os.remove(self.served_file)
+        image = self.__image_creator(cache=self.cache).create()
+        self.assertEquals(self.content, self.glance.images.uploaded[image.id])
+
+    def test_checksum_mismatch(self):
+        """
+        Tests that an image whose data does not match its checksum is deleted and not cached
+        """
+        with self.assertRaises(Exception):
+            self.__image_creator('md5:' + '0' * 32, self.cache).create()
+        self.assertEquals([image.id for image in self.glance.images.created], self.glance.images.deleted)
+        self.assertEquals(0, self.cache.size())
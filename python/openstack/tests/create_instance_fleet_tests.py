@@ -0,0 +1,149 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+import unittest
+
+from openstack import client_registry
+from openstack import create_instance
+from openstack import os_credentials
+from openstack import tenant_inventory
+from openstack import wait_policy
+from openstack.tests.fleet_waiter_tests import StubNova, StubServer
+
+__author__ = 'spisarski'
+
+
+class StubVmInstance:
+    """
+    Stand-in for OpenStackVmInstance that becomes reachable via SSH after a delay
+    """
+
+    def __init__(self, name, ready_after=None):
+        self.name = name
+        self.ready_after = ready_after
+        self.cancelled = False
+
+    def vm_ssh_active(self, block=False, timeout=None, poll_interval=None, cancel=None):
+        start = time.time()
+        while time.time() - start < (timeout or 5):
+            if self.ready_after is not None and time.time() - start >= self.ready_after:
+                return True
+            if cancel and cancel.is_set():
+                self.cancelled = True
+                return False
+            time.sleep(0.01)
+        return False
+
+
+class StubFlavor:
+    def __init__(self, name):
+        self.name = name
+
+
+class StubFlavorInventory:
+    def find_by_name(self, resource_type, name):
+        if resource_type == tenant_inventory.FLAVORS:
+            return StubFlavor(name)
+        return None
+
+
+class VmSshActiveCancelTests(unittest.TestCase):
+    """
+    Tests that OpenStackVmInstance.vm_ssh_active() stops as soon as it is cancelled against a stub Nova client
+    """
+
+    def setUp(self):
+        self.nova = StubNova()
+        self.nova.servers.statuses['vm1-id'] = 'BUILD'
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry({client_registry.COMPUTE: lambda os_creds:
+                                                                     self.nova}))
+        # The tenant name keeps the fleet waiter shared per credentials from polling another test's stub
+        os_creds = os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'cancel-tenant')
+        self.vm_inst = create_instance.OpenStackVmInstance(os_creds, 'vm1', 'm1.small', None, list(), 'centos',
+                                                           inventory=StubFlavorInventory(),
+                                                           policy=wait_policy.fixed_interval(0.05))
+        self.vm_inst.vm = StubServer('vm1-id', 'BUILD')
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+
+    def test_cancel_while_building(self):
+        """
+        Tests that the blocking wait for the VM to become active ends once cancelled
+        """
+        cancel = threading.Event()
+        threading.Timer(0.1, cancel.set).start()
+        start = time.time()
+        self.assertFalse(self.vm_inst.vm_ssh_active(block=True, timeout=10, cancel=cancel))
+        self.assertLess(time.time() - start, 2)
+
+    def test_already_cancelled(self):
+        """
+        Tests that nothing is waited upon when already cancelled
+        """
+        cancel = threading.Event()
+        cancel.set()
+        start = time.time()
+        self.assertFalse(self.vm_inst.vm_ssh_active(block=True, timeout=10, cancel=cancel))
+        self.assertLess(time.time() - start, 0.5)
+
+
+class FleetSshActiveTests(unittest.TestCase):
+    """
+    Tests the fleet_ssh_active() function defined in create_instance.py against stub VM instances
+    """
+
+    def test_all_ready_concurrently(self):
+        """
+        Tests that every VM is probed at the same time
+        """
+        vm_insts = [StubVmInstance('vm' + str(index), 0.3) for index in range(10)]
+        start = time.time()
+        ready, stragglers = create_instance.fleet_ssh_active(vm_insts)
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEquals(10, len(ready))
+        self.assertEquals(list(), stragglers)
+
+    def test_returns_when_required_ready(self):
+        """
+        Tests that the stage returns once the required VMs are reachable and reports and stops the others
+        """
+        slow = StubVmInstance('slow')
+        ready, stragglers = create_instance.fleet_ssh_active([StubVmInstance('fast', 0.05), slow], required=['fast'],
+                                                             timeout=5)
+        self.assertEquals(set(['fast']), ready)
+        self.assertEquals(['slow'], stragglers)
+        for _ in range(100):
+            if slow.cancelled:
+                break
+            time.sleep(0.01)
+        self.assertTrue(slow.cancelled)
+
+    def test_required_timeout(self):
+        """
+        Tests that a required VM timing out ends the stage
+        """
+        ready, stragglers = create_instance.fleet_ssh_active([StubVmInstance('vm1', 0.05), StubVmInstance('vm2')],
+                                                             timeout=0.2)
+        self.assertEquals(set(['vm1']), ready)
+        self.assertEquals(['vm2'], stragglers)
+
+    def test_empty(self):
+        """
+        Tests that no VMs means nothing to wait for
+        """
+        self.assertEquals((set(), list()), create_instance.fleet_ssh_active(list()))
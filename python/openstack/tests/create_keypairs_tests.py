@@ -15,8 +15,6 @@
 import logging
 import os
 
-from Crypto.PublicKey import RSA
-
 import openstack.create_keypairs as create_keypairs
 import openstack.nova_utils as nova_utils
 from openstack.tests.os_source_file_test import OSSourceFileTestsCase
@@ -112,6 +110,7 @@ class CreateKeypairsTests(OSSourceFileTestsCase):
         Tests the creation of an existing public keypair from a file
         :return:
         """
+        from Crypto.PublicKey import RSA
         keys = RSA.generate(1024)
         nova_utils.save_keys_to_files(keys=keys, pub_file_path=pub_file_path)
         self.keypair_creator = create_keypairs.OpenStackKeypair(self.os_creds,
@@ -0,0 +1,167 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import re
+import threading
+import time
+import unittest
+
+from openstack import fleet_waiter
+from openstack import wait_policy
+
+__author__ = 'spisarski'
+
+
+class StubServer:
+    def __init__(self, server_id, status, name=None):
+        self.id = server_id
+        self.status = status
+        self.name = name
+
+
+class StubServerManager:
+    """
+    Stand-in for the Nova servers manager that counts its list calls and honours the name filter
+    """
+
+    def __init__(self):
+        self.statuses = dict()
+        self.names = dict()
+        self.list_calls = 0
+        self.search_opts = list()
+        self.lock = threading.Lock()
+
+    def list(self, detailed=True, search_opts=None):
+        with self.lock:
+            self.list_calls += 1
+            self.search_opts.append(search_opts)
+            servers = [StubServer(server_id, status, self.names.get(server_id))
+                       for server_id, status in self.statuses.iteritems()]
+            if search_opts and 'name' in search_opts:
+                servers = [server for server in servers if re.search(search_opts['name'], server.name or '')]
+            return servers
+
+
+class StubNova:
+    def __init__(self):
+        self.servers = StubServerManager()
+
+
+class FleetWaiterTests(unittest.TestCase):
+    """
+    Tests the FleetWaiter class defined in fleet_waiter.py against a stub Nova client
+    """
+
+    def setUp(self):
+        self.nova = StubNova()
+        self.waiter = fleet_waiter.FleetWaiter(self.nova, wait_policy.fixed_interval(0.05))
+
+    def test_active(self):
+        """
+        Tests that a waiter is released once its server becomes ACTIVE
+        """
+        self.nova.servers.statuses['1'] = 'BUILD'
+        timer = threading.Timer(0.2, self.nova.servers.statuses.__setitem__, ('1', 'ACTIVE'))
+        timer.start()
+        self.assertTrue(self.waiter.wait(StubServer('1', 'BUILD'), 'ACTIVE', 5))
+        self.assertEquals(0, self.waiter.pending_count())
+
+    def test_single_listing_per_tick(self):
+        """
+        Tests that many concurrent waiters share the same server listings
+        """
+        results = dict()
+        for index in range(20):
+            self.nova.servers.statuses[str(index)] = 'BUILD'
+
+        def wait(server_id):
+            results[server_id] = self.waiter.wait(StubServer(server_id, 'BUILD'), 'ACTIVE', 5)
+
+        threads = [threading.Thread(target=wait, args=(str(index),)) for index in range(20)]
+        for thread in threads:
+            thread.start()
+        threading.Timer(0.3, lambda: self.nova.servers.statuses.update(
+            dict((str(index), 'ACTIVE') for index in range(20)))).start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(20, len(results))
+        self.assertTrue(all(results.values()))
+        self.assertLess(self.nova.servers.list_calls, 20)
+
+    def test_listing_filtered_by_name(self):
+        """
+        Tests that each listing only matches the names of the servers being waited upon
+        """
+        self.nova.servers.statuses.update({'1': 'BUILD', '2': 'ERROR'})
+        self.nova.servers.names.update({'1': 'vm.1', '2': 'vm-1'})
+        timer = threading.Timer(0.2, self.nova.servers.statuses.__setitem__, ('1', 'ACTIVE'))
+        timer.start()
+        self.assertTrue(self.waiter.wait(StubServer('1', 'BUILD', 'vm.1'), 'ACTIVE', 5))
+        self.assertEquals({'name': '^(vm\\.1)$'}, self.nova.servers.search_opts[0])
+
+    def test_name_filter_configured(self):
+        """
+        Tests that a configured name filter replaces the one built from the servers being waited upon
+        """
+        waiter = fleet_waiter.FleetWaiter(self.nova, wait_policy.fixed_interval(0.05),
+                                          {'name': '^vm', 'status': 'ACTIVE'})
+        self.nova.servers.statuses['1'] = 'ACTIVE'
+        self.nova.servers.names['1'] = 'vm1'
+        self.assertTrue(waiter.wait(StubServer('1', 'BUILD', 'vm1'), 'ACTIVE', 5))
+        self.assertEquals({'name': '^vm', 'status': 'ACTIVE'}, self.nova.servers.search_opts[0])
+
+    def test_error(self):
+        """
+        Tests that a server in the ERROR state raises an Exception immediately
+        """
+        self.nova.servers.statuses['1'] = 'ERROR'
+        with self.assertRaises(Exception):
+            self.waiter.wait(StubServer('1', 'BUILD'), 'ACTIVE', 5)
+
+    def test_error_deleted(self):
+        """
+        Tests that a wait for DELETED on a server in the ERROR state lasts until the server disappears
+        """
+        self.nova.servers.statuses['1'] = 'ERROR'
+        timer = threading.Timer(0.2, self.nova.servers.statuses.pop, ('1',))
+        timer.start()
+        self.assertTrue(self.waiter.wait(StubServer('1', 'ERROR'), fleet_waiter.STATUS_DELETED, 5))
+        self.assertEquals(0, self.waiter.pending_count())
+
+    def test_missing_is_deleted(self):
+        """
+        Tests that a server missing from the listing satisfies a wait for DELETED
+        """
+        self.assertTrue(self.waiter.wait(StubServer('1', 'ACTIVE'), fleet_waiter.STATUS_DELETED, 5))
+
+    def test_cancel(self):
+        """
+        Tests that setting the cancel event ends a wait early
+        """
+        self.nova.servers.statuses['1'] = 'BUILD'
+        cancel = threading.Event()
+        threading.Timer(0.1, cancel.set).start()
+        start = time.time()
+        self.assertFalse(self.waiter.wait(StubServer('1', 'BUILD'), 'ACTIVE', 10, cancel))
+        self.assertLess(time.time() - start, 2)
+        self.assertEquals(0, self.waiter.pending_count())
+
+    def test_timeout(self):
+        """
+        Tests that False is returned when the status is not reached in time
+        """
+        self.nova.servers.statuses['1'] = 'BUILD'
+        self.assertFalse(self.waiter.wait(StubServer('1', 'BUILD'), 'ACTIVE', 0.2))
+        self.assertEquals(0, self.waiter.pending_count())
@@ -0,0 +1,65 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import unittest
+
+import requests
+
+from openstack import http_transport
+
+__author__ = 'spisarski'
+
+
+class HttpTransportTests(unittest.TestCase):
+    """
+    Tests the shared HTTP session defined in http_transport.py
+    """
+
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.url = 'http://127.0.0.1:' + str(self.listener.getsockname()[1]) + '/'
+
+    def tearDown(self):
+        self.listener.close()
+        http_transport.configure(None)
+
+    def test_settings_from_config(self):
+        """
+        Tests that the pool settings are read from a configuration dictionary and applied to the session
+        """
+        http_transport.configure(http_transport.TransportSettings({'pool_maxsize': 50, 'read_timeout': 30}))
+        adapter = http_transport.http_session().get_adapter('https://foo:5000')
+        self.assertEquals(50, adapter._pool_maxsize)
+        self.assertEquals(30, adapter.read_timeout)
+        self.assertEquals(10, adapter.connect_timeout)
+
+    def test_shared_session(self):
+        """
+        Tests that the same session is returned until the transport is reconfigured
+        """
+        session = http_transport.http_session()
+        self.assertIs(session, http_transport.http_session())
+        http_transport.configure(http_transport.TransportSettings())
+        self.assertIsNot(session, http_transport.http_session())
+
+    def test_default_read_timeout(self):
+        """
+        Tests that requests without an explicit timeout are bounded by the configured read timeout
+        """
+        http_transport.configure(http_transport.TransportSettings(read_timeout=0.5))
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            http_transport.http_session().get(self.url)
@@ -0,0 +1,174 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from openstack import create_image
+from openstack import image_cache
+from tests.file_utils_tests import LocalHttpServer
+
+__author__ = 'spisarski'
+
+
+class ImageCacheTests(unittest.TestCase):
+    """
+    Tests the ImageCache class defined in image_cache.py against a local HTTP server
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.serve_dir = os.path.join(self.tmp_dir, 'served')
+        os.makedirs(self.serve_dir)
+        self.contents = dict()
+        for name in ['a.img', 'b.img']:
+            self.contents[name] = os.urandom(1024 * 10)
+            with open(os.path.join(self.serve_dir, name), 'wb') as image_file:
+                image_file.write(self.contents[name])
+        self.env_dirs = [os.path.join(self.tmp_dir, 'env' + str(index)) for index in range(2)]
+        for env_dir in self.env_dirs:
+            os.makedirs(env_dir)
+        self.server = LocalHttpServer(self.serve_dir)
+
+    def tearDown(self):
+        if self.server:
+            self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def __cache(self, max_size=None):
+        return image_cache.ImageCache(os.path.join(self.tmp_dir, 'cache'), max_size)
+
+    def __stop_server(self):
+        self.server.stop()
+        self.server = None
+
+    def test_downloaded_once(self):
+        """
+        Tests that a second environment is given a hard link to the file downloaded for the first
+        """
+        url = self.server.url('a.img')
+        first = self.__cache().fetch(url, self.env_dirs[0])
+        self.__stop_server()
+        second = self.__cache().fetch(url, self.env_dirs[1])
+
+        self.assertEquals(os.path.join(self.env_dirs[1], 'a.img'), second)
+        self.assertEquals(os.stat(first).st_ino, os.stat(second).st_ino)
+        with open(second, 'rb') as image_file:
+            self.assertEquals(self.contents['a.img'], image_file.read())
+
+    def test_removing_link_keeps_cache(self):
+        """
+        Tests that removing an environment's file does not remove the cached one
+        """
+        url = self.server.url('a.img')
+        os.remove(self.__cache().fetch(url, self.env_dirs[0]))
+        self.__stop_server()
+        self.assertTrue(os.path.isfile(self.__cache().fetch(url, self.env_dirs[0])))
+
+    def test_checksum_mismatch(self):
+        """
+        Tests that a download not matching its checksum is neither cached nor placed in the environment
+        """
+        cache = self.__cache()
+        with self.assertRaises(Exception):
+            cache.fetch(self.server.url('a.img'), self.env_dirs[0], 'sha256:' + '0' * 64)
+        self.assertEquals(0, cache.size())
+        self.assertEquals(list(), os.listdir(self.env_dirs[0]))
+
+    def test_reused_by_checksum(self):
+        """
+        Tests that a file with the expected checksum is reused whatever the URL it was downloaded from
+        """
+        cache = self.__cache()
+        sha256 = hashlib.sha256(self.contents['a.img']).hexdigest()
+        cache.fetch(self.server.url('a.img'), self.env_dirs[0], sha256)
+        md5 = hashlib.md5(self.contents['a.img']).hexdigest()
+        path = cache.fetch(self.server.url('mirror/a.img'), self.env_dirs[1], 'md5:' + md5)
+        with open(path, 'rb') as image_file:
+            self.assertEquals(self.contents['a.img'], image_file.read())
+
+    def test_lru_eviction(self):
+        """
+        Tests that the least recently used file is evicted once the cache exceeds its size limit
+        """
+        cache = self.__cache(max_size=len(self.contents['a.img']) * 3 / 2)
+        urls = [self.server.url('a.img'), self.server.url('b.img')]
+        for url in urls:
+            cache.fetch(url, self.env_dirs[0])
+        self.assertEquals(len(self.contents['b.img']), cache.size())
+
+        self.__stop_server()
+        cache.fetch(urls[1], self.env_dirs[1])
+        with self.assertRaises(Exception):
+            cache.fetch(urls[0], self.env_dirs[1])
+
+    def test_staging_during_fetch(self):
+        """
+        Tests that each staging file is unique and that a concurrent fetch of the same URL leaves it in place
+        """
+        cache = self.__cache()
+        url = self.server.url('a.img')
+        staged = [cache.staging_path(url) for _ in range(2)]
+        self.assertNotEquals(staged[0], staged[1])
+        with open(staged[0], 'wb') as staged_file:
+            staged_file.write(self.contents['a.img'])
+
+        cache.fetch(url, self.env_dirs[0])
+        self.assertTrue(os.path.isfile(staged[0]))
+        cache.store(url, staged[0], image_cache.file_digests(staged[0]))
+        self.assertFalse(os.path.exists(staged[0]))
+        self.assertEquals(len(self.contents['a.img']), cache.size())
+
+    def test_parse_checksum(self):
+        """
+        Tests the supported forms of expected checksums
+        """
+        self.assertIsNone(image_cache.parse_checksum(None))
+        self.assertEquals(('sha256', 'ab' * 32), image_cache.parse_checksum('AB' * 32))
+        self.assertEquals(('md5', 'ab' * 16), image_cache.parse_checksum('ab' * 16))
+        self.assertEquals(('md5', 'ab' * 16), image_cache.parse_checksum('MD5:' + 'ab' * 16))
+        with self.assertRaises(Exception):
+            image_cache.parse_checksum('crc32:1234')
+
+
+class OpenStackImageFileTests(unittest.TestCase):
+    """
+    Tests the handling of the local image file by the OpenStackImage class defined in create_image.py
+    """
+
+    def setUp(self):
+        self.download_path = tempfile.mkdtemp()
+        self.image_creator = create_image.OpenStackImage(image_url='http://foo/cirros.img', image_name='cirros',
+                                                         download_path=self.download_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.download_path, ignore_errors=True)
+
+    def test_clean_keeps_other_files(self):
+        """
+        Tests that cleaning only removes the image's own file from a download directory shared with other images
+        """
+        other_file = os.path.join(self.download_path, 'other.img')
+        for path in [self.image_creator.image_file_path, other_file]:
+            open(path, 'wb').close()
+        self.image_creator.image_file = self.image_creator.image_file_path
+        self.image_creator.clean()
+        self.assertEquals(['other.img'], os.listdir(self.download_path))
+
+        os.remove(other_file)
+        self.image_creator.clean()
+        self.assertFalse(os.path.exists(self.download_path))
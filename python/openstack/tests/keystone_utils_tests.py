@@ -0,0 +1,60 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+
+import openstack.keystone_utils as keystone_utils
+from openstack import os_credentials
+from openstack.tests.os_source_file_test import OSSourceFileTestsCase
+
+__author__ = 'spisarski'
+
+# Initialize Logging
+logging.basicConfig(level=logging.DEBUG)
+
+
+class KeystoneUtilsTests(OSSourceFileTestsCase):
+    """
+    Test for the shared session functions defined in keystone_utils.py
+    """
+
+    def tearDown(self):
+        """
+        Discards the sessions created by each test
+        """
+        keystone_utils.clear_sessions()
+
+    def test_same_session_for_equal_creds(self):
+        """
+        Tests that credentials with the same values share a single session
+        """
+        creds_copy = os_credentials.OSCreds(self.os_creds.username, self.os_creds.password, self.os_creds.auth_url,
+                                            self.os_creds.tenant_name, self.os_creds.proxy)
+        self.assertIs(keystone_utils.keystone_session(self.os_creds), keystone_utils.keystone_session(creds_copy))
+
+    def test_token_reused(self):
+        """
+        Tests that subsequent token requests do not re-authenticate
+        """
+        token1 = keystone_utils.get_token(self.os_creds)
+        token2 = keystone_utils.get_token(self.os_creds)
+        self.assertIsNotNone(token1)
+        self.assertEquals(token1, token2)
+
+    def test_get_image_endpoint(self):
+        """
+        Tests that the image endpoint is resolved from the session's service catalog
+        """
+        endpoint = keystone_utils.get_endpoint(self.os_creds, 'image')
+        self.assertIsNotNone(endpoint)
@@ -0,0 +1,109 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from openstack import create_network
+from openstack import neutron_utils
+
+__author__ = 'spisarski'
+
+
+class StubNeutron:
+    """
+    Stand-in for the Neutron client rejecting, like Neutron, any request containing an invalid resource as a whole
+    """
+
+    def __init__(self, invalid_names=None):
+        self.invalid_names = invalid_names or list()
+        self.requests = list()
+
+    def __create(self, collection, body):
+        self.requests.append(body)
+        items = body[collection]
+        for item in items:
+            if item.get('name') in self.invalid_names:
+                raise Exception('Invalid ' + collection + ' - ' + item['name'])
+        return {collection: [dict(item, id=item.get('name') + '-id') for item in items]}
+
+    def create_network(self, body):
+        return self.__create('networks', body)
+
+    def create_subnet(self, body):
+        return self.__create('subnets', body)
+
+    def create_port(self, body):
+        return self.__create('ports', body)
+
+
+NETWORK = {'network': {'id': 'net-id'}}
+
+
+class NeutronBulkTests(unittest.TestCase):
+    """
+    Tests the bulk creation functions of neutron_utils.py against a stub Neutron client
+    """
+
+    def test_single_request(self):
+        """
+        Tests that every resource is created with one request and returned in order, wrapped like the single create
+        functions' objects
+        """
+        neutron = StubNeutron()
+        networks = neutron_utils.create_networks(neutron, [create_network.NetworkSettings(name='net1'),
+                                                           create_network.NetworkSettings(name='net2')])
+        self.assertEquals(['net1-id', 'net2-id'], [network['network']['id'] for network in networks])
+
+        subnets = neutron_utils.create_subnets(neutron, [
+            (create_network.SubnetSettings(name='sub1', cidr='10.0.1.0/24'), NETWORK),
+            (create_network.SubnetSettings(name='sub2', cidr='10.0.2.0/24'), NETWORK)])
+        self.assertEquals(['sub1-id', 'sub2-id'], [subnet['subnets'][0]['id'] for subnet in subnets])
+
+        ports = neutron_utils.create_ports(neutron, [(create_network.PortSettings(name='port1'), NETWORK, None),
+                                                     (create_network.PortSettings(name='port2'), NETWORK, None)])
+        self.assertEquals(['port1-id', 'port2-id'], [port['port']['id'] for port in ports])
+        self.assertEquals(3, len(neutron.requests))
+
+    def test_nothing_requested(self):
+        """
+        Tests that no request is made when there is nothing to create
+        """
+        neutron = StubNeutron()
+        self.assertEquals(list(), neutron_utils.create_ports(neutron, list()))
+        self.assertEquals(0, len(neutron.requests))
+
+    def test_partial_failure(self):
+        """
+        Tests that the valid resources of a rejected bulk request are still created and the invalid ones are mapped
+        back to their settings
+        """
+        neutron = StubNeutron(['port2'])
+        port_settings = [create_network.PortSettings(name='port' + str(index)) for index in range(1, 4)]
+        with self.assertRaises(neutron_utils.BulkCreateError) as context:
+            neutron_utils.create_ports(neutron, [(settings, NETWORK, None) for settings in port_settings])
+
+        error = context.exception
+        self.assertEquals(['port1-id', None, 'port3-id'], [port and port['port']['id'] for port in error.created])
+        self.assertEquals([(1, port_settings[1])], [(index, settings) for index, settings, e in error.failures])
+        self.assertIn('port2', str(error))
+        self.assertEquals(4, len(neutron.requests))
+
+    def test_single_failure_raised(self):
+        """
+        Tests that the client's exception is raised as is when the only resource requested fails
+        """
+        with self.assertRaises(Exception) as context:
+            neutron_utils.create_subnets(StubNeutron(['sub1']),
+                                         [(create_network.SubnetSettings(name='sub1', cidr='10.0.1.0/24'), NETWORK)])
+        self.assertNotIsInstance(context.exception, neutron_utils.BulkCreateError)
@@ -47,6 +47,7 @@ class NeutronUtilsTests(OSSourceFileTestsCase):
         self.network = None
         self.subnet = None
         self.port = None
+        self.ports = list()
         self.router = None
         self.interface_router = None
         self.net_config = openstack_tests.get_pub_net_config()
@@ -65,6 +66,9 @@ class NeutronUtilsTests(OSSourceFileTestsCase):
         if self.port:
             neutron_utils.delete_port(self.neutron, self.port)
 
+        for port in self.ports:
+            neutron_utils.delete_port(self.neutron, port)
+
         if self.subnet:
             neutron_utils.delete_subnet(self.neutron, self.subnet)
             validate_subnet(self.neutron, self.subnet.get('name'), self.net_config.subnet_cidr, False)
@@ -98,6 +102,28 @@ class NeutronUtilsTests(OSSourceFileTestsCase):
         self.assertEqual(u'', this_net_name)
         self.assertTrue(validate_network(self.neutron, this_net_name, True))
 
+    def test_get_network_by_name_fields(self):
+        """
+        Tests the neutron_utils.get_network_by_name() function only returns the requested attributes
+        """
+        self.network = neutron_utils.create_network(self.neutron, self.net_config.network_settings)
+        network = neutron_utils.get_network_by_name(self.neutron, self.net_config.net_name, fields=['id'])
+        self.assertEqual({'id': self.network['network']['id']}, network['network'])
+
+    def test_get_network_by_name_duplicates(self):
+        """
+        Tests the neutron_utils.get_network_by_name() function reports networks sharing a name
+        """
+        self.network = neutron_utils.create_network(self.neutron, self.net_config.network_settings)
+        duplicate = neutron_utils.create_network(self.neutron, self.net_config.network_settings)
+        try:
+            self.assertEqual(2, len(neutron_utils.get_networks_by_name(self.neutron, self.net_config.net_name)))
+            self.assertIsNotNone(neutron_utils.get_network_by_name(self.neutron, self.net_config.net_name))
+            with self.assertRaises(Exception):
+                neutron_utils.get_network_by_name(self.neutron, self.net_config.net_name, unique=True)
+        finally:
+            neutron_utils.delete_network(self.neutron, duplicate)
+
     def test_create_subnet(self):
         """
         Tests the neutron_utils.create_neutron_net() function
@@ -250,6 +276,43 @@ class NeutronUtilsTests(OSSourceFileTestsCase):
                                               network=self.network, subnet=self.subnet)
         validate_port(self.neutron, port_name, True)
 
+    def test_create_ports(self):
+        """
+        Tests the neutron_utils.create_ports() function creates every port in one request and in order
+        """
+        self.network = neutron_utils.create_network(self.neutron, self.net_config.network_settings)
+        self.subnet = neutron_utils.create_subnet(self.neutron, self.net_config.subnet_settings, self.network)
+        validate_subnet(self.neutron, self.net_config.subnet_name, self.net_config.subnet_cidr, True)
+
+        self.ports = neutron_utils.create_ports(self.neutron, [
+            (create_network.PortSettings(name=port_name + '-1', ip_address=ip_1), self.network, self.subnet),
+            (create_network.PortSettings(name=port_name + '-2', ip_address=ip_2), self.network, self.subnet)])
+        self.assertEqual([port_name + '-1', port_name + '-2'], [port['port']['name'] for port in self.ports])
+        self.assertTrue(validate_port(self.neutron, port_name + '-1', True))
+        self.assertTrue(validate_port(self.neutron, port_name + '-2', True))
+
+        network_ports = neutron_utils.get_ports(self.neutron, [self.network['network']['id']])
+        self.assertEqual(set([port['port']['id'] for port in self.ports]),
+                         set([port['id'] for port in network_ports if port['name'].startswith(port_name)]))
+
+    def test_create_ports_partial_failure(self):
+        """
+        Tests the neutron_utils.create_ports() function creates the valid ports and maps the invalid one back to its
+        settings when the bulk request fails
+        """
+        self.network = neutron_utils.create_network(self.neutron, self.net_config.network_settings)
+        self.subnet = neutron_utils.create_subnet(self.neutron, self.net_config.subnet_settings, self.network)
+
+        bad_settings = create_network.PortSettings(name=port_name + '-2', ip_address='foo')
+        with self.assertRaises(neutron_utils.BulkCreateError) as context:
+            neutron_utils.create_ports(self.neutron, [
+                (create_network.PortSettings(name=port_name + '-1', ip_address=ip_1), self.network, self.subnet),
+                (bad_settings, self.network, self.subnet)])
+        self.ports = [port for port in context.exception.created if port]
+        self.assertEqual([port_name + '-1'], [port['port']['name'] for port in self.ports])
+        self.assertEqual([(1, bad_settings)], [(index, settings) for index, settings, e in context.exception.failures])
+        self.assertTrue(validate_port(self.neutron, port_name + '-1', True))
+
     def test_create_port_empty_name(self):
         """
         Tests the neutron_utils.create_port() function
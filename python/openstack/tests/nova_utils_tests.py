@@ -16,7 +16,6 @@ import logging
 import os
 
 import file_utils
-from Crypto.PublicKey import RSA
 
 import openstack.nova_utils as nova_utils
 from openstack.tests.os_source_file_test import OSSourceFileTestsCase
@@ -53,6 +52,7 @@ class NovaUtilsKeypairTests(OSSourceFileTestsCase):
         within OpenStack
         """
         self.nova = nova_utils.nova_client(self.os_creds)
+        from Crypto.PublicKey import RSA
         self.keys = RSA.generate(1024)
         self.public_key = self.keys.publickey().exportKey('OpenSSH')
         self.keypair_name = 'testKP'
@@ -0,0 +1,167 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import unittest
+
+from openstack import client_registry
+from openstack import os_credentials
+from openstack import tenant_inventory
+
+__author__ = 'spisarski'
+
+
+class StubNeutron:
+    """
+    Stand-in for the Neutron client that counts its list calls
+    """
+
+    def __init__(self, ports):
+        self.ports = ports
+        self.list_calls = 0
+        self.failures = 0
+        self.started = threading.Event()
+        self.release = None
+
+    def list_ports(self):
+        self.list_calls += 1
+        self.started.set()
+        if self.release:
+            self.release.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise Exception('Service unavailable')
+        return {'ports': list(self.ports)}
+
+    def list_networks(self):
+        return {'networks': [{'id': 'net-id', 'name': 'net'}]}
+
+
+class TenantInventoryTests(unittest.TestCase):
+    """
+    Tests the TenantInventory class defined in tenant_inventory.py against a stub Neutron client
+    """
+
+    def setUp(self):
+        self.neutron = StubNeutron([{'id': '1', 'name': 'port-a'}, {'id': '2', 'name': 'port-b'},
+                                    {'id': '3', 'name': 'port-b'}])
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry({client_registry.NETWORK: self.__factory}))
+        self.inventory = tenant_inventory.TenantInventory(
+            os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'tenant'))
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+
+    def __factory(self, os_creds):
+        return self.neutron
+
+    def test_lazy_single_listing(self):
+        """
+        Tests that a resource type is listed once, on first use, no matter how many lookups follow
+        """
+        self.assertFalse(self.inventory.loaded(tenant_inventory.PORTS))
+        self.assertEquals(0, self.neutron.list_calls)
+        self.assertEquals('1', self.inventory.find_by_name(tenant_inventory.PORTS, 'port-a')['id'])
+        self.assertEquals('2', self.inventory.find_by_id(tenant_inventory.PORTS, '2')['id'])
+        self.assertIsNone(self.inventory.find_by_name(tenant_inventory.PORTS, 'port-c'))
+        self.assertEquals(3, len(self.inventory.get_all(tenant_inventory.PORTS)))
+        self.assertTrue(self.inventory.loaded(tenant_inventory.PORTS))
+        self.assertEquals(1, self.neutron.list_calls)
+
+    def test_duplicate_names(self):
+        """
+        Tests that every resource sharing a name is returned and the first listed is preferred
+        """
+        ports = self.inventory.find_all_by_name(tenant_inventory.PORTS, 'port-b')
+        self.assertEquals(['2', '3'], [port['id'] for port in ports])
+        self.assertEquals('2', self.inventory.find_by_name(tenant_inventory.PORTS, 'port-b')['id'])
+
+    def test_add_remove(self):
+        """
+        Tests that resources created and deleted during the run are reflected without listing again
+        """
+        self.inventory.load(tenant_inventory.PORTS)
+        new_port = {'id': '4', 'name': 'port-c'}
+        self.inventory.add(tenant_inventory.PORTS, new_port)
+        self.assertIs(new_port, self.inventory.find_by_name(tenant_inventory.PORTS, 'port-c'))
+
+        self.inventory.remove(tenant_inventory.PORTS, {'id': '2'})
+        self.assertIsNone(self.inventory.find_by_id(tenant_inventory.PORTS, '2'))
+        self.assertEquals(['3'], [port['id'] for port in
+                                  self.inventory.find_all_by_name(tenant_inventory.PORTS, 'port-b')])
+        self.assertEquals(3, len(self.inventory.get_all(tenant_inventory.PORTS)))
+        self.assertEquals(1, self.neutron.list_calls)
+
+    def test_add_before_load(self):
+        """
+        Tests that adding to a type that has not been listed defers to the bulk listing
+        """
+        self.inventory.add(tenant_inventory.PORTS, {'id': '1', 'name': 'port-a'})
+        self.assertFalse(self.inventory.loaded(tenant_inventory.PORTS))
+        self.assertEquals(3, len(self.inventory.get_all(tenant_inventory.PORTS)))
+
+    def test_failed_listing_retried(self):
+        """
+        Tests that a listing that fails leaves the type unloaded so that the next lookup lists it again
+        """
+        self.neutron.failures = 1
+        with self.assertRaises(Exception):
+            self.inventory.find_by_name(tenant_inventory.PORTS, 'port-a')
+        self.assertFalse(self.inventory.loaded(tenant_inventory.PORTS))
+        self.assertEquals('1', self.inventory.find_by_name(tenant_inventory.PORTS, 'port-a')['id'])
+        self.assertEquals(2, self.neutron.list_calls)
+
+    def test_slow_listing(self):
+        """
+        Tests that a listing in progress neither blocks the lookups of other types nor loses the resources added
+        while it runs
+        """
+        self.neutron.release = threading.Event()
+        listing = threading.Thread(target=self.inventory.load, args=(tenant_inventory.PORTS,))
+        listing.start()
+        self.neutron.started.wait(5)
+        try:
+            self.assertEquals('net-id', self.inventory.find_by_name(tenant_inventory.NETWORKS, 'net')['id'])
+            self.inventory.add(tenant_inventory.PORTS, {'id': '4', 'name': 'port-c'})
+        finally:
+            self.neutron.release.set()
+            listing.join()
+        self.assertEquals('4', self.inventory.find_by_name(tenant_inventory.PORTS, 'port-c')['id'])
+        self.assertEquals(1, self.neutron.list_calls)
+
+    def test_pin(self):
+        """
+        Tests that a pinned resource is the one found by name among others sharing it
+        """
+        self.assertEquals('3', self.inventory.pin(tenant_inventory.PORTS, '3')['id'])
+        self.assertEquals('3', self.inventory.find_by_name(tenant_inventory.PORTS, 'port-b')['id'])
+        self.assertEquals(['3', '2'], [port['id'] for port in
+                                       self.inventory.find_all_by_name(tenant_inventory.PORTS, 'port-b')])
+        self.assertIsNone(self.inventory.pin(tenant_inventory.PORTS, '9'))
+
+    def test_filter(self):
+        """
+        Tests filtering resources by attribute value
+        """
+        ports = self.inventory.filter(tenant_inventory.PORTS, name='port-b', id='3')
+        self.assertEquals(1, len(ports))
+        self.assertEquals('3', ports[0]['id'])
+
+    def test_unsupported_type(self):
+        """
+        Tests that an Exception is raised for an unknown resource type
+        """
+        with self.assertRaises(Exception):
+            self.inventory.get_all('volumes')
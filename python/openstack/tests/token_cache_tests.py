@@ -0,0 +1,82 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import stat
+import time
+import unittest
+
+from openstack import os_credentials
+from openstack.token_cache import TokenCache
+
+__author__ = 'spisarski'
+
+
+class TokenCacheTests(unittest.TestCase):
+    """
+    Tests the TokenCache class defined in token_cache.py
+    """
+
+    def setUp(self):
+        self.tmp_dir = '/tmp/token_cache_tests'
+        self.cache = TokenCache(self.tmp_dir + '/tokens.json')
+        self.creds = os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'tenant')
+        self.access = {'token': {'id': 'abc'}, 'serviceCatalog': [{'type': 'image'}]}
+
+    def tearDown(self):
+        if os.path.isdir(self.tmp_dir):
+            shutil.rmtree(self.tmp_dir)
+
+    def test_put_get(self):
+        """
+        Tests that an unexpired entry is returned and the file is only accessible by its owner
+        """
+        self.cache.put(self.creds, self.access, time.time() + 3600)
+        self.assertEquals(self.access, self.cache.get(self.creds, 300))
+        self.assertEquals(0600, stat.S_IMODE(os.stat(self.cache.file_path).st_mode))
+
+    def test_expiring_entry_ignored(self):
+        """
+        Tests that an entry expiring within the requested minimum life is not returned
+        """
+        self.cache.put(self.creds, self.access, time.time() + 60)
+        self.assertIsNone(self.cache.get(self.creds, 300))
+
+    def test_entry_per_user(self):
+        """
+        Tests that entries are keyed by auth_url/user/tenant
+        """
+        self.cache.put(self.creds, self.access, time.time() + 3600)
+        other_creds = os_credentials.OSCreds('user2', 'pass', 'http://foo:5000/v2.0/', 'tenant')
+        self.assertIsNone(self.cache.get(other_creds))
+
+    def test_invalidate(self):
+        """
+        Tests that an invalidated entry is no longer returned by a new cache instance
+        """
+        self.cache.put(self.creds, self.access, time.time() + 3600)
+        self.cache.invalidate(self.creds)
+        self.assertIsNone(TokenCache(self.cache.file_path).get(self.creds))
+
+    def test_corrupt_file(self):
+        """
+        Tests that a corrupt cache file is treated as empty and then overwritten
+        """
+        os.makedirs(self.tmp_dir)
+        with open(self.cache.file_path, 'w') as cache_file:
+            cache_file.write('not json')
+        self.assertIsNone(self.cache.get(self.creds))
+        self.cache.put(self.creds, self.access, time.time() + 3600)
+        self.assertEquals(self.access, self.cache.get(self.creds))
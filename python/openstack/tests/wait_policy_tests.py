@@ -0,0 +1,101 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+import unittest
+
+from openstack import wait_policy
+
+__author__ = 'spisarski'
+
+
+class WaitPolicyTests(unittest.TestCase):
+    """
+    Tests the WaitPolicy, Deadline and DurationEstimator classes defined in wait_policy.py
+    """
+
+    def test_config(self):
+        """
+        Tests that the configuration dictionary overrides the defaults
+        """
+        policy = wait_policy.WaitPolicy({'initial_interval': 2, 'max_interval': 20, 'boot_timeout': 60})
+        self.assertEquals(2, policy.initial_interval)
+        self.assertEquals(20, policy.max_interval)
+        self.assertEquals(60, policy.boot_timeout)
+        self.assertEquals(wait_policy.SSH_TIMEOUT, policy.ssh_timeout)
+
+    def test_invalid_intervals(self):
+        """
+        Tests that an Exception is raised when the initial interval exceeds the cap
+        """
+        with self.assertRaises(Exception):
+            wait_policy.WaitPolicy(initial_interval=10, max_interval=5)
+
+    def test_backoff_capped(self):
+        """
+        Tests that intervals grow exponentially up to the cap when there is no jitter
+        """
+        deadline = wait_policy.WaitPolicy(initial_interval=1, max_interval=5, jitter=0).deadline(1000)
+        self.assertEquals([1, 2, 4, 5, 5], [round(deadline.next_interval()) for _ in range(5)])
+
+    def test_jitter_bounds(self):
+        """
+        Tests that jitter keeps each interval within the configured fraction
+        """
+        deadline = wait_policy.WaitPolicy(initial_interval=10, max_interval=10, jitter=0.2).deadline(1000)
+        for _ in range(50):
+            interval = deadline.next_interval()
+            self.assertTrue(8 <= interval <= 12)
+
+    def test_deadline(self):
+        """
+        Tests that sleeping never passes the deadline and reports when it has been reached
+        """
+        deadline = wait_policy.WaitPolicy(initial_interval=0.1, max_interval=0.1, jitter=0).deadline(0.25)
+        start = time.time()
+        sleeps = 0
+        while deadline.sleep():
+            sleeps += 1
+        self.assertEquals(2, sleeps)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEquals(0.0, deadline.next_interval())
+
+    def test_cancelled_sleep(self):
+        """
+        Tests that setting the cancel event ends a sleep early and reports it as over
+        """
+        cancel = threading.Event()
+        threading.Timer(0.1, cancel.set).start()
+        start = time.time()
+        self.assertFalse(wait_policy.fixed_interval(5).deadline(10).sleep(cancel=cancel))
+        self.assertLess(time.time() - start, 1)
+
+    def test_fixed_interval(self):
+        """
+        Tests the constant interval policy
+        """
+        deadline = wait_policy.fixed_interval(3).deadline(1000)
+        self.assertEquals([3, 3, 3], [deadline.next_interval() for _ in range(3)])
+
+    def test_estimator(self):
+        """
+        Tests that the estimate is the median of the most recent durations
+        """
+        estimator = wait_policy.DurationEstimator(samples=3)
+        self.assertIsNone(estimator.estimate('m1.small'))
+        for seconds in [100, 10, 30, 20]:
+            estimator.record('m1.small', seconds)
+        self.assertEquals(20, estimator.estimate('m1.small'))
+        self.assertIsNone(estimator.estimate('m1.large'))
@@ -0,0 +1,120 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import logging
+import os
+import threading
+import time
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('token_cache')
+
+
+class TokenCache:
+    """
+    File backed cache of Keystone tokens and their service catalogs so repeated runs can skip authentication.
+    The file is only ever readable and writable by its owner (0600) as it contains bearer tokens.
+    """
+
+    def __init__(self, file_path):
+        """
+        Constructor
+        :param file_path: the location of the cache file (created on first write)
+        """
+        self.file_path = os.path.expanduser(file_path)
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(os_creds):
+        """
+        Returns the key under which the token for the given credentials is stored
+        :param os_creds: the OSCreds object
+        :return: the key string
+        """
+        return '|'.join([os_creds.auth_url, os_creds.username, os_creds.tenant_name])
+
+    def get(self, os_creds, min_life=0):
+        """
+        Returns the cached access body for the credentials if it is valid for at least another min_life seconds
+        :param os_creds: the OSCreds object
+        :param min_life: the minimum number of seconds the token must remain valid
+        :return: the access dictionary or None
+        """
+        with self.__lock:
+            entry = self.__read().get(self.cache_key(os_creds))
+        if entry and entry.get('expires_at', 0) - min_life > time.time():
+            logger.debug('Using cached token for user - ' + os_creds.username)
+            return entry.get('access')
+        return None
+
+    def put(self, os_creds, access_body, expires_at):
+        """
+        Stores an access body for the credentials and prunes any expired entries
+        :param os_creds: the OSCreds object
+        :param access_body: the JSON serializable token and service catalog dictionary
+        :param expires_at: the token expiration as seconds since the epoch
+        """
+        with self.__lock:
+            entries = self.__read()
+            now = time.time()
+            for key in [key for key, value in entries.iteritems() if value.get('expires_at', 0) <= now]:
+                del entries[key]
+            entries[self.cache_key(os_creds)] = {'access': access_body, 'expires_at': expires_at}
+            self.__write(entries)
+
+    def invalidate(self, os_creds):
+        """
+        Removes the entry for the credentials (i.e. after the token has been rejected with a 401)
+        :param os_creds: the OSCreds object
+        """
+        with self.__lock:
+            entries = self.__read()
+            if entries.pop(self.cache_key(os_creds), None):
+                logger.info('Invalidated cached token for user - ' + os_creds.username)
+                self.__write(entries)
+
+    def __read(self):
+        """
+        Returns the contents of the cache file or an empty dictionary when it is missing or unreadable
+        """
+        if not os.path.isfile(self.file_path):
+            return dict()
+        try:
+            with open(self.file_path) as cache_file:
+                entries = json.load(cache_file)
+            if isinstance(entries, dict):
+                return entries
+        except (IOError, ValueError) as e:
+            logger.warn('Ignoring unreadable token cache [' + self.file_path + '] - ' + str(e))
+        return dict()
+
+    def __write(self, entries):
+        """
+        Atomically replaces the cache file with one readable only by the current user
+        """
+        cache_dir = os.path.dirname(self.file_path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+        tmp_path = self.file_path + '.' + str(os.getpid()) + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        try:
+            with os.fdopen(fd, 'w') as cache_file:
+                json.dump(entries, cache_file)
+            os.rename(tmp_path, self.file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
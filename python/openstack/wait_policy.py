@@ -0,0 +1,206 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import random
+import threading
+import time
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('wait_policy')
+
+"""
+Polling intervals and deadlines for the code waiting on OpenStack and VM state changes
+"""
+
+INITIAL_INTERVAL = 1
+MAX_INTERVAL = 15
+MULTIPLIER = 2
+JITTER = 0.2
+BOOT_TIMEOUT = 1500
+DELETE_TIMEOUT = 600
+SSH_TIMEOUT = 120
+FLOATING_IP_TIMEOUT = 30
+
+# Portion of the expected duration slept before probing starts
+ESTIMATE_FRACTION = 0.8
+# Number of past durations kept for each estimate
+ESTIMATE_SAMPLES = 20
+
+
+class WaitPolicy:
+    """
+    Class representing how waits are paced: probes start quickly and back off exponentially with random jitter up to a
+    maximum interval, and each wait has its own deadline
+    """
+
+    def __init__(self, config=None, initial_interval=INITIAL_INTERVAL, max_interval=MAX_INTERVAL,
+                 multiplier=MULTIPLIER, jitter=JITTER, boot_timeout=BOOT_TIMEOUT, delete_timeout=DELETE_TIMEOUT,
+                 ssh_timeout=SSH_TIMEOUT, floating_ip_timeout=FLOATING_IP_TIMEOUT, expected_boot_time=None):
+        """
+        Constructor - all parameters are optional
+        :param config: Should be a dict object containing the configuration settings using the attribute names below
+                       as each member's the key and overrides any of the other parameters.
+        :param initial_interval: Seconds before the second probe
+        :param max_interval: The cap in seconds of the interval between probes
+        :param multiplier: The factor by which the interval grows after each probe
+        :param jitter: The fraction of each interval randomly added or removed so that concurrent waiters spread out
+        :param boot_timeout: Seconds to wait for a VM to become active
+        :param delete_timeout: Seconds to wait for a VM to be deleted
+        :param ssh_timeout: Seconds to wait for a VM to accept SSH sessions
+        :param floating_ip_timeout: Seconds to keep trying to associate a floating IP with a VM
+        :param expected_boot_time: Seconds a VM usually takes to become active. When not set, the time taken by the
+                                   VMs previously created in this process is used.
+        """
+        if config:
+            self.initial_interval = config.get('initial_interval', initial_interval)
+            self.max_interval = config.get('max_interval', max_interval)
+            self.multiplier = config.get('multiplier', multiplier)
+            self.jitter = config.get('jitter', jitter)
+            self.boot_timeout = config.get('boot_timeout', boot_timeout)
+            self.delete_timeout = config.get('delete_timeout', delete_timeout)
+            self.ssh_timeout = config.get('ssh_timeout', ssh_timeout)
+            self.floating_ip_timeout = config.get('floating_ip_timeout', floating_ip_timeout)
+            self.expected_boot_time = config.get('expected_boot_time', expected_boot_time)
+        else:
+            self.initial_interval = initial_interval
+            self.max_interval = max_interval
+            self.multiplier = multiplier
+            self.jitter = jitter
+            self.boot_timeout = boot_timeout
+            self.delete_timeout = delete_timeout
+            self.ssh_timeout = ssh_timeout
+            self.floating_ip_timeout = floating_ip_timeout
+            self.expected_boot_time = expected_boot_time
+
+        if self.initial_interval <= 0 or self.max_interval < self.initial_interval:
+            raise Exception('Wait intervals must be positive and initial_interval cannot exceed max_interval')
+
+    def deadline(self, timeout):
+        """
+        Starts a new wait
+        :param timeout: the number of seconds after which the wait gives up
+        :return: the Deadline object
+        """
+        return Deadline(self, timeout)
+
+
+def fixed_interval(interval):
+    """
+    Returns a policy probing at a constant interval without jitter
+    :param interval: the number of seconds between probes
+    :return: the WaitPolicy object
+    """
+    return WaitPolicy(initial_interval=interval, max_interval=interval, multiplier=1, jitter=0)
+
+
+class Deadline:
+    """
+    A single wait paced by a WaitPolicy
+    """
+
+    def __init__(self, policy, timeout):
+        """
+        Constructor
+        :param policy: the WaitPolicy object
+        :param timeout: the number of seconds after which the wait gives up
+        """
+        self.policy = policy
+        self.start = time.time()
+        self.expires = self.start + timeout
+        self.__interval = policy.initial_interval
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def remaining(self):
+        return max(0.0, self.expires - time.time())
+
+    def expired(self):
+        return time.time() >= self.expires
+
+    def next_interval(self):
+        """
+        Returns the number of seconds before the next probe and backs off the one after
+        """
+        interval = self.__interval
+        if self.policy.jitter:
+            interval *= 1 + random.uniform(-self.policy.jitter, self.policy.jitter)
+        self.__interval = min(self.__interval * self.policy.multiplier, self.policy.max_interval)
+        return max(0.0, min(interval, self.remaining()))
+
+    def sleep(self, seconds=None, cancel=None):
+        """
+        Sleeps until the next probe (or for the given number of seconds), never past the deadline
+        :param seconds: (Optional) the number of seconds to sleep instead of the next backoff interval
+        :param cancel: (Optional) a threading.Event that ends the sleep early when set
+        :return: T/F - False when the deadline has been reached or the sleep was cancelled
+        """
+        if seconds is None:
+            seconds = self.next_interval()
+        else:
+            seconds = max(0.0, min(seconds, self.remaining()))
+        logger.debug('Next probe in ' + ('%.1f' % seconds) + ' seconds')
+        if cancel:
+            if cancel.wait(seconds):
+                return False
+        else:
+            time.sleep(seconds)
+        return not self.expired()
+
+
+class DurationEstimator:
+    """
+    Thread-safe record of how long past operations took, keyed by an arbitrary value (i.e. the VM flavor)
+    """
+
+    def __init__(self, samples=ESTIMATE_SAMPLES):
+        self.samples = samples
+        self.__durations = dict()
+        self.__lock = threading.Lock()
+
+    def record(self, key, seconds):
+        """
+        Adds an operation's duration
+        :param key: the operation key
+        :param seconds: the duration
+        """
+        with self.__lock:
+            durations = self.__durations.setdefault(key, list())
+            durations.append(seconds)
+            del durations[:-self.samples]
+
+    def estimate(self, key):
+        """
+        Returns the median of the recorded durations
+        :param key: the operation key
+        :return: the number of seconds or None when nothing has been recorded
+        """
+        with self.__lock:
+            durations = sorted(self.__durations.get(key, list()))
+        if not durations:
+            return None
+        return durations[len(durations) / 2]
+
+
+_boot_times = DurationEstimator()
+
+
+def boot_times():
+    """
+    Returns the process-wide estimator of VM boot times
+    :return: the DurationEstimator object
+    """
+    return _boot_times
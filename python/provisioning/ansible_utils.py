@@ -18,15 +18,17 @@ from collections import namedtuple
 
 import re
 import os
-from ansible.parsing.dataloader import DataLoader
-from ansible.vars import VariableManager
-from ansible.inventory import Inventory
-from ansible.executor.playbook_executor import PlaybookExecutor
+import socket
 
 __author__ = 'spisarski'
 
 logger = logging.getLogger('ansible_utils')
 
+SSH_PORT = 22
+PROBE_TIMEOUT = 5
+# Maximum number of bytes read while looking for the proxy response or SSH banner
+PROBE_READ_LIMIT = 4096
+
 
 def apply_playbook(playbook_path, hosts_inv, host_user, ssh_priv_key_file_path, variables=None, proxy_setting=None):
     """
@@ -44,7 +46,12 @@ def apply_playbook(playbook_path, hosts_inv, host_user, ssh_priv_key_file_path,
     if not os.path.isfile(ssh_priv_key_file_path):
         raise Exception('Requested private SSH key not found - ' + ssh_priv_key_file_path)
 
+    # Ansible is only loaded when a playbook is actually applied as importing it is expensive
     import ansible.constants
+    from ansible.parsing.dataloader import DataLoader
+    from ansible.vars import VariableManager
+    from ansible.inventory import Inventory
+    from ansible.executor.playbook_executor import PlaybookExecutor
     ansible.constants.HOST_KEY_CHECKING = False
 
     variable_manager = VariableManager()
@@ -118,4 +125,66 @@ def ssh_client(ip, user, private_key_filepath, proxy_settings=None):
         ssh.connect(ip, username=user, key_filename=private_key_filepath, sock=proxy)
         return ssh
     except Exception as e:
-        logger.warn('Unable to connect via SSH with message - ' + e.message)
+        logger.warn('Unable to connect via SSH with message - ' + str(e))
+        ssh.close()
+        if proxy:
+            proxy.close()
+
+
+def ssh_banner(ip, proxy_settings=None, port=SSH_PORT, timeout=PROBE_TIMEOUT):
+    """
+    Returns the SSH server's identification banner without any key exchange or authentication. This is a cheap check
+    of whether a host is worth an ssh_client() attempt.
+    :param ip: the IP of the host to probe
+    :param proxy_settings: optional HTTP proxy settings in the form <hostname|IP>:<port> through which to connect
+    :param port: the SSH port
+    :param timeout: seconds allowed for connecting and for each read
+    :return: the banner (i.e. 'SSH-2.0-OpenSSH_6.6.1') or None when the host does not answer with one
+    """
+    sock = None
+    try:
+        if proxy_settings:
+            tokens = re.split(':', proxy_settings)
+            sock = socket.create_connection((tokens[0], int(tokens[1])), timeout)
+            sock.sendall('CONNECT ' + ip + ':' + str(port) + ' HTTP/1.0\r\n\r\n')
+            response = __read_until(sock, '', '\r\n\r\n')
+            header, separator, data = response.partition('\r\n\r\n')
+            status = header.split(' ')
+            if not separator or len(status) < 2 or status[1] != '200':
+                logger.debug('Proxy refused connection to ' + ip + ' - ' + header.split('\r\n')[0])
+                return None
+        else:
+            sock = socket.create_connection((ip, port), timeout)
+            data = ''
+
+        # Servers may send other lines before the identification string
+        while True:
+            data = __read_until(sock, data, '\n')
+            line, separator, data = data.partition('\n')
+            if line.startswith('SSH-'):
+                return line.strip()
+            if not separator:
+                return None
+    except (socket.error, socket.timeout, ValueError) as e:
+        logger.debug('No SSH banner from ' + ip + ' - ' + str(e))
+        return None
+    finally:
+        if sock:
+            sock.close()
+
+
+def __read_until(sock, data, terminator):
+    """
+    Reads from the socket until the data contains the terminator, the peer closes the connection or the read limit is
+    reached
+    :param sock: the connected socket
+    :param data: any data already read
+    :param terminator: the string to read up to
+    :return: all of the data read
+    """
+    while terminator not in data and len(data) < PROBE_READ_LIMIT:
+        chunk = sock.recv(PROBE_READ_LIMIT - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
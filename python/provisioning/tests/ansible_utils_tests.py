@@ -21,7 +21,6 @@ import openstack.create_keypairs as create_keypairs
 import openstack.create_network as create_network
 import openstack.neutron_utils as neutron_utils
 from openstack import create_image
-from scp import SCPClient
 
 from provisioning import ansible_utils
 from openstack.tests import openstack_tests
@@ -147,6 +146,7 @@ class AnsibleProvisioningTests(OSSourceFileTestsCase):
 
         ssh = ansible_utils.ssh_client(ip, user, priv_key, self.os_creds.proxy)
         self.assertIsNotNone(ssh)
+        from scp import SCPClient
         scp = SCPClient(ssh.get_transport())
         scp.get('~/hello.txt', self.test_file_local_path)
 
@@ -175,6 +175,7 @@ class AnsibleProvisioningTests(OSSourceFileTestsCase):
 
         ssh = ansible_utils.ssh_client(ip, user, priv_key, self.os_creds.proxy)
         self.assertIsNotNone(ssh)
+        from scp import SCPClient
         scp = SCPClient(ssh.get_transport())
         scp.get('/tmp/hello.txt', self.test_file_local_path)
 
@@ -0,0 +1,102 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import threading
+import unittest
+
+from provisioning import ansible_utils
+
+__author__ = 'spisarski'
+
+
+class StubServer:
+    """
+    Accepts a single connection on a local port and replies with the given data
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.received = ''
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self.__serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __serve(self):
+        conn, _ = self.sock.accept()
+        try:
+            if self.reply.startswith('HTTP'):
+                self.received = conn.recv(1024)
+            conn.sendall(self.reply)
+        finally:
+            conn.close()
+            self.sock.close()
+
+
+class SshBannerTests(unittest.TestCase):
+    """
+    Tests the ansible_utils.ssh_banner() function against local stub servers
+    """
+
+    def test_banner(self):
+        """
+        Tests that the identification string is returned
+        """
+        server = StubServer('SSH-2.0-OpenSSH_6.6.1\r\n')
+        self.assertEquals('SSH-2.0-OpenSSH_6.6.1', ansible_utils.ssh_banner('127.0.0.1', port=server.port))
+
+    def test_banner_after_other_lines(self):
+        """
+        Tests that lines sent before the identification string are skipped
+        """
+        server = StubServer('Welcome\r\nSSH-2.0-OpenSSH_6.6.1\r\n')
+        self.assertEquals('SSH-2.0-OpenSSH_6.6.1', ansible_utils.ssh_banner('127.0.0.1', port=server.port))
+
+    def test_not_ssh(self):
+        """
+        Tests that None is returned when the service is not SSH
+        """
+        server = StubServer('220 smtp ready\r\n')
+        self.assertIsNone(ansible_utils.ssh_banner('127.0.0.1', port=server.port))
+
+    def test_closed_port(self):
+        """
+        Tests that None is returned when nothing is listening
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        self.assertIsNone(ansible_utils.ssh_banner('127.0.0.1', port=port, timeout=1))
+
+    def test_proxy(self):
+        """
+        Tests that the banner is read through an HTTP CONNECT proxy
+        """
+        proxy = StubServer('HTTP/1.0 200 Connection established\r\n\r\nSSH-2.0-OpenSSH_6.6.1\r\n')
+        self.assertEquals('SSH-2.0-OpenSSH_6.6.1',
+                          ansible_utils.ssh_banner('10.0.0.5', '127.0.0.1:' + str(proxy.port)))
+        proxy.thread.join(1)
+        self.assertTrue(proxy.received.startswith('CONNECT 10.0.0.5:22 '))
+
+    def test_proxy_refused(self):
+        """
+        Tests that None is returned when the proxy does not establish the tunnel
+        """
+        proxy = StubServer('HTTP/1.0 403 Forbidden\r\n\r\n')
+        self.assertIsNone(ansible_utils.ssh_banner('10.0.0.5', '127.0.0.1:' + str(proxy.port)))
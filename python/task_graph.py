@@ -0,0 +1,163 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import Queue
+import logging
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+__author__ = 'spisarski'
+
+"""
+Executes a set of dependent tasks on a bounded worker pool, starting each one as soon as its dependencies complete
+"""
+
+logger = logging.getLogger('task_graph')
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class Task:
+    """
+    A unit of work in a TaskGraph
+    """
+
+    def __init__(self, name, func, dependencies):
+        """
+        Constructor
+        :param name: the unique name of the task
+        :param func: the function (without arguments) that performs the work
+        :param dependencies: the names of the tasks that must complete successfully before this one starts
+        """
+        self.name = name
+        self.func = func
+        self.dependencies = set(dependencies)
+
+
+class TaskGraph:
+    """
+    A directed acyclic graph of tasks. Once run() returns, the results, errors and skipped members describe what
+    happened to every task.
+    """
+
+    def __init__(self):
+        self.tasks = dict()
+        self.results = dict()
+        self.errors = dict()
+        self.skipped = set()
+        self.__lock = threading.Lock()
+
+    def add(self, name, func, dependencies=None):
+        """
+        Adds a task to the graph
+        :param name: the unique name of the task
+        :param func: the function (without arguments) that performs the work
+        :param dependencies: (Optional) the names of the tasks that must complete successfully before this one starts
+        """
+        if name in self.tasks:
+            raise Exception('Duplicate task name - ' + name)
+        self.tasks[name] = Task(name, func, dependencies or list())
+
+    def __validate(self):
+        """
+        Raises an Exception when a task depends on an unknown task or when the dependencies contain a cycle
+        """
+        for task in self.tasks.itervalues():
+            for dependency in task.dependencies:
+                if dependency not in self.tasks:
+                    raise Exception('Task [' + task.name + '] depends on unknown task - ' + dependency)
+
+        remaining = dict((name, set(task.dependencies)) for name, task in self.tasks.iteritems())
+        while remaining:
+            ready = [name for name, dependencies in remaining.iteritems() if not dependencies]
+            if not ready:
+                raise Exception('Task dependencies contain a cycle between - ' + ', '.join(sorted(remaining.keys())))
+            for name in ready:
+                del remaining[name]
+            for dependencies in remaining.itervalues():
+                dependencies.difference_update(ready)
+
+    def __execute(self, task, completed):
+        """
+        Runs a task on a worker thread and reports its outcome on the completed queue
+        """
+        logger.info('Starting task - ' + task.name)
+        start = time.time()
+        try:
+            result = task.func()
+        except Exception as e:
+            logger.error('Task [' + task.name + '] failed after ' + ('%.1f' % (time.time() - start)) + 's - ' + str(e))
+            with self.__lock:
+                self.errors[task.name] = e
+            completed.put((task.name, False))
+            return
+        logger.info('Completed task [' + task.name + '] in ' + ('%.1f' % (time.time() - start)) + 's')
+        with self.__lock:
+            self.results[task.name] = result
+        completed.put((task.name, True))
+
+    def __skip_dependents(self, name, pending):
+        """
+        Removes every pending task that directly or transitively depends on the named task
+        """
+        for dependent in [other for other, dependencies in pending.iteritems() if name in dependencies]:
+            if dependent in pending:
+                del pending[dependent]
+                self.skipped.add(dependent)
+                logger.warn('Skipping task [' + dependent + '] as its dependency [' + name + '] did not complete')
+                self.__skip_dependents(dependent, pending)
+
+    def run(self, max_workers=DEFAULT_MAX_WORKERS, fail_fast=True):
+        """
+        Runs every task, each as soon as all of its dependencies have completed successfully. Tasks depending on a
+        failed task are skipped.
+        :param max_workers: the maximum number of tasks running at once
+        :param fail_fast: when True, no further tasks are started after the first failure (tasks already running are
+                          allowed to finish); when False, every task not depending on a failed one is still run
+        :return: True when every task completed successfully
+        """
+        self.__validate()
+        pending = dict((name, set(task.dependencies)) for name, task in self.tasks.iteritems())
+        completed = Queue.Queue()
+        running = 0
+
+        pool = ThreadPool(max(1, min(max_workers, len(self.tasks) or 1)))
+        try:
+            while pending or running:
+                if not (fail_fast and self.errors):
+                    for name in sorted([name for name, dependencies in pending.iteritems() if not dependencies]):
+                        del pending[name]
+                        pool.apply_async(self.__execute, (self.tasks[name], completed))
+                        running += 1
+
+                if not running:
+                    break
+
+                name, success = completed.get()
+                running -= 1
+                if success:
+                    for dependencies in pending.itervalues():
+                        dependencies.discard(name)
+                else:
+                    self.__skip_dependents(name, pending)
+        finally:
+            pool.close()
+            pool.join()
+
+        for name in pending:
+            self.skipped.add(name)
+            logger.warn('Task [' + name + '] not started due to an earlier failure')
+
+        return not self.errors and not self.skipped
@@ -0,0 +1,135 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+import unittest
+
+import deploy_journal
+
+__author__ = 'spisarski'
+
+AUTH_URL = 'http://foo:5000/v2.0/'
+
+
+class DeployJournalTests(unittest.TestCase):
+    """
+    Tests the DeployJournal class defined in deploy_journal.py
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_path = deploy_journal.journal_path(os.path.join(self.tmp_dir, 'env.yaml'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def __journal(self, tenant_name='tenant'):
+        journal = deploy_journal.DeployJournal(self.file_path, AUTH_URL, tenant_name)
+        self.assertTrue(journal.load())
+        return journal
+
+    def test_missing_file(self):
+        """
+        Tests that a journal that was never written is empty
+        """
+        self.assertEquals(list(), self.__journal().entries())
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_round_trip(self):
+        """
+        Tests that begun, created and deleted resources are read back in their latest state
+        """
+        journal = self.__journal()
+        journal.begin('server', 'vm1', {'name': 'vm1'})
+        journal.begin('network', 'net1', {'name': 'net1'})
+        journal.created('network', 'net1', 'net1-id', {'name': 'net1'})
+        journal.begin('keypair', 'kp', None)
+        journal.created('keypair', 'kp', 'kp')
+        journal.deleted('keypair', 'kp')
+
+        journal = self.__journal()
+        self.assertEquals(deploy_journal.PENDING, journal.get('server', 'vm1')['status'])
+        self.assertEquals(['vm1'], [entry['name'] for entry in journal.pending()])
+        network = journal.get('network', 'net1')
+        self.assertEquals(deploy_journal.CREATED, network['status'])
+        self.assertEquals('net1-id', network['id'])
+        self.assertEquals(deploy_journal.config_hash({'name': 'net1'}), network['config_hash'])
+        self.assertIsNone(journal.get('keypair', 'kp'))
+
+    def test_incomplete_final_line(self):
+        """
+        Tests that a record left half written by a crash is discarded and later records remain readable
+        """
+        journal = self.__journal()
+        journal.created('network', 'net1', 'net1-id')
+        with open(self.file_path, 'a') as journal_file:
+            journal_file.write('{"op": "created", "type": "netw')
+
+        journal = self.__journal()
+        self.assertEquals(['net1'], [entry['name'] for entry in journal.entries()])
+        journal.created('network', 'net2', 'net2-id')
+        self.assertEquals(set(['net1', 'net2']), set(entry['name'] for entry in self.__journal().entries()))
+
+    def test_corrupt(self):
+        """
+        Tests that a journal with an unreadable record must be rebuilt
+        """
+        self.__journal().created('network', 'net1', 'net1-id')
+        with open(self.file_path, 'a') as journal_file:
+            journal_file.write('not json\n')
+        journal = deploy_journal.DeployJournal(self.file_path, AUTH_URL, 'tenant')
+        self.assertFalse(journal.load())
+        self.assertEquals(list(), journal.entries())
+
+    def test_other_tenant(self):
+        """
+        Tests that a journal written for another tenant must be rebuilt
+        """
+        self.__journal().created('network', 'net1', 'net1-id')
+        self.assertFalse(deploy_journal.DeployJournal(self.file_path, AUTH_URL, 'other').load())
+
+    def test_rebuild(self):
+        """
+        Tests that rebuilding replaces every record with the given resources
+        """
+        journal = self.__journal()
+        journal.begin('server', 'vm1')
+        journal.rebuild([('network', 'net1', 'net1-id', None)])
+        self.assertFalse(os.path.exists(self.file_path + '.tmp'))
+
+        journal = self.__journal()
+        self.assertEquals([{'type': 'network', 'name': 'net1', 'status': deploy_journal.CREATED, 'id': 'net1-id',
+                            'config_hash': None}], journal.entries())
+
+    def test_remove_if_empty(self):
+        """
+        Tests that the journal file is only removed once every resource has been deleted
+        """
+        journal = self.__journal()
+        journal.created('network', 'net1', 'net1-id')
+        journal.remove_if_empty()
+        self.assertTrue(os.path.exists(self.file_path))
+        journal.deleted('network', 'net1')
+        journal.remove_if_empty()
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_config_hash(self):
+        """
+        Tests that the configuration hash does not depend on key order
+        """
+        self.assertEquals(deploy_journal.config_hash({'a': 1, 'b': [1, 2]}),
+                          deploy_journal.config_hash({'b': [1, 2], 'a': 1}))
+        self.assertNotEquals(deploy_journal.config_hash({'a': 1}), deploy_journal.config_hash({'a': 2}))
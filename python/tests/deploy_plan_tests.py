@@ -0,0 +1,246 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+import unittest
+
+import deploy_journal
+import deploy_plan
+from openstack import tenant_inventory
+from openstack.tenant_inventory import get_attr
+
+__author__ = 'spisarski'
+
+
+class StubResource:
+    """
+    Stand-in for a Nova or Glance resource object
+    """
+
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class StubInventory:
+    """
+    Stand-in for the TenantInventory holding a fixed snapshot
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+    def get_all(self, resource_type):
+        return list(self.items.get(resource_type, list()))
+
+    def find_by_id(self, resource_type, item_id):
+        for item in self.get_all(resource_type):
+            if get_attr(item, 'id') == item_id:
+                return item
+        return None
+
+    def find_by_name(self, resource_type, name):
+        for item in self.get_all(resource_type):
+            if get_attr(item, 'name') == name:
+                return item
+        return None
+
+    def filter(self, resource_type, **attrs):
+        return [item for item in self.get_all(resource_type)
+                if all(get_attr(item, key) == value for key, value in attrs.iteritems())]
+
+
+OS_CONFIG = {
+    'images': [{'image': {'name': 'centos', 'format': 'qcow2'}}],
+    'networks': [{'network': {'name': 'net1', 'subnet': {'name': 'sub1', 'cidr': '10.0.1.0/24'},
+                              'router': {'name': 'router1', 'external_gateway': 'external'}}}],
+    'keypairs': [{'keypair': {'name': 'kp'}}],
+    'instances': [{'instance': {'name': 'vm1', 'flavor': 'm1.small', 'imageName': 'centos', 'keypair_name': 'kp',
+                                'ports': [{'port': {'name': 'port1', 'network_name': 'net1', 'ip': '10.0.1.5'}}],
+                                'floating_ip': {'port_name': 'port1', 'ext_net': 'external'}}}],
+}
+
+
+def existing_tenant(status='ACTIVE'):
+    """
+    Returns the snapshot of a tenant in which OS_CONFIG has been fully deployed
+    """
+    return {
+        tenant_inventory.IMAGES: [StubResource(id='img-id', name='centos', disk_format='qcow2')],
+        tenant_inventory.FLAVORS: [StubResource(id='flavor-id', name='m1.small')],
+        tenant_inventory.NETWORKS: [{'id': 'net1-id', 'name': 'net1'}, {'id': 'ext-id', 'name': 'external'}],
+        tenant_inventory.SUBNETS: [{'id': 'sub1-id', 'name': 'sub1', 'cidr': '10.0.1.0/24', 'network_id': 'net1-id'}],
+        tenant_inventory.ROUTERS: [{'id': 'router1-id', 'name': 'router1',
+                                    'external_gateway_info': {'network_id': 'ext-id'}}],
+        tenant_inventory.PORTS: [{'id': 'rif-id', 'name': '', 'network_id': 'net1-id', 'device_id': 'router1-id',
+                                  'fixed_ips': [{'subnet_id': 'sub1-id', 'ip_address': '10.0.1.1'}]},
+                                 {'id': 'port1-id', 'name': 'port1', 'network_id': 'net1-id',
+                                  'fixed_ips': [{'subnet_id': 'sub1-id', 'ip_address': '10.0.1.5'}]}],
+        tenant_inventory.KEYPAIRS: [StubResource(id='kp', name='kp')],
+        tenant_inventory.SERVERS: [StubResource(id='vm1-id', name='vm1', status=status, flavor={'id': 'flavor-id'},
+                                                image={'id': 'img-id'})],
+        tenant_inventory.FLOATING_IPS: [StubResource(id='fip-id', ip='1.2.3.4', instance_id='vm1-id')],
+    }
+
+
+def changes(plan):
+    return [(item.action, item.resource_type, item.name) for item in plan.changes()]
+
+
+class DeployPlanTests(unittest.TestCase):
+    """
+    Tests the plans computed by deploy_plan.build_plan() against a stub inventory
+    """
+
+    def test_empty_tenant(self):
+        """
+        Tests that every configured resource is created in an empty tenant
+        """
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(dict()))
+        self.assertEquals(9, plan.count(deploy_plan.CREATE))
+        self.assertEquals(len(plan.items), len(plan.changes()))
+        self.assertTrue(plan.has(deploy_plan.CREATE, deploy_plan.ROUTER_INTERFACE, 'router1/sub1'))
+        self.assertTrue(plan.has(deploy_plan.CREATE, deploy_plan.FLOATING_IP, 'vm1'))
+
+    def test_unchanged(self):
+        """
+        Tests that redeploying an unchanged environment plans no changes
+        """
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(existing_tenant()))
+        self.assertEquals([], plan.changes())
+        self.assertEquals(0, plan.count(deploy_plan.DRIFT))
+        self.assertEquals(9, plan.count(deploy_plan.NOOP))
+
+    def test_missing_router_interface(self):
+        """
+        Tests that the router interface is found through the router's ports rather than by attempting to add it
+        """
+        tenant = existing_tenant()
+        tenant[tenant_inventory.PORTS] = tenant[tenant_inventory.PORTS][1:]
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(tenant))
+        self.assertEquals([(deploy_plan.CREATE, deploy_plan.ROUTER_INTERFACE, 'router1/sub1')], changes(plan))
+
+    def test_drift(self):
+        """
+        Tests that existing resources differing from their configuration are reported but not changed
+        """
+        tenant = existing_tenant()
+        tenant[tenant_inventory.SUBNETS][0]['cidr'] = '10.0.2.0/24'
+        tenant[tenant_inventory.PORTS][1]['fixed_ips'][0]['ip_address'] = '10.0.1.6'
+        tenant[tenant_inventory.SERVERS][0].flavor = {'id': 'other-flavor-id'}
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(tenant))
+        self.assertEquals([], plan.changes())
+        drifted = [(item.resource_type, item.name) for item in plan.items if item.action == deploy_plan.DRIFT]
+        self.assertEquals([(deploy_plan.SUBNET, 'sub1'), (deploy_plan.SERVER, 'vm1'), (deploy_plan.PORT, 'port1')],
+                          drifted)
+
+    def test_error_server_replaced(self):
+        """
+        Tests that a server in the ERROR state and its floating IP are deleted and created again on the same ports
+        """
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(existing_tenant('ERROR')))
+        self.assertEquals([(deploy_plan.DELETE, deploy_plan.SERVER, 'vm1'),
+                           (deploy_plan.CREATE, deploy_plan.SERVER, 'vm1'),
+                           (deploy_plan.DELETE, deploy_plan.FLOATING_IP, 'vm1'),
+                           (deploy_plan.CREATE, deploy_plan.FLOATING_IP, 'vm1')],
+                          changes(plan))
+        self.assertTrue(plan.has(deploy_plan.NOOP, deploy_plan.PORT, 'port1'))
+
+    def test_clean(self):
+        """
+        Tests that cleaning only deletes the resources that exist and keeps images unless requested
+        """
+        tenant = existing_tenant()
+        tenant[tenant_inventory.SERVERS] = list()
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(tenant), clean=True)
+        self.assertEquals(0, plan.count(deploy_plan.CREATE))
+        self.assertEquals(6, plan.count(deploy_plan.DELETE))
+        self.assertFalse(plan.has(deploy_plan.DELETE, deploy_plan.SERVER, 'vm1'))
+        self.assertTrue(plan.has(deploy_plan.NOOP, deploy_plan.IMAGE, 'centos'))
+
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(tenant), clean=True, clean_images=True)
+        self.assertTrue(plan.has(deploy_plan.DELETE, deploy_plan.IMAGE, 'centos'))
+
+    def test_summary_table(self):
+        """
+        Tests that every item and the totals are listed
+        """
+        table = deploy_plan.build_plan(OS_CONFIG, StubInventory(existing_tenant('ERROR'))).summary_table()
+        lines = table.split('\n')
+        self.assertEquals(12, len(lines))
+        self.assertTrue(lines[0].startswith('= no-op'))
+        self.assertIn('- delete server', table)
+        self.assertEquals('Plan: 2 to create, 2 to delete, 7 unchanged, 0 drifted', lines[-1])
+
+
+class DeployPlanJournalTests(unittest.TestCase):
+    """
+    Tests the plans computed by deploy_plan.build_plan() with the journal of a previous run
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.journal = deploy_journal.DeployJournal(os.path.join(self.tmp_dir, 'env.yaml.journal'), 'url', 'tenant')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_interrupted_create_resumed(self):
+        """
+        Tests that resources whose creation was interrupted are created again, whether or not they exist
+        """
+        self.journal.begin(deploy_plan.SERVER, 'vm1', OS_CONFIG['instances'][0]['instance'])
+        self.journal.begin(deploy_plan.NETWORK, 'net1', OS_CONFIG['networks'][0]['network'])
+        tenant = existing_tenant()
+        tenant[tenant_inventory.NETWORKS] = tenant[tenant_inventory.NETWORKS][1:]
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(tenant), journal=self.journal)
+        self.assertTrue(plan.has(deploy_plan.CREATE, deploy_plan.SERVER, 'vm1'))
+        self.assertTrue(plan.has(deploy_plan.CREATE, deploy_plan.NETWORK, 'net1'))
+        resumed = [item for item in plan.changes() if item.resource_type == deploy_plan.SERVER][0]
+        self.assertEquals('vm1-id', resumed.resource_id)
+
+    def test_configuration_changed(self):
+        """
+        Tests that a resource whose configuration changed since it was created is reported as drifted
+        """
+        self.journal.created(deploy_plan.KEYPAIR, 'kp', 'kp', {'name': 'kp', 'public_filepath': '/old'})
+        self.journal.created(deploy_plan.SERVER, 'vm1', 'vm1-id', OS_CONFIG['instances'][0]['instance'])
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(existing_tenant()), journal=self.journal)
+        self.assertEquals([], plan.changes())
+        self.assertTrue(plan.has(deploy_plan.DRIFT, deploy_plan.KEYPAIR, 'kp'))
+        self.assertTrue(plan.has(deploy_plan.NOOP, deploy_plan.SERVER, 'vm1'))
+
+    def test_stale_entries(self):
+        """
+        Tests that recorded resources that were deleted or renamed outside of a run are found
+        """
+        self.journal.created(deploy_plan.NETWORK, 'net1', 'net1-id')
+        self.journal.created(deploy_plan.SERVER, 'vm1', 'other-vm-id')
+        self.journal.created(deploy_plan.KEYPAIR, 'renamed', 'kp')
+        self.journal.begin(deploy_plan.IMAGE, 'centos')
+        stale = deploy_plan.stale_entries(self.journal, StubInventory(existing_tenant()))
+        self.assertEquals([(deploy_plan.KEYPAIR, 'renamed'), (deploy_plan.SERVER, 'vm1')],
+                          sorted((entry['type'], entry['name']) for entry in stale))
+
+    def test_journal_resources(self):
+        """
+        Tests that a journal is rebuilt from the existing images, networks, keypairs and servers of a plan
+        """
+        tenant = existing_tenant()
+        tenant[tenant_inventory.SERVERS] = list()
+        plan = deploy_plan.build_plan(OS_CONFIG, StubInventory(tenant))
+        self.assertEquals([(deploy_plan.IMAGE, 'centos', 'img-id', None),
+                           (deploy_plan.NETWORK, 'net1', 'net1-id', None),
+                           (deploy_plan.KEYPAIR, 'kp', 'kp', None)], deploy_plan.journal_resources(plan))
@@ -0,0 +1,580 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import deploy_journal
+import deploy_plan
+import deploy_venv
+from openstack import client_registry
+from openstack import os_credentials
+from openstack import wait_policy
+from openstack.create_instance import OpenStackVmInstance
+from openstack import tenant_inventory
+from openstack.tests.create_image_stream_tests import StubGlance
+from openstack.tests.neutron_bulk_tests import StubNeutron
+from tests.deploy_plan_tests import StubInventory as StubTenantInventory
+
+__author__ = 'spisarski'
+
+
+class Recorder:
+    """
+    Records the order in which the stub creators' clean steps are called
+    """
+
+    def __init__(self):
+        self.calls = list()
+        self.lock = threading.Lock()
+
+    def step(self, name):
+        def func():
+            with self.lock:
+                self.calls.append(name)
+            return True
+        return func
+
+    def index(self, name):
+        return self.calls.index(name)
+
+
+class StubVm:
+    def __init__(self, recorder, name, network_id, keypair_creator):
+        self.ports = [{'port': {'id': name + '-port', 'network_id': network_id}}]
+        self.keypair_creator = keypair_creator
+        self.delete_vm = recorder.step('delete:' + name)
+        self.wait_vm_deleted = recorder.step('gone:' + name)
+        self.clean_floating_ip = recorder.step('fip:' + name)
+        self.clean_ports = recorder.step('ports:' + name)
+
+
+class StubNetwork:
+    def __init__(self, recorder, name):
+        self.network = {'network': {'id': name + '-id'}}
+        self.subnet = None
+        self.clean_router_interface = recorder.step('router-interface:' + name)
+        self.clean_router = recorder.step('router:' + name)
+        self.clean_subnet = recorder.step('subnet:' + name)
+        self.clean_network = recorder.step('network:' + name)
+
+
+class StubCleanable:
+    def __init__(self, recorder, name):
+        self.clean = recorder.step(name)
+
+
+class StubServer:
+    def __init__(self, server_id, name, status):
+        self.id = server_id
+        self.name = name
+        self.status = status
+
+
+class StubFlavor:
+    def __init__(self, name):
+        self.name = name
+
+
+class StubServerManager:
+    """
+    Stand-in for the Nova servers manager where deleted servers disappear from the listing after a short delay
+    """
+
+    def __init__(self, servers):
+        self.servers = dict((server.id, server) for server in servers)
+        self.deleted = list()
+        self.created = list()
+        self.lock = threading.Lock()
+
+    def list(self, detailed=True, search_opts=None):
+        with self.lock:
+            return self.servers.values()
+
+    def delete(self, server):
+        self.deleted.append(server.id)
+        threading.Timer(0.2, self.__remove, (server.id,)).start()
+
+    def create(self, name, flavor, image, nics, key_name=None, userdata=None):
+        server = StubServer(name + '-new', name, 'BUILD')
+        server.image = image
+        with self.lock:
+            self.servers[server.id] = server
+        self.created.append(server)
+        return server
+
+    def __remove(self, server_id):
+        with self.lock:
+            self.servers.pop(server_id, None)
+
+
+class StubNova:
+    def __init__(self, servers):
+        self.servers = StubServerManager(servers)
+
+
+class StubServerInventory:
+    """
+    Stand-in for the TenantInventory holding servers and flavors
+    """
+
+    def __init__(self, servers, images=None):
+        self.servers = list(servers)
+        self.images = images or dict()
+        self.removed = list()
+
+    def get_all(self, resource_type):
+        return list()
+
+    def find_by_name(self, resource_type, name):
+        if resource_type == tenant_inventory.FLAVORS:
+            return StubFlavor(name)
+        if resource_type == tenant_inventory.IMAGES:
+            return self.images.get(name)
+        if resource_type == tenant_inventory.SERVERS:
+            for server in self.servers:
+                if server.name == name:
+                    return server
+        return None
+
+    def filter(self, resource_type, **kwargs):
+        return list()
+
+    def add(self, resource_type, item):
+        if resource_type == tenant_inventory.SERVERS:
+            self.servers.append(item)
+
+    def remove(self, resource_type, item):
+        self.removed.append((resource_type, item['id'] if isinstance(item, dict) else item.id))
+        if resource_type == tenant_inventory.SERVERS:
+            self.servers.remove(item)
+
+
+def vm_instance_config(name):
+    """
+    Returns the configuration of a VM polled for its status at a short fixed interval
+    """
+    return {'instance': {'name': name, 'flavor': 'm1.small', 'sudo_user': 'centos',
+                         'wait': {'initial_interval': 0.05, 'max_interval': 0.05, 'jitter': 0, 'delete_timeout': 5}}}
+
+
+class BuildCleanGraphTests(unittest.TestCase):
+    """
+    Tests the ordering of the teardown tasks returned by deploy_venv.build_clean_graph()
+    """
+
+    def setUp(self):
+        self.recorder = Recorder()
+        self.keypair = StubCleanable(self.recorder, 'keypair:kp')
+        self.network_dict = {'net1': StubNetwork(self.recorder, 'net1'), 'net2': StubNetwork(self.recorder, 'net2')}
+        self.vm_dict = {'vm1': StubVm(self.recorder, 'vm1', 'net1-id', self.keypair),
+                        'vm2': StubVm(self.recorder, 'vm2', 'net2-id', None)}
+        self.image_dict = {'image': StubCleanable(self.recorder, 'image:image')}
+
+    def test_reverse_dependency_order(self):
+        """
+        Tests that no resource is removed before the resources depending upon it
+        """
+        graph = deploy_venv.build_clean_graph(self.image_dict, self.network_dict, {'kp': self.keypair}, self.vm_dict,
+                                              True)
+        self.assertTrue(graph.run(4))
+
+        index = self.recorder.index
+        for vm_name in ['vm1', 'vm2']:
+            self.assertLess(index('delete:' + vm_name), index('gone:' + vm_name))
+            self.assertLess(index('gone:' + vm_name), index('ports:' + vm_name))
+            self.assertLess(index('gone:' + vm_name), index('fip:' + vm_name))
+            self.assertLess(index('gone:' + vm_name), index('image:image'))
+        self.assertLess(index('gone:vm1'), index('keypair:kp'))
+
+        for net_name, vm_name in [('net1', 'vm1'), ('net2', 'vm2')]:
+            self.assertLess(index('ports:' + vm_name), index('router-interface:' + net_name))
+            self.assertLess(index('fip:' + vm_name), index('router-interface:' + net_name))
+            self.assertLess(index('router-interface:' + net_name), index('router:' + net_name))
+            self.assertLess(index('router-interface:' + net_name), index('subnet:' + net_name))
+            self.assertLess(index('subnet:' + net_name), index('network:' + net_name))
+
+    def test_server_deletes_first(self):
+        """
+        Tests that every server delete is issued before waiting for any of them
+        """
+        graph = deploy_venv.build_clean_graph(self.image_dict, self.network_dict, {'kp': self.keypair}, self.vm_dict,
+                                              False)
+        self.assertTrue(graph.run(1))
+        self.assertEquals(set(['delete:vm1', 'delete:vm2']), set(self.recorder.calls[:2]))
+
+    def test_images_kept(self):
+        """
+        Tests that images are only removed when requested
+        """
+        graph = deploy_venv.build_clean_graph(self.image_dict, self.network_dict, {'kp': self.keypair}, self.vm_dict,
+                                              False)
+        self.assertTrue(graph.run(4))
+        self.assertNotIn('image:image', self.recorder.calls)
+
+    def test_journal(self):
+        """
+        Tests that the deletions are recorded in the journal except for the images that are kept
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            journal = deploy_journal.DeployJournal(os.path.join(tmp_dir, 'env.yaml.journal'), 'url', 'tenant')
+            journal.created(deploy_plan.IMAGE, 'image', 'image-id')
+            for name in ['net1', 'net2']:
+                journal.created(deploy_plan.NETWORK, name, name + '-id')
+            for name in ['vm1', 'vm2']:
+                journal.created(deploy_plan.SERVER, name, name + '-id')
+            journal.created(deploy_plan.KEYPAIR, 'kp', 'kp')
+
+            graph = deploy_venv.build_clean_graph(self.image_dict, self.network_dict, {'kp': self.keypair},
+                                                  self.vm_dict, False, journal)
+            self.assertTrue(graph.run(4))
+            self.assertEquals([(deploy_plan.IMAGE, 'image')],
+                              [(entry['type'], entry['name']) for entry in journal.entries()])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class StubInventory:
+    def __init__(self, ports):
+        self.ports = ports
+
+    def get_all(self, resource_type):
+        if resource_type == tenant_inventory.PORTS:
+            return list(self.ports)
+        return list()
+
+    def add(self, resource_type, item):
+        if resource_type == tenant_inventory.PORTS:
+            self.ports.append(item)
+
+
+class DiscoverVmPortsTests(unittest.TestCase):
+    """
+    Tests that deploy_venv.discover_vm_ports() only returns existing ports and never creates any
+    """
+
+    def setUp(self):
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry({client_registry.NETWORK: lambda os_creds: None}))
+        self.os_conn_config = {'username': 'user', 'password': 'pass', 'auth_url': 'http://foo:5000/v2.0/',
+                               'tenant_name': 'tenant'}
+        self.instance_config = {'instance': {'name': 'vm1', 'ports': [
+            {'port': {'name': 'port1', 'network_name': 'net1'}},
+            {'port': {'name': 'port2', 'network_name': 'net1'}},
+            {'port': {'name': 'port3', 'network_name': 'missing'}}]}}
+        self.network_dict = {'net1': StubNetwork(Recorder(), 'net1')}
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+
+    def test_existing_ports_only(self):
+        """
+        Tests that missing ports and ports on networks that do not exist are skipped
+        """
+        inventory = StubInventory([{'id': 'b', 'name': 'port1', 'network_id': 'net1-id'},
+                                   {'id': 'a', 'name': 'port1', 'network_id': 'net1-id'},
+                                   {'id': 'c', 'name': 'port1', 'network_id': 'other-id'},
+                                   {'id': 'd', 'name': 'port3', 'network_id': 'other-id'}])
+        ports = deploy_venv.discover_vm_ports(self.os_conn_config, self.instance_config, self.network_dict, inventory)
+        self.assertEquals(['a'], [port['port']['id'] for port in ports])
+
+
+class CreatePortsWaveTests(unittest.TestCase):
+    """
+    Tests that deploy_venv.create_ports_wave() creates the missing ports of every VM with one request and leaves the
+    ones it could not create to deploy_venv.create_vm_ports()
+    """
+
+    def setUp(self):
+        self.original_registry = client_registry.get_registry()
+        self.neutron = StubNeutron(['bad'])
+        client_registry.set_registry(client_registry.ClientRegistry(
+            {client_registry.NETWORK: lambda os_creds: self.neutron}))
+        self.os_conn_config = {'username': 'user', 'password': 'pass', 'auth_url': 'http://foo:5000/v2.0/',
+                               'tenant_name': 'tenant'}
+        self.instance_configs = [
+            {'instance': {'name': 'vm1', 'ports': [{'port': {'name': 'port1', 'network_name': 'net1'}},
+                                                   {'port': {'name': 'port2', 'network_name': 'net2'}}]}},
+            {'instance': {'name': 'vm2', 'ports': [{'port': {'name': 'port3', 'network_name': 'net1'}},
+                                                   {'port': {'name': 'bad', 'network_name': 'net1'}}]}},
+            {'instance': {'name': 'vm3', 'ports': [{'port': {'name': 'port4', 'network_name': 'missing'}}]}}]
+        self.network_dict = {'net1': StubNetwork(Recorder(), 'net1'), 'net2': StubNetwork(Recorder(), 'net2')}
+        self.inventory = StubInventory([{'id': 'existing', 'name': 'port1', 'network_id': 'net1-id'}])
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+
+    def test_wave(self):
+        """
+        Tests that the missing ports of all VMs are requested together and each VM's own call only creates what failed
+        """
+        self.assertEquals(2, deploy_venv.create_ports_wave(self.os_conn_config, self.instance_configs,
+                                                           self.network_dict, self.inventory))
+        self.assertEquals(['port2', 'port3', 'bad'], [port['name'] for port in self.neutron.requests[0]['ports']])
+
+        requests = len(self.neutron.requests)
+        ports = deploy_venv.create_vm_ports(self.os_conn_config, self.instance_configs[0], self.network_dict,
+                                            self.inventory)
+        self.assertEquals(['existing', 'port2-id'], [port['port']['id'] for port in ports])
+        self.assertEquals(requests, len(self.neutron.requests))
+
+        with self.assertRaises(Exception):
+            deploy_venv.create_vm_ports(self.os_conn_config, self.instance_configs[1], self.network_dict,
+                                        self.inventory)
+        self.assertEquals(['bad'], [port['name'] for port in self.neutron.requests[-1]['ports']])
+
+
+class BuildDeployGraphTests(unittest.TestCase):
+    """
+    Tests the tasks returned by deploy_venv.build_deploy_graph() when given a plan
+    """
+
+    def setUp(self):
+        self.os_config = {'instances': [
+            {'instance': {'name': 'vm1', 'imageName': 'centos', 'keypair_name': 'kp', 'ports': list()}},
+            {'instance': {'name': 'vm2', 'imageName': 'centos', 'keypair_name': 'kp', 'ports': list()}}]}
+        self.ansible_configs = [{'playbook_location': 'playbook.yml', 'hosts': ['vm1', 'vm2']}]
+
+    def __build(self, plan):
+        return deploy_venv.build_deploy_graph(dict(), self.os_config, self.ansible_configs, None, dict(), dict(),
+                                              dict(), dict(), plan)
+
+    def test_without_plan(self):
+        """
+        Tests that every VM has its NICs configured before the playbook
+        """
+        graph = self.__build(None)
+        self.assertEquals(set(['nics:vm1', 'nics:vm2']), set(graph.tasks['playbook:0'].dependencies))
+
+    def test_unchanged_vms_skip_nics(self):
+        """
+        Tests that only the VMs created by the plan have their NICs configured
+        """
+        plan = deploy_plan.DeployPlan()
+        plan.add(deploy_plan.NOOP, deploy_plan.SERVER, 'vm1')
+        plan.add(deploy_plan.CREATE, deploy_plan.SERVER, 'vm2')
+        graph = self.__build(plan)
+        self.assertNotIn('nics:vm1', graph.tasks)
+        self.assertIn('nics:vm2', graph.tasks)
+        self.assertEquals(set(['instance:vm1', 'nics:vm2']), set(graph.tasks['playbook:0'].dependencies))
+
+    def test_waves(self):
+        """
+        Tests that every network waits for the bulk creation of the networks and every VM's ports for the bulk
+        creation of the ports, which only waits for the networks wave
+        """
+        self.os_config['networks'] = [{'network': {'name': 'net1'}}, {'network': {'name': 'net2'}}]
+        self.os_config['instances'][0]['instance']['ports'] = [{'port': {'name': 'port1', 'network_name': 'net1'}}]
+        graph = self.__build(None)
+        self.assertEquals(set(['networks']), graph.tasks['network:net1'].dependencies)
+        self.assertEquals(set(['networks']), graph.tasks['network:net2'].dependencies)
+        self.assertEquals(set(['networks']), graph.tasks['ports'].dependencies)
+        self.assertEquals(set(['ports', 'network:net1']), set(graph.tasks['ports:vm1'].dependencies))
+        self.assertEquals(set(['ports']), graph.tasks['ports:vm2'].dependencies)
+
+
+class ReplaceVmInstanceTests(unittest.TestCase):
+    """
+    Tests that deploy_venv.create_vm_instance() replaces an existing VM against a stub Nova client
+    """
+
+    def setUp(self):
+        self.server = StubServer('vm1-id', 'vm1', 'ERROR')
+        self.nova = StubNova([self.server])
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry({client_registry.COMPUTE: lambda os_creds:
+                                                                     self.nova}))
+        # The tenant name keeps the fleet waiter shared per credentials from polling another test's stub
+        self.os_conn_config = {'username': 'user', 'password': 'pass', 'auth_url': 'http://foo:5000/v2.0/',
+                               'tenant_name': 'replace-tenant'}
+        self.inventory = StubServerInventory([self.server])
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+
+    def test_replace_error_server(self):
+        """
+        Tests that a VM in the ERROR state is deleted, waited upon until it disappears and created again on its ports
+        """
+        ports = [{'port': {'id': 'port1-id', 'name': 'port1'}}]
+        vm_inst = deploy_venv.create_vm_instance(self.os_conn_config, vm_instance_config('vm1'), 'image', dict(),
+                                                 None, self.inventory, ports, True)
+        self.assertEquals(['vm1-id'], self.nova.servers.deleted)
+        self.assertEquals([vm_inst.vm], self.nova.servers.created)
+        self.assertEquals([vm_inst.vm], self.inventory.servers)
+
+
+class StubPortNeutron:
+    def __init__(self):
+        self.deleted_ports = list()
+
+    def delete_port(self, port_id):
+        self.deleted_ports.append(port_id)
+
+
+class CleanErrorServerTests(unittest.TestCase):
+    """
+    Tests the graph returned by deploy_venv.build_clean_graph() on a VM in the ERROR state against stub Nova and
+    Neutron clients
+    """
+
+    def setUp(self):
+        self.server = StubServer('vm1-id', 'vm1', 'ERROR')
+        self.nova = StubNova([self.server])
+        self.neutron = StubPortNeutron()
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry(
+            {client_registry.COMPUTE: lambda os_creds: self.nova,
+             client_registry.NETWORK: lambda os_creds: self.neutron}))
+        self.inventory = StubServerInventory([self.server])
+        # The tenant name keeps the fleet waiter shared per credentials from polling another test's stub
+        os_creds = os_credentials.OSCreds('user', 'pass', 'http://foo:5000/v2.0/', 'clean-tenant')
+        config = vm_instance_config('vm1')['instance']
+        self.vm_inst = OpenStackVmInstance(os_creds, 'vm1', config['flavor'], None,
+                                           [{'port': {'id': 'port1-id', 'network_id': 'net1-id'}}],
+                                           config['sudo_user'], inventory=self.inventory,
+                                           policy=wait_policy.WaitPolicy(config['wait']))
+        self.vm_inst.discover()
+        self.recorder = Recorder()
+        self.keypair = StubCleanable(self.recorder, 'keypair:kp')
+        self.vm_inst.keypair_creator = self.keypair
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+
+    def test_error_server_cleaned(self):
+        """
+        Tests that the server is waited upon until it disappears and that the resources it used are then removed
+        """
+        graph = deploy_venv.build_clean_graph(dict(), {'net1': StubNetwork(self.recorder, 'net1')},
+                                              {'kp': self.keypair}, {'vm1': self.vm_inst}, False)
+        self.assertTrue(graph.run(4))
+        self.assertEquals(['vm1-id'], self.nova.servers.deleted)
+        self.assertEquals(list(), self.inventory.servers)
+        self.assertEquals(['port1-id'], self.neutron.deleted_ports)
+        self.assertEquals(set(['keypair:kp', 'router-interface:net1', 'router:net1', 'subnet:net1', 'network:net1']),
+                          set(self.recorder.calls))
+
+
+class AdoptedImageJournalTests(unittest.TestCase):
+    """
+    Tests that an image reused by its checksum under another name is journaled so that later runs find it again
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.tmp_dir, 'env.yaml.journal')
+        self.glance = StubGlance()
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry({client_registry.IMAGE: lambda os_creds:
+                                                                     self.glance}))
+        self.os_conn_config = {'username': 'user', 'password': 'pass', 'auth_url': 'http://foo:5000/v2.0/',
+                               'tenant_name': 'tenant'}
+        md5 = hashlib.md5('content').hexdigest()
+        self.os_config = {'images': [{'image': {'name': 'cirros', 'format': 'qcow2', 'checksum': 'md5:' + md5,
+                                                'download_url': 'http://foo/cirros.img',
+                                                'local_download_path': self.tmp_dir}}]}
+        self.inventory = StubTenantInventory({tenant_inventory.IMAGES: [
+            {'id': 'shared-id', 'name': 'shared', 'status': 'active', 'disk_format': 'qcow2',
+             'visibility': 'private', 'checksum': md5}]})
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+        shutil.rmtree(self.tmp_dir)
+
+    def __journal(self):
+        journal = deploy_journal.DeployJournal(self.journal_path, 'url', 'tenant')
+        self.assertTrue(journal.load())
+        return journal
+
+    def __deploy(self, journal):
+        image_dict = dict()
+        graph = deploy_venv.build_deploy_graph(self.os_conn_config, self.os_config, None, self.inventory, image_dict,
+                                               dict(), dict(), dict(), None, journal)
+        self.assertTrue(graph.run(1))
+        return image_dict
+
+    def test_second_run(self):
+        """
+        Tests that the adopted image is neither stale nor planned for creation on the next run and is used again
+        """
+        self.__deploy(self.__journal())
+
+        journal = self.__journal()
+        entry = journal.get(deploy_plan.IMAGE, 'cirros')
+        self.assertEquals('shared-id', entry['id'])
+        self.assertTrue(entry.get('adopted'))
+        self.assertEquals(list(), deploy_plan.stale_entries(journal, self.inventory))
+        plan = deploy_plan.build_plan(self.os_config, self.inventory, journal=journal)
+        self.assertTrue(plan.has(deploy_plan.NOOP, deploy_plan.IMAGE, 'cirros'))
+
+        image_dict = self.__deploy(journal)
+        self.assertEquals('shared-id', image_dict['cirros'].image['id'])
+        self.assertEquals(list(), self.glance.images.created)
+
+    def test_clean_forgets(self):
+        """
+        Tests that cleaning the images forgets the adopted image without deleting it
+        """
+        self.__deploy(self.__journal())
+        journal = self.__journal()
+        graph = deploy_venv.build_clean_graph(dict(), dict(), dict(), dict(), True, journal)
+        self.assertTrue(graph.run(1))
+        self.assertEquals(list(), journal.entries())
+        self.assertEquals(list(), self.glance.images.deleted)
+
+
+class StubImageCreator:
+    def __init__(self, image):
+        self.image = image
+
+
+class CreateInstancesImageTests(unittest.TestCase):
+    """
+    Tests the image deploy_venv.create_instances() creates each VM with against a stub Nova client
+    """
+
+    def setUp(self):
+        self.nova = StubNova(list())
+        self.original_registry = client_registry.get_registry()
+        client_registry.set_registry(client_registry.ClientRegistry(
+            {client_registry.COMPUTE: lambda os_creds: self.nova,
+             client_registry.NETWORK: lambda os_creds: StubNeutron()}))
+        self.os_conn_config = {'username': 'user', 'password': 'pass', 'auth_url': 'http://foo:5000/v2.0/',
+                               'tenant_name': 'tenant'}
+        self.inventory = StubServerInventory(list(), {'cirros': 'cirros-image', 'centos': 'tenant-centos-image'})
+
+    def tearDown(self):
+        client_registry.set_registry(self.original_registry)
+
+    def __instance_config(self, name, image_name):
+        instance_config = vm_instance_config(name)
+        instance_config['instance'].update({'imageName': image_name, 'keypair_name': 'kp', 'ports': list()})
+        return instance_config
+
+    def test_unconfigured_image(self):
+        """
+        Tests that a VM whose image is not configured uses the one found in the tenant while the others use the
+        configured images
+        """
+        vm_dict = deploy_venv.create_instances(
+            self.os_conn_config, [self.__instance_config('vm1', 'cirros'), self.__instance_config('vm2', 'centos')],
+            {'centos': StubImageCreator('centos-image')}, dict(), {'kp': None}, self.inventory)
+        self.assertEquals('cirros-image', vm_dict['vm1'].vm.image)
+        self.assertEquals('centos-image', vm_dict['vm2'].vm.image)
@@ -12,7 +12,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import BaseHTTPServer
+import hashlib
 import os
+import SimpleHTTPServer
+import tempfile
+import threading
 import unittest
 import shutil
 
@@ -82,11 +87,11 @@ class FileUtilsTests(unittest.TestCase):
         """
         Tests the file_utils.download() method when given a good Cirros QCOW2 URL
         """
-        image_file = file_utils.download('http://download.cirros-cloud.net/0.3.4/cirros-0.3.4-x86_64-disk.img',
-                                         self.tmpDir)
-        self.assertIsNotNone(image_file)
-        self.assertTrue(image_file.name.endswith("cirros-0.3.4-x86_64-disk.img"))
-        self.assertTrue(image_file.name.startswith(self.tmpDir))
+        image_file_path = file_utils.download('http://download.cirros-cloud.net/0.3.4/cirros-0.3.4-x86_64-disk.img',
+                                              self.tmpDir)
+        self.assertIsNotNone(image_file_path)
+        self.assertTrue(image_file_path.endswith("cirros-0.3.4-x86_64-disk.img"))
+        self.assertTrue(image_file_path.startswith(self.tmpDir))
 
     def testReadOSEnvFile(self):
         """
@@ -98,3 +103,224 @@ class FileUtilsTests(unittest.TestCase):
         self.assertEquals('http://foo:5000/v2.0/', os_env_dict['OS_AUTH_URL'])
         self.assertEquals('admin', os_env_dict['OS_USERNAME'])
         self.assertEquals('admin', os_env_dict['OS_TENANT_NAME'])
+
+
+class LocalHttpServer:
+    """
+    Serves the files of a directory over HTTP on a free local port in a background thread
+    """
+
+    def __init__(self, directory, handler_class=None):
+        base_class = handler_class or SimpleHTTPServer.SimpleHTTPRequestHandler
+
+        class Handler(base_class):
+            def translate_path(self, path):
+                return os.path.join(directory, path.split('?')[0].lstrip('/'))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        self.server.ranges = list()
+        self.server.truncated_starts = set()
+        self.server.failed_starts = set()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def url(self, name):
+        return 'http://127.0.0.1:' + str(self.server.server_port) + '/' + name
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TruncatingHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    """
+    Announces the full length of a file but closes the connection half way through it
+    """
+
+    def copyfile(self, source, outputfile):
+        content = source.read()
+        outputfile.write(content[:len(content) / 2])
+
+
+class RangeHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    """
+    Serves the byte ranges of files, recording each range requested. Only half of a range is sent when it starts at one
+    of the server's truncated_starts and an error is returned when it starts at one of its failed_starts.
+    """
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as served_file:
+            content = served_file.read()
+
+        range_header = self.headers.getheader('Range')
+        if not range_header:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+
+        start, end = [int(value) for value in range_header.split('=')[1].split('-')]
+        if start in self.server.failed_starts:
+            self.send_error(503)
+            return
+        end = min(end, len(content) - 1)
+        self.server.ranges.append((start, end))
+        body = content[start:end + 1]
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes ' + str(start) + '-' + str(end) + '/' + str(len(content)))
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        if start in self.server.truncated_starts:
+            body = body[:len(body) / 2]
+        self.wfile.write(body)
+
+
+class LocalDownloadTests(unittest.TestCase):
+    """
+    Tests the file_utils.download() method against a local HTTP server
+    """
+
+    def setUp(self):
+        self.serve_dir = tempfile.mkdtemp()
+        self.dest_dir = tempfile.mkdtemp()
+        self.content = os.urandom(1024 * 100 + 7)
+        with open(os.path.join(self.serve_dir, 'image.img'), 'wb') as image_file:
+            image_file.write(self.content)
+        self.server = None
+        self.retry_delay = file_utils.SEGMENT_RETRY_DELAY
+        file_utils.SEGMENT_RETRY_DELAY = 0
+
+    def tearDown(self):
+        file_utils.SEGMENT_RETRY_DELAY = self.retry_delay
+        if self.server:
+            self.server.stop()
+        shutil.rmtree(self.serve_dir)
+        shutil.rmtree(self.dest_dir)
+
+    def test_download_in_chunks(self):
+        """
+        Tests that a file larger than the chunk size is downloaded whole under its final name only
+        """
+        self.server = LocalHttpServer(self.serve_dir)
+        dest = file_utils.download(self.server.url('image.img'), self.dest_dir, chunk_size=4096)
+        self.assertEquals(os.path.join(self.dest_dir, 'image.img'), dest)
+        with open(dest, 'rb') as image_file:
+            self.assertEquals(self.content, image_file.read())
+        self.assertEquals(['image.img'], os.listdir(self.dest_dir))
+
+    def test_incomplete_download(self):
+        """
+        Tests that a download shorter than its announced length fails without leaving any file behind
+        """
+        self.server = LocalHttpServer(self.serve_dir, TruncatingHandler)
+        with self.assertRaises(Exception):
+            file_utils.download(self.server.url('image.img'), self.dest_dir, chunk_size=4096)
+        self.assertEquals(list(), os.listdir(self.dest_dir))
+
+    def test_not_found(self):
+        """
+        Tests that a missing file raises an exception without leaving any file behind
+        """
+        self.server = LocalHttpServer(self.serve_dir)
+        with self.assertRaises(Exception):
+            file_utils.download(self.server.url('missing.img'), self.dest_dir)
+        self.assertEquals(list(), os.listdir(self.dest_dir))
+
+    def __download_ranged(self):
+        return file_utils.download(self.server.url('image.img'), self.dest_dir, chunk_size=4096, connections=4,
+                                   min_segment_size=16 * 1024)
+
+    def __assert_downloaded(self, dest):
+        with open(dest, 'rb') as image_file:
+            self.assertEquals(self.content, image_file.read())
+        self.assertEquals(['image.img'], os.listdir(self.dest_dir))
+
+    def test_parallel_ranges(self):
+        """
+        Tests that a server supporting ranges is sent one range request per segment after the probe
+        """
+        self.server = LocalHttpServer(self.serve_dir, RangeHandler)
+        self.__assert_downloaded(self.__download_ranged())
+        ranges = self.server.server.ranges
+        self.assertEquals((0, 0), ranges[0])
+        self.assertEquals(4, len(ranges[1:]))
+        self.assertEquals(len(self.content), sum(end - start + 1 for start, end in ranges[1:]))
+
+    def test_segment_resumed(self):
+        """
+        Tests that a segment whose connection drops is requested again from the first byte not yet received
+        """
+        self.server = LocalHttpServer(self.serve_dir, RangeHandler)
+        self.server.server.truncated_starts.add(len(self.content) / 4)
+        self.__assert_downloaded(self.__download_ranged())
+        ranges = self.server.server.ranges
+        self.assertEquals(6, len(ranges))
+        self.assertTrue(any(start > len(self.content) / 4 and start < len(self.content) / 2 for start, end in ranges))
+
+    def test_resume_after_failure(self):
+        """
+        Tests that a download which failed is resumed from its persisted progress by the next call
+        """
+        self.server = LocalHttpServer(self.serve_dir, RangeHandler)
+        step = len(self.content) / 4
+        self.server.server.failed_starts.add(2 * step)
+        with self.assertRaises(Exception):
+            self.__download_ranged()
+        self.assertEquals(set(['image.img.part', 'image.img.part.state']), set(os.listdir(self.dest_dir)))
+
+        self.server.server.ranges = list()
+        self.server.server.failed_starts.clear()
+        self.__assert_downloaded(self.__download_ranged())
+        self.assertEquals([(0, 0), (2 * step, 3 * step - 1)], self.server.server.ranges)
+
+    def test_stream(self):
+        """
+        Tests that a DownloadStream returns the content in the sizes read, copies it and computes its digests
+        """
+        self.server = LocalHttpServer(self.serve_dir)
+        copy_path = os.path.join(self.dest_dir, 'copy.img')
+        stream = file_utils.DownloadStream(self.server.url('image.img'), copy_path, chunk_size=4096, buffer_chunks=2)
+        try:
+            self.assertEquals(len(self.content), stream.size)
+            data = stream.read(1000) + stream.read(10000)
+            while True:
+                chunk = stream.read(3000)
+                if not chunk:
+                    break
+                data += chunk
+            self.assertEquals(self.content, data)
+            self.assertEquals(hashlib.sha256(self.content).hexdigest(), stream.digests()['sha256'])
+            self.assertEquals(hashlib.md5(self.content).hexdigest(), stream.digests()['md5'])
+        finally:
+            stream.close()
+        with open(copy_path, 'rb') as copy_file:
+            self.assertEquals(self.content, copy_file.read())
+
+    def test_stream_incomplete(self):
+        """
+        Tests that reading a DownloadStream raises an exception when the download is shorter than announced
+        """
+        self.server = LocalHttpServer(self.serve_dir, TruncatingHandler)
+        stream = file_utils.DownloadStream(self.server.url('image.img'), chunk_size=4096)
+        try:
+            with self.assertRaises(Exception):
+                stream.read()
+        finally:
+            stream.close()
+
+    def test_format_bytes(self):
+        """
+        Tests the human readable byte counts of the download progress messages
+        """
+        self.assertEquals('512.0 B', file_utils.format_bytes(512))
+        self.assertEquals('1.5 MB', file_utils.format_bytes(1024 * 1536))
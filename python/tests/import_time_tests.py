@@ -0,0 +1,85 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import logging
+import os
+import subprocess
+import sys
+import unittest
+
+__author__ = 'spisarski'
+
+logger = logging.getLogger('import_time_tests')
+
+# !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+# To run these tests, the CWD must be set to the top level directory of this project
+# !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+
+# Packages that must only be loaded once they are actually needed
+HEAVY_PACKAGES = ['ansible', 'paramiko', 'Crypto', 'glanceclient', 'keystoneclient', 'neutronclient', 'novaclient']
+
+# Cold start budget in seconds, can be overridden with the IMPORT_TIME_LIMIT environment variable
+IMPORT_TIME_LIMIT = float(os.environ.get('IMPORT_TIME_LIMIT', 2.0))
+
+IMPORT_SCRIPT = ("import json, sys, time\n"
+                 "start = time.time()\n"
+                 "__import__(sys.argv[1])\n"
+                 "sys.stdout.write(json.dumps({'seconds': time.time() - start, 'modules': list(sys.modules.keys())}))\n")
+
+
+def cold_import(module_name):
+    """
+    Imports a module in a new interpreter
+    :param module_name: the module to import
+    :return: tuple of the seconds the import took and the names of all modules loaded as a result
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.getcwd()] + [path for path in [env.get('PYTHONPATH')] if path])
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT, module_name], env=env)
+    result = json.loads(output.decode('utf-8').splitlines()[-1])
+    return result['seconds'], result['modules']
+
+
+def loaded_packages(modules, packages):
+    """
+    Returns the packages that have been loaded
+    :param modules: the names of the loaded modules
+    :param packages: the top level package names to look for
+    :return: the list of loaded packages
+    """
+    return [package for package in packages if [module for module in modules if module.split('.')[0] == package]]
+
+
+class ImportTimeTests(unittest.TestCase):
+    """
+    Guards the cold start time of the deployment CLI and the test runner against heavy imports creeping back in
+    """
+
+    def test_deploy_venv_cold_start(self):
+        """
+        Tests that importing deploy_venv loads none of the heavy dependencies and completes within budget
+        """
+        seconds, modules = cold_import('deploy_venv')
+        logger.info('deploy_venv imported in ' + str(seconds) + ' seconds')
+        self.assertEquals([], loaded_packages(modules, HEAVY_PACKAGES))
+        self.assertLess(seconds, IMPORT_TIME_LIMIT)
+
+    def test_unit_test_suite_cold_start(self):
+        """
+        Tests that importing the test runner does not load Ansible, SSH, crypto or Keystone client libraries
+        """
+        seconds, modules = cold_import('unit_test_suite')
+        logger.info('unit_test_suite imported in ' + str(seconds) + ' seconds')
+        self.assertEquals([], loaded_packages(modules, ['ansible', 'paramiko', 'Crypto', 'scp', 'keystoneclient']))
@@ -0,0 +1,121 @@
+# Copyright (c) 2016 Cable Television Laboratories, Inc. ("CableLabs")
+#                    and others.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+import unittest
+
+import task_graph
+
+__author__ = 'spisarski'
+
+
+class TaskGraphTests(unittest.TestCase):
+    """
+    Tests the TaskGraph class defined in task_graph.py
+    """
+
+    def setUp(self):
+        self.graph = task_graph.TaskGraph()
+        self.order = list()
+        self.lock = threading.Lock()
+
+    def __task(self, name, delay=0, error=False):
+        def func():
+            time.sleep(delay)
+            if error:
+                raise Exception('Task failure - ' + name)
+            with self.lock:
+                self.order.append(name)
+            return name
+        return func
+
+    def test_dependency_order(self):
+        """
+        Tests that every task runs after its dependencies and that the results are recorded
+        """
+        self.graph.add('instance', self.__task('instance'), ['ports', 'image'])
+        self.graph.add('ports', self.__task('ports'), ['network'])
+        self.graph.add('network', self.__task('network', 0.05))
+        self.graph.add('image', self.__task('image'))
+        self.assertTrue(self.graph.run(4))
+        self.assertLess(self.order.index('network'), self.order.index('ports'))
+        self.assertLess(self.order.index('ports'), self.order.index('instance'))
+        self.assertLess(self.order.index('image'), self.order.index('instance'))
+        self.assertEquals('instance', self.graph.results['instance'])
+
+    def test_independent_tasks_concurrent(self):
+        """
+        Tests that independent tasks run at the same time up to the worker limit
+        """
+        for index in range(4):
+            self.graph.add('task' + str(index), self.__task(str(index), 0.3))
+        start = time.time()
+        self.assertTrue(self.graph.run(4))
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_fail_fast(self):
+        """
+        Tests that no further tasks are started after a failure and that the graph reports it
+        """
+        self.graph.add('bad', self.__task('bad', error=True))
+        self.graph.add('dependent', self.__task('dependent'), ['bad'])
+        self.graph.add('slow', self.__task('slow', 0.2))
+        self.graph.add('after_slow', self.__task('after_slow'), ['slow'])
+        self.assertFalse(self.graph.run(2, fail_fast=True))
+        self.assertEquals(['bad'], self.graph.errors.keys())
+        self.assertIn('dependent', self.graph.skipped)
+        self.assertIn('after_slow', self.graph.skipped)
+        self.assertNotIn('after_slow', self.order)
+
+    def test_continue_on_error(self):
+        """
+        Tests that only the dependents of a failed task are skipped when not failing fast
+        """
+        self.graph.add('bad', self.__task('bad', error=True))
+        self.graph.add('dependent', self.__task('dependent'), ['bad'])
+        self.graph.add('transitive', self.__task('transitive'), ['dependent'])
+        self.graph.add('slow', self.__task('slow', 0.2))
+        self.graph.add('after_slow', self.__task('after_slow'), ['slow'])
+        self.assertFalse(self.graph.run(2, fail_fast=False))
+        self.assertEquals(set(['dependent', 'transitive']), self.graph.skipped)
+        self.assertEquals(['slow', 'after_slow'], self.order)
+
+    def test_unknown_dependency(self):
+        """
+        Tests that an Exception is raised before anything runs when a dependency does not exist
+        """
+        self.graph.add('ports', self.__task('ports'), ['network'])
+        with self.assertRaises(Exception):
+            self.graph.run()
+        self.assertEquals(list(), self.order)
+
+    def test_cycle(self):
+        """
+        Tests that an Exception is raised before anything runs when the dependencies contain a cycle
+        """
+        self.graph.add('first', self.__task('first'), ['second'])
+        self.graph.add('second', self.__task('second'), ['first'])
+        self.graph.add('other', self.__task('other'))
+        with self.assertRaises(Exception):
+            self.graph.run()
+        self.assertEquals(list(), self.order)
+
+    def test_duplicate_name(self):
+        """
+        Tests that an Exception is raised when adding a task with an existing name
+        """
+        self.graph.add('task', self.__task('task'))
+        with self.assertRaises(Exception):
+            self.graph.add('task', self.__task('task'))
@@ -3,8 +3,28 @@ import logging
 import sys
 
 from tests import file_utils_tests
+from tests import import_time_tests
+from tests import task_graph_tests
+from tests import deploy_journal_tests
+from tests import deploy_plan_tests
+from tests import deploy_venv_tests
+from openstack.tests import client_registry_tests
+from openstack.tests import token_cache_tests
+from openstack.tests import http_transport_tests
+from openstack.tests import async_utils_tests
+from openstack.tests import api_metrics_tests
+from openstack.tests import tenant_inventory_tests
+from openstack.tests import fleet_waiter_tests
+from openstack.tests import wait_policy_tests
+from openstack.tests import create_instance_fleet_tests
+from openstack.tests import neutron_bulk_tests
+from openstack.tests import image_cache_tests
+from openstack.tests import create_image_stream_tests
+from openstack.tests import create_image_dedup_tests
+from provisioning.tests import ssh_banner_tests
 from openstack.tests.create_image_tests import CreateImageSuccessTests, CreateImageNegativeTests
 from openstack.tests.os_source_file_test import OSSourceFileTestsCase
+from openstack.tests.keystone_utils_tests import KeystoneUtilsTests
 from openstack.tests.neutron_utils_tests import NeutronUtilsTests
 from openstack.tests.create_network_tests import CreateNetworkSuccessTests
 from openstack.tests.nova_utils_tests import NovaUtilsKeypairTests
@@ -21,6 +41,26 @@ logger = logging.getLogger('unit_test_suite')
 def create_test_suite(source_filename=None, proxy_settings=None):
     suite = unittest.TestSuite()
     suite.addTests(unittest.TestLoader().loadTestsFromModule(file_utils_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(import_time_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(task_graph_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(deploy_journal_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(deploy_plan_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(deploy_venv_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(client_registry_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(token_cache_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(http_transport_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(async_utils_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(api_metrics_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(tenant_inventory_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(fleet_waiter_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(wait_policy_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(create_instance_fleet_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(neutron_bulk_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(image_cache_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(create_image_stream_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(create_image_dedup_tests))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(ssh_banner_tests))
+    suite.addTest(OSSourceFileTestsCase.parameterize(KeystoneUtilsTests, source_filename, proxy_settings))
     suite.addTest(OSSourceFileTestsCase.parameterize(CreateImageSuccessTests, source_filename, proxy_settings))
     suite.addTest(OSSourceFileTestsCase.parameterize(CreateImageNegativeTests, source_filename, proxy_settings))
     suite.addTest(OSSourceFileTestsCase.parameterize(NeutronUtilsTests, source_filename, proxy_settings))